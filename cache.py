@@ -0,0 +1,348 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+
+def get_file_signature(path):
+    '''
+    Returns a signature of a file from its size and modification time. Any edit of a video or weights file
+    changes it, without reading files of several gigabytes.
+
+        Parameters:
+            path (str): Path to the file.
+
+        Returns:
+            signature (str): Hex digest of the file size and modification time.
+    '''
+    status = os.stat(path)
+
+    return hashlib.sha1(f"{status.st_size}:{status.st_mtime_ns}".encode()).hexdigest()
+
+
+def get_cache_key(video_path, weights_paths, settings):
+    '''
+    Returns the key of the cached detections of a video.
+
+        Parameters:
+            video_path (str): Path to the video.
+            weights_paths (list): Paths to the weights of the models producing the detections.
+            settings (dict): Anything else the detections depend on, such as thresholds and model names.
+
+        Returns:
+            key (str): Hex digest of the video, weights and settings.
+    '''
+    key = hashlib.sha1(get_file_signature(video_path).encode())
+    for weights_path in weights_paths:
+        key.update(get_file_signature(weights_path).encode())
+    key.update(json.dumps(settings, sort_keys=True, default=str).encode())
+
+    return key.hexdigest()[:16]
+
+
+class DetectionCache():
+    '''
+    Persists the filtered detections and re-identification features of every processed frame, so a rerun
+    with different tracking or speed parameters skips detection and feature extraction.
+
+    The first run for a key records the frames into flat binary files. Once it is closed an index of the
+    frames is written, and later runs read the detections through memory maps. Keyframes depend on the
+    tracks, so the recording run detects every frame with motion, also those it only predicts, and reruns
+    with other tracking parameters find their keyframes in the cache. A frame that was not recorded is a
+    miss and has to be detected again. Frames the motion gate coasted are recorded as steps, so a replay
+    coasts the tracker on them as well.
+    While recording, the frame and step lists are appended to files as well, so a run resuming from a
+    checkpoint truncates every file to its size at the checkpoint and continues recording.
+
+        Attributes:
+            key (str): Key of the cached video, weights and settings.
+            path (str): Directory of the cache entry.
+            complete (boolean): True if the cache was recorded by an earlier run and is read only.
+            feature_dtype (numpy dtype): Type the features are stored as.
+            hits (int): Number of frames read from the cache.
+            misses (int): Number of frames that were not in the cache.
+    '''
+
+    detection_columns = 6  # x_center, y_center, width, height, confidence, class
+    coasted_step = -1  # Step of a frame the motion gate coasted
+
+
+    def __init__(self, cache_directory, video_path=None, weights_paths=(), settings=None, feature_dtype=np.float16, key=None, resume=False):
+        '''
+        Constructor for DetectionCache class.
+
+            Parameters:
+                cache_directory (str): Directory holding the cache entries.
+                video_path (str): Path to the video.
+                weights_paths (list): Paths to the weights of the models producing the detections.
+                settings (dict): Anything else the detections depend on, such as thresholds and model names.
+                feature_dtype (numpy dtype): Type the features are stored as. Half precision is plenty for cosine distances.
+                key (str): Key of an existing entry, such as the key of a cache opened by another process. Replaces the video, weights and settings.
+                resume (boolean): True if the run resumes from a checkpoint, which restores an entry being recorded with set_state.
+                                  Otherwise an incomplete entry is recorded from scratch.
+        '''
+        self.key = key if key is not None else get_cache_key(video_path, weights_paths, settings)
+        self.path = os.path.join(cache_directory, self.key)
+        self.feature_dtype = np.dtype(feature_dtype)
+        self.complete = os.path.exists(os.path.join(self.path, "index.npz"))
+        self.hits = 0
+        self.misses = 0
+
+        if self.complete:
+            index = np.load(os.path.join(self.path, "index.npz"))
+            self.frame_indices = index["frame_indices"]
+            self.starts = index["starts"]
+            self.counts = index["counts"]
+            self.feature_dimension = int(index["feature_dimension"])
+            # Entries recorded before steps were kept have none, and replays fall back to counting frames.
+            self.has_steps = "steps" in index
+            self.step_frame_indices = index["step_frame_indices"] if "step_frame_indices" in index else np.zeros(0, dtype=np.int64)
+            self.steps = index["steps"] if "steps" in index else np.zeros(0, dtype=np.int64)
+            total = int(self.counts.sum())
+            self.detections = self.open_memmap("detections.bin", np.float32, (total, self.detection_columns))
+            self.features = self.open_memmap("features.bin", self.feature_dtype, (total, self.feature_dimension))
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            mode = "ab" if resume else "wb"
+            self.detection_file = open(os.path.join(self.path, "detections.bin"), mode)
+            self.feature_file = open(os.path.join(self.path, "features.bin"), mode)
+            self.frame_file = open(os.path.join(self.path, "frames.bin"), mode)
+            self.step_file = open(os.path.join(self.path, "steps.bin"), mode)
+            self.frame_index_list, self.start_list, self.count_list = [], [], []
+            self.step_frame_list, self.step_list = [], []
+            self.has_steps = True
+            self.feature_dimension = 0
+            self.total = 0
+            if resume:
+                self.load_recorded()
+        self.closed = False
+
+
+    def open_memmap(self, file_name, dtype, shape):
+        '''
+        Maps a binary file of the cache entry read only.
+
+            Parameters:
+                file_name (str): Name of the file.
+                dtype (numpy dtype): Type of the values.
+                shape (tuple): Shape of the array.
+
+            Returns:
+                array (numpy array): Memory mapped array, or an empty array if the file is empty.
+        '''
+        if shape[0] == 0 or shape[1] == 0:
+            return np.zeros(shape, dtype=dtype)
+
+        return np.memmap(os.path.join(self.path, file_name), dtype=dtype, mode="r", shape=shape)
+
+
+    def has_frame(self, frame_index):
+        '''
+        Checks if the detections of a frame are cached. Counts a miss if not.
+
+            Parameters:
+                frame_index (int): Index of the frame in the video.
+
+            Returns:
+                cached (boolean): True if the frame can be read with get.
+        '''
+        if self.complete:
+            position = np.searchsorted(self.frame_indices, frame_index)
+            if position < len(self.frame_indices) and self.frame_indices[position] == frame_index:
+                return True
+        self.misses += 1
+
+        return False
+
+
+    def get(self, frame_index):
+        '''
+        Reads the detections of a cached frame.
+
+            Parameters:
+                frame_index (int): Index of the frame in the video.
+
+            Returns:
+                xywhs (numpy array): Boxes of the detections arranged such as: [x_center, y_center, width, height]
+                confidences (numpy array): Confidences of the detections.
+                classes (numpy array): Classes of the detections.
+                features (numpy array): One feature vector per detection.
+        '''
+        position = np.searchsorted(self.frame_indices, frame_index)
+        start, count = int(self.starts[position]), int(self.counts[position])
+        detections = np.asarray(self.detections[start:start + count])
+        features = np.asarray(self.features[start:start + count], dtype=np.float32) if count else np.array([])
+        self.hits += 1
+
+        return detections[:, :4], detections[:, 4], detections[:, 5], features
+
+
+    def detect_frame(self, frame_index, detect, keyframe):
+        '''
+        Returns the detections of a keyframe from the cache, or from detect if they are not cached. While recording,
+        frames that are not keyframes are detected and recorded as well.
+
+            Parameters:
+                frame_index (int): Index of the frame in the video.
+                detect (callable): Function returning the xywhs, confidences, classes and features of the frame.
+                keyframe (boolean): True if the tracker needs the detections of the frame.
+
+            Returns:
+                detections (tuple): xywhs, confidences, classes and features, or None if the frame is not a keyframe.
+        '''
+        if not keyframe and (self.complete or self.closed):
+            return None
+
+        if self.complete and self.has_frame(frame_index):
+            detections = self.get(frame_index)
+        else:
+            detections = detect()
+            self.add(frame_index, *detections)
+
+        return detections if keyframe else None
+
+
+    def add(self, frame_index, xywhs, confidences, classes, features):
+        '''
+        Records the detections of a frame. Frames must be added in increasing order. Does nothing if the cache is read only.
+
+            Parameters:
+                frame_index (int): Index of the frame in the video.
+                xywhs (pytorch tensor object or numpy array): Boxes of the detections arranged such as: [x_center, y_center, width, height]
+                confidences (pytorch tensor object or numpy array): Confidences of the detections.
+                classes (pytorch tensor object or numpy array): Classes of the detections.
+                features (numpy array): One feature vector per detection.
+        '''
+        if self.complete or self.closed:
+            return
+
+        count = len(confidences)
+        if count:
+            detections = np.column_stack([np.asarray(xywhs), np.asarray(confidences), np.asarray(classes)]).astype(np.float32)
+            self.detection_file.write(detections.tobytes())
+            self.feature_file.write(np.asarray(features, dtype=self.feature_dtype).tobytes())
+            self.feature_dimension = features.shape[1]
+
+        self.frame_index_list.append(frame_index)
+        self.start_list.append(self.total)
+        self.count_list.append(count)
+        self.frame_file.write(np.array([frame_index, self.total, count], dtype=np.int64).tobytes())
+        self.total += count
+
+
+    def add_step(self, frame_index, step):
+        '''
+        Records how the tracker advanced on a frame processed without detection. Does nothing if the cache is read only.
+
+            Parameters:
+                frame_index (int): Index of the frame in the video.
+                step (int): Frames since the keyframe passed to the tracker prediction, or coasted_step.
+        '''
+        if self.complete or self.closed:
+            return
+
+        self.step_frame_list.append(frame_index)
+        self.step_list.append(step)
+        self.step_file.write(np.array([frame_index, step], dtype=np.int64).tobytes())
+
+
+    def get_step(self, frame_index):
+        '''
+        Returns how the tracker advanced on a frame without cached detections.
+
+            Parameters:
+                frame_index (int): Index of the frame in the video.
+
+            Returns:
+                step (int): Frames since the keyframe for a predicted frame, coasted_step for a coasted one, or None if the frame was not processed.
+        '''
+        position = np.searchsorted(self.step_frame_indices, frame_index)
+        if position < len(self.step_frame_indices) and self.step_frame_indices[position] == frame_index:
+            return int(self.steps[position])
+
+        return None
+
+
+    def load_recorded(self):
+        '''
+        Reads the frames and steps recorded so far from their files.
+        '''
+        frames = np.fromfile(os.path.join(self.path, "frames.bin"), dtype=np.int64).reshape(-1, 3)
+        steps = np.fromfile(os.path.join(self.path, "steps.bin"), dtype=np.int64).reshape(-1, 2)
+        self.frame_index_list, self.start_list, self.count_list = (frames[:, column].tolist() for column in range(3))
+        self.step_frame_list, self.step_list = steps[:, 0].tolist(), steps[:, 1].tolist()
+        self.total = int(frames[:, 2].sum())
+        detection_size = os.path.getsize(os.path.join(self.path, "detections.bin"))
+        if self.total and detection_size:
+            feature_size = os.path.getsize(os.path.join(self.path, "features.bin"))
+            self.feature_dimension = feature_size // (self.total * self.feature_dtype.itemsize)
+
+
+    def get_state(self):
+        '''
+        Returns the size of the recorded files to store in a checkpoint.
+
+            Returns:
+                state (dict): Size in bytes per file and the feature dimension, or None if the cache is read only.
+        '''
+        if self.complete or self.closed:
+            return None
+
+        state = {"feature_dimension": self.feature_dimension}
+        for name, file in (("detections", self.detection_file), ("features", self.feature_file),
+                           ("frames", self.frame_file), ("steps", self.step_file)):
+            file.flush()
+            state[name] = file.tell()
+
+        return state
+
+
+    def set_state(self, state):
+        '''
+        Truncates the recorded files to their size at a checkpoint and reloads the recorded frames and steps.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        if self.complete or self.closed or state is None:
+            return
+
+        for name, file in (("detections", self.detection_file), ("features", self.feature_file),
+                           ("frames", self.frame_file), ("steps", self.step_file)):
+            file.flush()
+            os.truncate(os.path.join(self.path, f"{name}.bin"), state[name])
+
+        self.load_recorded()
+        self.feature_dimension = state["feature_dimension"]
+
+
+    def close(self):
+        '''
+        Finishes recording by writing the index. An entry without an index is recorded again by the next run.
+        '''
+        if self.complete or self.closed:
+            return
+
+        self.closed = True
+        for file in (self.detection_file, self.feature_file, self.frame_file, self.step_file):
+            file.close()
+        # Written under a temporary name first, so an interrupted run never leaves a partial index behind.
+        temporary_path = os.path.join(self.path, "index.tmp.npz")
+        np.savez(temporary_path, frame_indices=np.array(self.frame_index_list, dtype=np.int64),
+                 starts=np.array(self.start_list, dtype=np.int64), counts=np.array(self.count_list, dtype=np.int64),
+                 feature_dimension=self.feature_dimension, step_frame_indices=np.array(self.step_frame_list, dtype=np.int64),
+                 steps=np.array(self.step_list, dtype=np.int64))
+        os.replace(temporary_path, os.path.join(self.path, "index.npz"))
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the cache usage.
+
+            Returns:
+                summary (str): Key, mode and hit rate of the cache.
+        '''
+        if self.complete:
+            return f"Detection cache {self.key}: replayed, {self.hits} frames read, {self.misses} misses detected again"
+
+        return f"Detection cache {self.key}: recorded {len(self.frame_index_list)} frames with {self.total} detections"
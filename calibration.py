@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+
+
+class GroundCalibration():
+    '''
+    Maps image positions of a camera to positions on the road plane.
+
+    A homography is fitted from four or more image points with known ground coordinates, and the ground
+    position of every cell of the frame is precomputed once. Looking up a position is then a table read,
+    and distances between any two positions account for the perspective of the camera.
+
+        Attributes:
+            homography (numpy array): 3x3 matrix mapping image points to ground points in meters.
+            frame_size (tuple): Size of the frame such as: (width, height).
+            cell_size (int): Size of a table cell in pixels.
+            lookup_table (numpy array): Ground coordinates in meters of the center of every cell arranged such as: [row, column, (x, y)]. NaN above the horizon.
+            reprojection_error (float): Mean distance in meters between the given and the fitted ground points.
+    '''
+
+    def __init__(self, image_points, ground_points, frame_size, cell_size=2):
+        '''
+        Constructor for GroundCalibration class.
+
+            Parameters:
+                image_points (list): Image points such as: [(x, y), ...]. At least four, no three of them on a line.
+                ground_points (list): Ground coordinates in meters of the image points such as: [(x, y), ...].
+                frame_size (tuple): Size of the frame such as: (width, height).
+                cell_size (int): Size of a table cell in pixels. Larger cells use less memory.
+        '''
+        image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, 2)
+        ground_points = np.asarray(ground_points, dtype=np.float64).reshape(-1, 2)
+        if len(image_points) < 4 or len(image_points) != len(ground_points):
+            raise Exception("Calibration needs at least four image points with one ground point each.")
+
+        # With more than four points a few bad correspondences should not spoil the fit.
+        method = cv2.RANSAC if len(image_points) > 4 else 0
+        self.homography, _ = cv2.findHomography(image_points, ground_points, method)
+        if self.homography is None:
+            raise Exception("Could not fit a homography to the calibration points.")
+        # The fit is only defined up to scale, including its sign. Points in front of the camera, such as the
+        # calibration points, must get a positive w for the horizon test of transform.
+        if np.median(image_points @ self.homography[2, :2] + self.homography[2, 2]) < 0:
+            self.homography = -self.homography
+
+        self.frame_size = tuple(frame_size)
+        self.cell_size = cell_size
+        self.lookup_table = self.build_lookup_table()
+        self.reprojection_error = float(np.mean(np.linalg.norm(self.transform(image_points) - ground_points, axis=1)))
+
+
+    def transform(self, points):
+        '''
+        Applies the homography to image points.
+
+            Parameters:
+                points (numpy array): Image points arranged such as: [..., (x, y)]
+
+            Returns:
+                ground_points (numpy array): Ground points in meters of the same shape. NaN for points above the horizon.
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        homogeneous = points @ self.homography[:, :2].T + self.homography[:, 2]
+        w = homogeneous[..., 2:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(w > 0, homogeneous[..., :2] / w, np.nan)
+
+
+    def build_lookup_table(self):
+        '''
+        Computes the ground coordinates of the center of every cell of the frame.
+
+            Returns:
+                lookup_table (numpy array): Ground coordinates arranged such as: [row, column, (x, y)]
+        '''
+        width, height = self.frame_size
+        xs = np.arange(0, width, self.cell_size) + (self.cell_size - 1) / 2
+        ys = np.arange(0, height, self.cell_size) + (self.cell_size - 1) / 2
+        grid = np.stack(np.meshgrid(xs, ys), axis=-1)
+
+        return self.transform(grid).astype(np.float32)
+
+
+    def get_ground_points(self, points):
+        '''
+        Returns the ground positions of image points from the lookup table.
+
+            Parameters:
+                points (numpy array): Image points arranged such as: [..., (x, y)]. Points outside the frame are clipped to its border.
+
+            Returns:
+                ground_points (numpy array): Ground points in meters of the same shape.
+        '''
+        points = np.asarray(points, dtype=np.float64)
+        rows, columns = self.lookup_table.shape[:2]
+        column = np.clip((points[..., 0] // self.cell_size).astype(np.int64), 0, columns - 1)
+        row = np.clip((points[..., 1] // self.cell_size).astype(np.int64), 0, rows - 1)
+
+        return self.lookup_table[row, column]
+
+
+    def get_distance(self, point_a, point_b):
+        '''
+        Returns the distance on the ground between two image points.
+
+            Parameters:
+                point_a (tuple): First image point such as: (x, y).
+                point_b (tuple): Second image point such as: (x, y).
+
+            Returns:
+                distance (float): Distance in meters. NaN if a point lies above the horizon.
+        '''
+        ground_a, ground_b = self.get_ground_points(np.array([point_a, point_b], dtype=np.float64))
+
+        return float(np.hypot(*(ground_b - ground_a)))
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the calibration.
+
+            Returns:
+                summary (str): Size of the lookup table and fit error.
+        '''
+        rows, columns = self.lookup_table.shape[:2]
+
+        return (f"Ground calibration: {columns}x{rows} cells of {self.cell_size} px ({self.lookup_table.nbytes / 2 ** 20:.1f} MiB), "
+                f"mean reprojection error {self.reprojection_error:.3f} m")
@@ -1,7 +1,10 @@
 import cv2
 import secrets
 import os
+import time
+import threading
 import numpy as np
+from datetime import datetime
 
 
 class Camera():
@@ -18,7 +21,7 @@ class Camera():
                 video_path (string): Path to the video file.
                 status (boolean): Whether the camera is active or not.
                 roi (list): Co-ordinates for region of interest.
-                processed_until (int): A checkpoint denoting number of frames already processed.
+                processed_until (int): A checkpoint denoting number of frames already processed. The video is read on from there.
         '''
         self.id = secrets.token_hex(8)
         self.name = name
@@ -26,15 +29,92 @@ class Camera():
         self.roi = roi
         self.processed_until = processed_until
 
-        if not os.path.exists(self.video_path):
-            raise FileNotFoundError("Invalid path to video.")
-
-        self.video = cv2.VideoCapture(self.video_path)
+        self.video = self.open_video()
         self.fps = self.video.get(cv2.CAP_PROP_FPS)
         self.total_frames = int(self.video.get(cv2.CAP_PROP_FRAME_COUNT))
         self.size = (int(self.video.get(3)), int(self.video.get(4)))
+        self.index = None
+        self.frame_timestamp = None  # Frames of a file are timed by their position in it
+
+        if self.processed_until:
+            self.seek(self.processed_until)
+
+
+    def open_video(self):
+        '''
+        Opens the video file.
+
+            Returns:
+                video (VideoCapture object): The opened video.
+        '''
+        if not os.path.exists(self.video_path):
+            raise FileNotFoundError("Invalid path to video.")
+
+        return cv2.VideoCapture(self.video_path)
 
     
+    def read(self):
+        '''
+        Reads the next frame of the video.
+
+            Returns:
+                success (boolean): True if a frame was read.
+                frame (numpy array): The frame, or None.
+        '''
+
+        return self.video.read()
+
+
+    def get_recording_date(self):
+        '''
+        Returns the day the video was recorded, taken from the modification time of the file.
+
+            Returns:
+                recording_date (date): Day of the recording.
+        '''
+
+        return datetime.fromtimestamp(os.path.getmtime(self.video_path)).date()
+
+
+    def get_index(self):
+        '''
+        Returns the keyframe index of the video, building it on first use.
+
+            Returns:
+                index (VideoIndex object): Keyframe positions and frame timestamps of the video.
+        '''
+        if self.index is None:
+            self.index = VideoIndex(self.video_path)
+
+        return self.index
+
+
+    def seek(self, frame_index):
+        '''
+        Positions the video so the next read returns the given frame. Jumps to the nearest keyframe before it and decodes forward,
+        or uses the native seek of the backend if the keyframes of the video are unknown.
+
+            Parameters:
+                frame_index (int): Index of the frame to read next.
+
+            Returns:
+                success (boolean): True if the video could be positioned.
+        '''
+        index = self.get_index()
+        if not index.keyframes_known:
+            return self.video.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+        keyframe_index = index.get_keyframe(frame_index)
+        if not self.video.set(cv2.CAP_PROP_POS_FRAMES, keyframe_index):
+            return False
+
+        for _ in range(frame_index - keyframe_index):
+            if not self.video.grab():
+                return False
+
+        return True
+
+
     def get_masked_frame(self, frame):
         '''
         Returns a masked frame based on the roi.
@@ -76,4 +156,450 @@ class Camera():
         for co in area:
             area_processed.append((int(co[0] * x_factor), int(co[1] * y_factor)))
         
-        return area_processed
\ No newline at end of file
+        return area_processed
+
+
+class LiveCamera(Camera):
+    '''
+    Camera reading a live stream, such as an RTSP url, on its own thread and always handing out the newest frame.
+
+    Frames that arrive while the pipeline is busy replace the waiting frame and are counted as dropped, so
+    the latency stays at most one frame plus the processing time however slow inference is. Each frame is
+    timestamped with a monotonic clock when it is captured. A lost stream is reopened with exponential
+    backoff. A local video file can stand in for a stream and is then replayed at its real-time rate.
+
+        Attributes:
+            source (str): Stream url, device number or path to a video file.
+            replay (boolean): True if the source is a file replayed at real-time rate.
+            fps (float): Frame rate reported by the source.
+            size (tuple): Size of the frames such as: (width, height).
+            start_wall_time (datetime): Wall clock time at which the camera started, the time frame timestamps count from.
+            frame_timestamp (float): Capture time of the last frame handed out, in seconds since the camera started.
+            frame_index (int): Number of the last frame handed out among all frames captured.
+            ended (boolean): True once a replayed file is finished or the camera was closed.
+            frames_captured (int): Number of frames read from the source.
+            frames_dropped (int): Number of frames replaced before the pipeline took them.
+            reconnect_count (int): Number of times the stream was reopened.
+    '''
+
+    def __init__(self, name, source, roi, reconnect_delay=0.5, max_reconnect_delay=30.0, open_timeout=10.0):
+        '''
+        Constructor for LiveCamera class. Starts reading the stream.
+
+            Parameters:
+                name (string): Name of the camera.
+                source (string or int): Stream url, device number or path to a video file replayed at real-time rate.
+                roi (list): Co-ordinates for region of interest.
+                reconnect_delay (float): Seconds to wait before the first reconnection attempt.
+                max_reconnect_delay (float): Upper bound of the doubling wait between reconnection attempts.
+                open_timeout (float): Seconds to wait for the first frame.
+        '''
+        self.source = source
+        self.replay = isinstance(source, str) and os.path.isfile(source)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        super().__init__(name, source, roi)
+        self.fps = self.fps or 25.0
+        if not self.replay:
+            self.total_frames = 0
+
+        self.start_time = time.monotonic()
+        self.start_wall_time = datetime.now()
+        self.condition = threading.Condition()
+        self.latest = None  # (frame, frame index, timestamp) not handed out yet
+        self.frame_index = -1
+        self.ended = False
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.reconnect_count = 0
+        self.latency_sum = 0.0
+        self.max_latency = 0.0
+        self.frames_handed_out = 0
+
+        self.reader_thread = threading.Thread(target=self.read_frames, name=f"{name}-reader", daemon=True)
+        self.reader_thread.start()
+        with self.condition:
+            self.condition.wait_for(lambda: self.latest is not None or self.ended, timeout=open_timeout)
+
+
+    def open_video(self):
+        '''
+        Opens the stream.
+
+            Returns:
+                video (VideoCapture object): The opened stream.
+        '''
+        video = cv2.VideoCapture(self.source)
+        if not video.isOpened():
+            raise Exception(f"Could not open the stream {self.source}.")
+
+        return video
+
+
+    def read_frames(self):
+        '''
+        Method run by the reader thread. Captures frames as fast as the source delivers them and keeps only the newest.
+        '''
+        delay = self.reconnect_delay
+        while not self.ended:
+            success, frame = self.video.read()
+            if not success:
+                if self.replay or not self.reconnect(delay):
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    if self.replay:
+                        with self.condition:
+                            self.ended = True
+                            self.condition.notify_all()
+                else:
+                    delay = self.reconnect_delay
+                continue
+
+            if self.replay:
+                # A file is paced to the rate it was recorded at, so it behaves like the camera it came from.
+                due = self.start_time + self.frames_captured / self.fps
+                time.sleep(max(due - time.monotonic(), 0))
+
+            with self.condition:
+                if self.latest is not None:
+                    self.frames_dropped += 1
+                self.latest = (frame, self.frames_captured, time.monotonic() - self.start_time)
+                self.frames_captured += 1
+                self.condition.notify_all()
+
+        self.video.release()
+
+
+    def reconnect(self, delay):
+        '''
+        Reopens the stream after waiting.
+
+            Parameters:
+                delay (float): Seconds to wait before reopening.
+
+            Returns:
+                success (boolean): True if the stream could be reopened.
+        '''
+        with self.condition:
+            # Waiting on the condition lets close interrupt the backoff.
+            if self.condition.wait_for(lambda: self.ended, timeout=delay):
+                return False
+        self.video.release()
+        self.video = cv2.VideoCapture(self.source)
+        self.reconnect_count += 1
+
+        return self.video.isOpened()
+
+
+    def read(self, timeout=None):
+        '''
+        Waits for a frame newer than the last one handed out and returns it.
+
+            Parameters:
+                timeout (float): Seconds to wait. None to wait until a frame arrives or the camera ends.
+
+            Returns:
+                success (boolean): True if a frame was read.
+                frame (numpy array): The newest frame, or None.
+        '''
+        with self.condition:
+            self.condition.wait_for(lambda: self.latest is not None or self.ended, timeout=timeout)
+            if self.latest is None:
+                return False, None
+            frame, self.frame_index, self.frame_timestamp = self.latest
+            self.latest = None
+
+        latency = time.monotonic() - self.start_time - self.frame_timestamp
+        self.latency_sum += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.frames_handed_out += 1
+
+        return True, frame
+
+
+    def get_recording_date(self):
+        '''
+        Returns the day the camera started.
+
+            Returns:
+                recording_date (date): Day of the recording.
+        '''
+
+        return self.start_wall_time.date()
+
+
+    def seek(self, frame_index):
+        '''
+        Live streams cannot be positioned.
+
+            Returns:
+                success (boolean): Always False.
+        '''
+
+        return False
+
+
+    def close(self):
+        '''
+        Stops the reader thread.
+        '''
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+        self.reader_thread.join()
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the captured and dropped frames.
+
+            Returns:
+                summary (string): Captured, dropped and handed out frames, reconnections and latency.
+        '''
+        mean_latency = 1000 * self.latency_sum / max(self.frames_handed_out, 1)
+
+        return (f"Live camera captured {self.frames_captured} frames, dropped {self.frames_dropped} and handed out {self.frames_handed_out}, "
+                f"reconnected {self.reconnect_count} times, latency {mean_latency:.1f} ms on average and {1000 * self.max_latency:.1f} ms at most.")
+
+
+class VideoIndex():
+    '''
+    Keyframe positions and frame timestamps of a video, stored in a sidecar file next to it.
+
+    AVI files are indexed from their OpenDML or idx1 index without decoding anything. Seeking then jumps to
+    the keyframe at or before the wanted frame and only decodes forward from there. Other videos are not
+    demuxed: intra coded ones have a keyframe on every frame, and for the rest the keyframes are unknown,
+    so seeking is left to the native seek of the backend, which finds the keyframes in the container itself.
+
+        Attributes:
+            video_path (str): Path to the video.
+            index_path (str): Path to the sidecar index file.
+            keyframes (numpy array): Sorted indices of the frames that can be decoded on their own.
+            timestamps (numpy array): Time of every frame in seconds.
+            keyframes_known (boolean): False if the keyframes of the video are unknown and seeking uses the native seek.
+            source (str): How the index was built: opendml, idx1, intra or native.
+    '''
+
+    keyframe_flag = 0x10  # AVIIF_KEYFRAME of the idx1 entries
+    opendml_delta_flag = 0x80000000  # Set in the size of OpenDML entries that are not keyframes
+    intra_only_codecs = ("MJPG", "mjpg", "MJPA", "AVRn", "dmb1", "jpeg", "FFV1", "HFYU", "png ", "MPNG", "DIB ", "\0\0\0\0")
+
+
+    def __init__(self, video_path, rebuild=False):
+        '''
+        Constructor for VideoIndex class. Loads the sidecar index, or builds and saves it if it is missing or stale.
+
+            Parameters:
+                video_path (str): Path to the video.
+                rebuild (boolean): True to build the index even if a valid sidecar file exists.
+        '''
+        self.video_path = video_path
+        self.index_path = video_path + ".index.npz"
+        stat = os.stat(video_path)
+        self.signature = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+        if not rebuild and self.load():
+            return
+
+        self.build()
+        self.save()
+
+
+    def load(self):
+        '''
+        Loads the sidecar index if it belongs to the current video file.
+
+            Returns:
+                loaded (boolean): True if a valid index was loaded.
+        '''
+        if not os.path.exists(self.index_path):
+            return False
+
+        index = np.load(self.index_path)
+        if not np.array_equal(index["signature"], self.signature) or "keyframes_known" not in index:
+            return False
+
+        self.keyframes = index["keyframes"]
+        self.timestamps = index["timestamps"]
+        self.source = str(index["source"])
+        self.keyframes_known = bool(index["keyframes_known"])
+
+        return True
+
+
+    def save(self):
+        '''
+        Writes the sidecar index atomically.
+        '''
+        temporary_path = self.index_path + ".tmp.npz"
+        np.savez(temporary_path, keyframes=self.keyframes, timestamps=self.timestamps, source=self.source, signature=self.signature,
+                 keyframes_known=self.keyframes_known)
+        os.replace(temporary_path, self.index_path)
+
+
+    def build(self):
+        '''
+        Builds the index from the AVI index chunks, or from the codec of the video if there are none.
+        '''
+        entries = None
+        if self.video_path.lower().endswith(".avi"):
+            with open(self.video_path, "rb") as file:
+                entries = self.read_avi_index(file)
+
+        video = cv2.VideoCapture(self.video_path)
+        fps = video.get(cv2.CAP_PROP_FPS) or 25.0
+        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        self.keyframes_known = True
+        if entries is not None and len(entries[0]) >= total_frames:
+            keyframe_flags, self.source = entries
+            self.keyframes = np.flatnonzero(keyframe_flags).astype(np.int64)
+            self.timestamps = np.arange(len(keyframe_flags), dtype=np.float64) / fps
+        else:
+            # Demuxing a long video up front costs more than it saves, so frames are timed by the frame rate.
+            self.timestamps = np.arange(total_frames, dtype=np.float64) / fps
+            fourcc = int(video.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, "little").decode("latin-1")
+            if fourcc in self.intra_only_codecs:
+                self.keyframes = np.arange(total_frames, dtype=np.int64)
+                self.source = "intra"
+            else:
+                self.keyframes = np.zeros(1, dtype=np.int64)
+                self.keyframes_known = False
+                self.source = "native"
+        video.release()
+
+        if len(self.keyframes) == 0 or self.keyframes[0] != 0:
+            self.keyframes = np.concatenate([[0], self.keyframes]).astype(np.int64)
+
+
+    def read_avi_index(self, file):
+        '''
+        Reads the keyframe flags of the video stream from the OpenDML index, or from the idx1 index of AVI files below 1 GB.
+
+            Parameters:
+                file (file object): The AVI file opened for binary reading.
+
+            Returns:
+                keyframe_flags (numpy array): True per video frame that is a keyframe.
+                source (str): opendml or idx1. None instead of both if the file has no usable index.
+        '''
+        chunks = self.read_chunks(file, 0, os.fstat(file.fileno()).st_size)
+        riff = [(offset, size) for fourcc, form, offset, size in chunks if fourcc == b"RIFF" and form == b"AVI "]
+        if not riff:
+            return None
+
+        video_stream, super_index, idx1 = None, None, None
+        for fourcc, form, offset, size in self.read_chunks(file, riff[0][0] + 4, riff[0][0] + riff[0][1]):
+            if fourcc == b"LIST" and form == b"hdrl":
+                video_stream, super_index = self.read_header_list(file, offset + 4, offset + size)
+            elif fourcc == b"idx1":
+                idx1 = (offset, size)
+
+        if super_index is not None:
+            flags = []
+            for chunk_offset in super_index:
+                file.seek(chunk_offset + 8)
+                header = file.read(24)
+                entry_count = int.from_bytes(header[4:8], "little")
+                entries = np.frombuffer(file.read(entry_count * 8), dtype=[("offset", "<u4"), ("size", "<u4")])
+                flags.append((entries["size"] & self.opendml_delta_flag) == 0)
+            return np.concatenate(flags) if flags else np.zeros(0, dtype=bool), "opendml"
+
+        if idx1 is not None and video_stream is not None:
+            file.seek(idx1[0])
+            entries = np.frombuffer(file.read(idx1[1] - idx1[1] % 16), dtype=[("id", "S4"), ("flags", "<u4"), ("offset", "<u4"), ("size", "<u4")])
+            # Stream chunks are named after their stream number, such as 00dc for compressed video of stream 0.
+            prefix = f"{video_stream:02d}".encode()
+            video_entries = entries[np.char.startswith(entries["id"], prefix) & (np.char.endswith(entries["id"], b"dc") | np.char.endswith(entries["id"], b"db"))]
+            return (video_entries["flags"] & self.keyframe_flag) != 0, "idx1"
+
+        return None
+
+
+    def read_chunks(self, file, start, end):
+        '''
+        Lists the RIFF chunks between two file offsets without reading their data.
+
+            Parameters:
+                file (file object): The file opened for binary reading.
+                start (int): Offset of the first chunk header.
+                end (int): Offset at which the chunks end.
+
+            Returns:
+                chunks (list): Tuples such as: (fourcc, list type or None, offset of the data, size of the data)
+        '''
+        chunks = []
+        offset = start
+        while offset + 8 <= end:
+            file.seek(offset)
+            header = file.read(12)
+            if len(header) < 8:
+                break
+            fourcc, size = header[:4], int.from_bytes(header[4:8], "little")
+            chunks.append((fourcc, header[8:12] if fourcc in (b"RIFF", b"LIST") else None, offset + 8, size))
+            offset += 8 + size + size % 2
+
+        return chunks
+
+
+    def read_header_list(self, file, start, end):
+        '''
+        Finds the video stream and its OpenDML super index in the hdrl list.
+
+            Parameters:
+                file (file object): The AVI file opened for binary reading.
+                start (int): Offset of the first chunk of the list.
+                end (int): Offset at which the list ends.
+
+            Returns:
+                video_stream (int): Number of the video stream, or None.
+                super_index (list): Offsets of the OpenDML standard index chunks of the video stream, or None.
+        '''
+        stream_number = 0
+        for fourcc, form, offset, size in self.read_chunks(file, start, end):
+            if fourcc != b"LIST" or form != b"strl":
+                continue
+
+            stream_type, super_index = None, None
+            for chunk_fourcc, _, chunk_offset, chunk_size in self.read_chunks(file, offset + 4, offset + size):
+                file.seek(chunk_offset)
+                if chunk_fourcc == b"strh":
+                    stream_type = file.read(4)
+                elif chunk_fourcc == b"indx":
+                    header = file.read(24)
+                    entry_count = int.from_bytes(header[4:8], "little")
+                    entries = np.frombuffer(file.read(entry_count * 16), dtype=[("offset", "<u8"), ("size", "<u4"), ("duration", "<u4")])
+                    super_index = [int(entry_offset) for entry_offset in entries["offset"]]
+
+            if stream_type == b"vids":
+                return stream_number, super_index
+            stream_number += 1
+
+        return None, None
+
+
+    def get_keyframe(self, frame_index):
+        '''
+        Returns the keyframe at or before a frame.
+
+            Parameters:
+                frame_index (int): Index of the frame.
+
+            Returns:
+                keyframe_index (int): Index of the keyframe to start decoding from.
+        '''
+
+        return int(self.keyframes[np.searchsorted(self.keyframes, frame_index, side="right") - 1])
+
+
+    def get_frame_at(self, timestamp):
+        '''
+        Returns the frame shown at a time of the video.
+
+            Parameters:
+                timestamp (float): Time in seconds.
+
+            Returns:
+                frame_index (int): Index of the frame.
+        '''
+
+        return max(int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1, 0)
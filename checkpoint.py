@@ -0,0 +1,149 @@
+import os
+import time
+import zlib
+import pickle
+
+
+class Checkpointer():
+    '''
+    Periodically stores the state of a run, so processing a long recording can resume after a crash.
+
+    Every component passed to save and restore provides get_state and set_state. The states are pickled
+    together, so objects shared between components stay shared, compressed and written under a temporary
+    name before replacing the previous checkpoint. A crash while writing leaves the previous one intact.
+
+        Attributes:
+            checkpoint_path (str): Path to the checkpoint file.
+            interval (float): Seconds of wall clock time between checkpoints.
+            compression_level (int): zlib level of the checkpoint. 0 to store it uncompressed.
+            last_save_time (float): Monotonic time of the last checkpoint.
+            save_count (int): Number of checkpoints written.
+            save_seconds (float): Total time spent writing checkpoints.
+            checkpoint_size (int): Size of the last checkpoint in bytes.
+    '''
+
+    # First byte of a checkpoint file, so it is read correctly whatever compression level wrote it.
+    raw_header = b"\x00"
+    compressed_header = b"\x01"
+
+
+    def __init__(self, checkpoint_path, interval=60.0, compression_level=1):
+        '''
+        Constructor for Checkpointer class.
+
+            Parameters:
+                checkpoint_path (str): Path to the checkpoint file.
+                interval (float): Seconds of wall clock time between checkpoints.
+                compression_level (int): zlib level of the checkpoint. 0 to store it uncompressed.
+        '''
+        self.checkpoint_path = checkpoint_path
+        self.interval = interval
+        self.compression_level = compression_level
+        self.last_save_time = time.monotonic()
+        self.save_count = 0
+        self.save_seconds = 0.0
+        self.checkpoint_size = 0
+
+
+    def if_due(self):
+        '''
+        Checks if the interval since the last checkpoint has passed.
+
+            Returns:
+                due (boolean): True if a checkpoint should be written.
+        '''
+
+        return time.monotonic() - self.last_save_time >= self.interval
+
+
+    def save(self, frame_count, components, loop_state=None):
+        '''
+        Writes a checkpoint.
+
+            Parameters:
+                frame_count (int): Number of frames fully processed, which is the frame to resume from.
+                components (dict): Objects with get_state such as: {"speed": speed}
+                loop_state (dict): Other values of the processing loop to restore.
+        '''
+        start = time.monotonic()
+        state = {
+            "frame_count": frame_count,
+            "components": {name: component.get_state() for name, component in components.items()},
+            "loop_state": loop_state or {},
+        }
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.compression_level:
+            data = self.compressed_header + zlib.compress(data, self.compression_level)
+        else:
+            data = self.raw_header + data
+
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+
+        self.last_save_time = time.monotonic()
+        self.save_count += 1
+        self.save_seconds += self.last_save_time - start
+        self.checkpoint_size = len(data)
+
+
+    def load(self):
+        '''
+        Reads the checkpoint without restoring it, for example to construct the camera at the right frame.
+
+            Returns:
+                state (dict): Frame count, component states and loop state, or None if there is no checkpoint.
+        '''
+        if not os.path.exists(self.checkpoint_path):
+            return None
+
+        with open(self.checkpoint_path, "rb") as file:
+            header, data = file.read(1), file.read()
+        if header == self.compressed_header:
+            data = zlib.decompress(data)
+        elif header != self.raw_header:
+            raise Exception(f"Unknown checkpoint format: {self.checkpoint_path}")
+
+        return pickle.loads(data)
+
+
+    def restore(self, components, state):
+        '''
+        Restores the components from a loaded checkpoint.
+
+            Parameters:
+                components (dict): Objects with set_state, named as when the checkpoint was saved.
+                state (dict): Checkpoint returned by load.
+
+            Returns:
+                frame_count (int): Frame to resume from.
+                loop_state (dict): Other values of the processing loop.
+        '''
+        for name, component in components.items():
+            if name in state["components"]:
+                component.set_state(state["components"][name])
+
+        return state["frame_count"], state["loop_state"]
+
+
+    def remove(self):
+        '''
+        Deletes the checkpoint once the run has finished.
+        '''
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the written checkpoints.
+
+            Returns:
+                summary (str): Number of checkpoints, their size and the time spent writing them.
+        '''
+        mean_milliseconds = 1000 * self.save_seconds / max(self.save_count, 1)
+
+        return f"Checkpointer wrote {self.save_count} checkpoints of {self.checkpoint_size / 1024:.0f} KiB in {mean_milliseconds:.1f} ms on average."
@@ -0,0 +1,87 @@
+import speed as s
+import numpy as np
+
+
+# Zones of main.py and a straight path of vehicles driving through them
+entry_area = [(164, 97), (300, 78), (364, 136), (180, 172)]
+exit_area = [(255, 534), (727, 343), (870, 484), (306, 747)]
+deleting_line = [(310, 832), (861, 633), (955, 826), (366, 1050)]
+length = 39.0  # in meters
+path_start = np.array([150.0, -80.0])
+path_end = np.array([640.0, 1000.0])
+box_size = np.array([90.0, 70.0])
+
+fps = 25.0
+reference_fps = 1000.0
+skip_factors = [1, 2, 3, 4, 6, 8, 10, 12]
+vehicle_count = 200
+
+
+class NullLogger():
+    '''
+    Logger that drops every message.
+    '''
+
+    def debug(self, message, *args):
+        pass
+
+
+class MemoryReporter():
+    '''
+    Reporter that keeps the measured speeds in memory.
+    '''
+
+    def __init__(self):
+        self.speeds = {}
+
+    def add_to_report(self, frame, id, speed, bbox, time):
+        self.speeds[id] = speed
+
+
+def measure(pixel_speed, phase, frame_rate, skip, interpolate):
+    '''
+    Drives one vehicle along the path and returns the speed measured by Speed.
+
+        Parameters:
+            pixel_speed (float): Speed of the vehicle in pixels per second.
+            phase (float): Offset in seconds between the start of the path and the first frame.
+            frame_rate (float): Frame rate of the simulated camera.
+            skip (int): Only every skip-th frame is processed.
+            interpolate (boolean): True if crossing times are interpolated. Otherwise the original frame quantized logic is used.
+
+        Returns:
+            speed (float or None): Measured speed in Km/h, or None if the vehicle was not measured.
+    '''
+    speed = s.Speed(entry_area, exit_area, deleting_line, length, NullLogger(), interpolate_crossings=interpolate, count_containment=interpolate)
+    reporter = MemoryReporter()
+    direction = (path_end - path_start) / np.linalg.norm(path_end - path_start)
+    duration = np.linalg.norm(path_end - path_start) / pixel_speed
+
+    frame_count = 0
+    while frame_count / frame_rate < duration + phase:
+        if frame_count % skip == 0:
+            center = path_start + direction * pixel_speed * max(frame_count / frame_rate - phase, 0)
+            x_min, y_min = center - box_size / 2
+            x_max, y_max = center + box_size / 2
+            speed.process_frame(None, [(int(x_min), int(y_min), int(x_max), int(y_max), 1)], False, frame_count, frame_rate, reporter)
+        frame_count += 1
+
+    return reporter.speeds.get(1, None)
+
+
+if __name__ == "__main__":
+    random = np.random.default_rng(0)
+    pixel_speeds = random.uniform(150, 900, vehicle_count)
+    phases = random.uniform(0, 1, vehicle_count)
+    references = [measure(pixel_speed, 0, reference_fps, 1, False) for pixel_speed in pixel_speeds]
+
+    print(f"Mean absolute speed error (Km/h) against a {int(reference_fps)} fps reference over {vehicle_count} vehicles")
+    print("skip | frame gap (ms) | quantized | interpolated")
+    for skip in skip_factors:
+        errors = {False: [], True: []}
+        for pixel_speed, phase, reference in zip(pixel_speeds, phases, references):
+            for interpolate in (False, True):
+                measured = measure(pixel_speed, phase, fps, skip, interpolate)
+                if isinstance(measured, (float, np.floating)) and isinstance(reference, (float, np.floating)):
+                    errors[interpolate].append(abs(measured - reference))
+        print(f"{skip:4d} | {1000 * skip / fps:14.0f} | {np.mean(errors[False]):9.3f} | {np.mean(errors[True]):12.3f}")
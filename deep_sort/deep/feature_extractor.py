@@ -2,7 +2,11 @@ import torch
 import torchvision.transforms as transforms
 import numpy as np
 import cv2
+import time
+import queue
 import logging
+import threading
+from concurrent.futures import Future
 
 import sys
 # so that init does not execute in the package
@@ -52,6 +56,105 @@ class Extractor(object):
         return features.cpu().numpy()
 
 
+class BatchedExtractor(object):
+    """
+    Feature extraction service shared by several trackers and cameras.
+
+    Crops submitted from any thread are queued, and a worker thread runs them through one Extractor in
+    batches of up to `max_batch_size` crops, waiting at most `max_wait` seconds for a batch to fill. A
+    request is never split, so every caller gets the features of its own crops in order. Calling the
+    service like an Extractor blocks until those features are ready, so it can be passed as the
+    `extractor` of DeepSort without changing how a tracker behaves.
+    """
+    def __init__(self, extractor, max_batch_size=64, max_wait=0.005):
+        self.extractor = extractor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batch_count = 0
+        self.crop_count = 0
+        self.busy_seconds = 0.0
+        self.closed = False
+        self._stop = object()
+        self.thread = threading.Thread(target=self._run, name="batched-extractor", daemon=True)
+        self.thread.start()
+
+    def submit(self, im_crops):
+        """
+        Queues crops for the next batch and returns a Future resolving to their features.
+        """
+        future = Future()
+        if not len(im_crops):
+            future.set_result(np.array([]))
+            return future
+        if self.closed:
+            raise Exception("BatchedExtractor is closed.")
+        self.requests.put((list(im_crops), future))
+        return future
+
+    def __call__(self, im_crops):
+        return self.submit(im_crops).result()
+
+    def _run(self):
+        pending = None
+        while True:
+            request = pending if pending is not None else self.requests.get()
+            pending = None
+            if request is self._stop:
+                break
+
+            batch = [request]
+            size = len(request[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if request is self._stop or size + len(request[0]) > self.max_batch_size:
+                    # Left for the next batch, or to stop once this batch is done.
+                    pending = request
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            self._extract(batch)
+
+    def _extract(self, batch):
+        crops = [im for im_crops, _ in batch for im in im_crops]
+        start = time.monotonic()
+        try:
+            features = self.extractor(crops)
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        self.busy_seconds += time.monotonic() - start
+        self.batch_count += 1
+        self.crop_count += len(crops)
+
+        offset = 0
+        for im_crops, future in batch:
+            future.set_result(features[offset:offset + len(im_crops)])
+            offset += len(im_crops)
+
+    def close(self):
+        """
+        Extracts the queued crops and stops the worker thread.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.requests.put(self._stop)
+        self.thread.join()
+
+    def get_summary(self):
+        mean_batch_size = self.crop_count / max(self.batch_count, 1)
+        crops_per_second = self.crop_count / max(self.busy_seconds, 1e-9)
+        return "Batched extractor ran {} crops in {} batches ({:.1f} crops per batch, {:.0f} crops per second).".format(
+            self.crop_count, self.batch_count, mean_batch_size, crops_per_second)
+
+
 if __name__ == '__main__':
     img = cv2.imread("demo.jpg")[:, :, (2, 1, 0)]
     extr = Extractor("osnet_x1_0")
@@ -11,9 +11,14 @@ __all__ = ['DeepSort']
 
 
 class DeepSort(object):
-    def __init__(self, model_type, max_dist=0.2, max_iou_distance=0.7, max_age=70, n_init=3, nn_budget=100, use_cuda=True):
+    def __init__(self, model_type, max_dist=0.2, max_iou_distance=0.7, max_age=70, n_init=3, nn_budget=100, use_cuda=True, extractor=None):
 
-        self.extractor = Extractor(model_type, use_cuda=use_cuda)
+        # An extractor can be shared between several trackers. Without a model type there is no extractor,
+        # and the features are passed to `update_with_features`.
+        if extractor is not None:
+            self.extractor = extractor
+        else:
+            self.extractor = Extractor(model_type, use_cuda=use_cuda) if model_type is not None else None
 
         max_cosine_distance = max_dist
         metric = NearestNeighborDistanceMetric(
@@ -22,9 +27,24 @@ class DeepSort(object):
             metric, max_iou_distance=max_iou_distance, max_age=max_age, n_init=n_init)
 
     def update(self, bbox_xywh, confidences, classes, ori_img, use_yolo_preds=True):
+        features = self.get_features(bbox_xywh, ori_img)
+        return self.update_with_features(bbox_xywh, confidences, classes, features, ori_img.shape, use_yolo_preds)
+
+    def get_features(self, bbox_xywh, ori_img):
+        """
+        Extract the appearance features of the detections, so they can be cached
+        and passed to `update_with_features` later.
+        """
         self.height, self.width = ori_img.shape[:2]
+        return self._get_features(bbox_xywh, ori_img)
+
+    def update_with_features(self, bbox_xywh, confidences, classes, features, image_shape, use_yolo_preds=True):
+        """
+        Update the tracker with detections whose appearance features were already
+        extracted. `image_shape` is the shape of the frame the detections belong to.
+        """
+        self.height, self.width = image_shape[:2]
         # generate detections
-        features = self._get_features(bbox_xywh, ori_img)
         bbox_tlwh = self._xywh_to_tlwh(bbox_xywh)
         detections = [Detection(bbox_tlwh[i], conf, features[i]) for i, conf in enumerate(
             confidences)]
@@ -55,6 +75,27 @@ class DeepSort(object):
             outputs = np.stack(outputs, axis=0)
         return outputs
 
+    def predict(self, max_time_since_update=1):
+        """
+        Propagate all tracks one frame forward without a measurement and output the
+        kalman filter boxes of confirmed tracks updated within `max_time_since_update` frames.
+        """
+        self.tracker.predict()
+
+        outputs = []
+        if not self.tracker.tracks:
+            return outputs
+        for track in self.tracker.tracks:
+            if not track.is_confirmed() or track.time_since_update > max_time_since_update:
+                continue
+            x1, y1, x2, y2 = track.to_tlbr()
+            x1, y1 = max(int(x1), 0), max(int(y1), 0)
+            x2, y2 = min(int(x2), self.width - 1), min(int(y2), self.height - 1)
+            outputs.append(np.array([x1, y1, x2, y2, track.track_id, track.class_id], dtype=np.int))
+        if len(outputs) > 0:
+            outputs = np.stack(outputs, axis=0)
+        return outputs
+
     """
     TODO:
         Convert bbox from xc_yc_w_h to xtl_ytl_w_h
@@ -94,6 +135,9 @@ class DeepSort(object):
     def increment_ages(self):
         self.tracker.increment_ages()
 
+    def add_track_deletion_callback(self, callback):
+        self.tracker.add_deletion_callback(callback)
+
     def _xyxy_to_tlwh(self, bbox_xyxy):
         x1, y1, x2, y2 = bbox_xyxy
 
@@ -32,6 +32,8 @@ class Tracker:
         A Kalman filter to filter target trajectories in image space.
     tracks : List[Track]
         The list of active tracks at the current time step.
+    deletion_callbacks : List[Callable[int]]
+        Callables notified with the track id of every deleted track.
     """
     GATING_THRESHOLD = np.sqrt(kalman_filter.chi2inv95[4])
 
@@ -45,6 +47,19 @@ class Tracker:
         self.kf = kalman_filter.KalmanFilter()
         self.tracks = []
         self._next_id = 1
+        self.deletion_callbacks = []
+
+    def add_deletion_callback(self, callback):
+        """Register a callable that is notified with the track id of every
+        deleted track.
+
+        Parameters
+        ----------
+        callback : Callable[int]
+            Called once per deleted track.
+
+        """
+        self.deletion_callbacks.append(callback)
 
     def predict(self):
         """Propagate track state distributions one time step forward.
@@ -80,6 +95,10 @@ class Tracker:
             self.tracks[track_idx].mark_missed()
         for detection_idx in unmatched_detections:
             self._initiate_track(detections[detection_idx], classes[detection_idx].item())
+        for track in self.tracks:
+            if track.is_deleted():
+                for callback in self.deletion_callbacks:
+                    callback(track.track_id)
         self.tracks = [t for t in self.tracks if not t.is_deleted()]
 
         # Update distance metric.
@@ -1,6 +1,8 @@
 import torch
 import os
 import cv2
+import numpy as np
+from torchvision.ops import nms
 
 
 class Detector():
@@ -18,7 +20,7 @@ class Detector():
         self.model = None
 
 
-    def set_detection_model(self, git_repo, model_type, model_wights_path):
+    def set_detection_model(self, git_repo, model_type, model_wights_path, device=None):
         '''
         Sets the model for detection.
 
@@ -26,12 +28,13 @@ class Detector():
                 git_repo (string): Reference to the git repository where the model is stored.
                 model_type (string): Type of model (custom of pre-built).
                 model_wights_path (string): Path to the model weights.
+                device (string): Device of the model such as: "cpu". None for the GPU if there is one.
         '''
         if not os.path.exists(model_wights_path):
             raise FileNotFoundError("Invalid path to model weights.")
 
         if model_type == "custom":
-            self.model = torch.hub.load(git_repo, model_type, model_wights_path, source="local", force_reload=True)       
+            self.model = torch.hub.load(git_repo, model_type, model_wights_path, source="local", force_reload=True, device=device)
         else:
             raise Exception("Invalid model type.")
 
@@ -128,7 +131,7 @@ class VehicleDetector(Detector):
     Vehicle detector class. Inherits from Detector class.
     '''
 
-    def __init__(self, git_repo="yolov5", model_type="custom", model_wights_path=os.path.join("yolov5", "models", "yolov5s.pt")):
+    def __init__(self, git_repo="yolov5", model_type="custom", model_wights_path=os.path.join("yolov5", "models", "yolov5s.pt"), device=None):
         '''
         Constructor for VehicleDetector class.
 
@@ -136,6 +139,412 @@ class VehicleDetector(Detector):
                 git_repo (string): Reference to the git repository where the model is stored.
                 model_type (string): Type of model (custom of pre-built).
                 path (string): Path to the model weights.
+                device (string): Device of the model such as: "cpu". None for the GPU if there is one.
         '''
         super().__init__()
-        self.set_detection_model(git_repo, model_type, model_wights_path)
\ No newline at end of file
+        self.set_detection_model(git_repo, model_type, model_wights_path, device)
+
+
+class CascadedVehicleDetector(Detector):
+    '''
+    Two tier vehicle detector that runs a fast model on every frame and escalates to an accurate model when uncertain.
+
+        Attributes:
+            fast_model (model object): Model that runs on every frame.
+            accurate_model (model object): Model that runs only on escalation.
+            uncertainty_band (tuple): Confidence range, as (low, high), in which a fast model detection counts as uncertain.
+            vehicle_classes (tuple): Range of vehicle class indices, as (first, last), considered for escalation.
+            zone_rects (numpy array): Bounding rectangles of the measurement zones grown by the zone margin.
+            region_escalation (boolean): True if only the uncertain regions are sent to the accurate model.
+            max_regions (int): Maximum number of regions before escalating the full frame.
+            padding (int): Padding in pixels added around each escalated region.
+            crop_size (int): Inference size used for the escalated regions.
+            iou_threshold (float): IoU threshold for merging the fast and accurate detections.
+            frame_count (int): Number of frames processed.
+            escalated_frame_count (int): Number of frames that ran the accurate model.
+            region_escalation_count (int): Number of regions sent to the accurate model.
+            full_frame_escalation_count (int): Number of full frames sent to the accurate model.
+            tracker_escalation_count (int): Number of frames escalated because of unmatched tracks near the zones.
+    '''
+
+    def __init__(self, git_repo="yolov5", model_type="custom", fast_model_weights_path=os.path.join("yolov5", "models", "yolov5n.pt"),
+                 accurate_model_weights_path=os.path.join("yolov5", "models", "yolov5s.pt"), uncertainty_band=(0.25, 0.55),
+                 region_escalation=True, max_regions=4, padding=32, crop_size=320, iou_threshold=0.45):
+        '''
+        Constructor for CascadedVehicleDetector class.
+
+            Parameters:
+                git_repo (string): Reference to the git repository where the models are stored.
+                model_type (string): Type of model (custom of pre-built).
+                fast_model_weights_path (string): Path to the weights of the model that runs on every frame.
+                accurate_model_weights_path (string): Path to the weights of the model that runs only on escalation.
+                uncertainty_band (tuple): Confidence range, as (low, high), in which a fast model detection counts as uncertain.
+                region_escalation (boolean): True if only the uncertain regions are sent to the accurate model.
+                max_regions (int): Maximum number of regions before escalating the full frame.
+                padding (int): Padding in pixels added around each escalated region.
+                crop_size (int): Inference size used for the escalated regions.
+                iou_threshold (float): IoU threshold for merging the fast and accurate detections.
+        '''
+        super().__init__()
+        self.set_detection_model(git_repo, model_type, accurate_model_weights_path)
+        self.accurate_model = self.model
+        self.set_detection_model(git_repo, model_type, fast_model_weights_path)
+        self.fast_model = self.model
+
+        self.uncertainty_band = uncertainty_band
+        self.vehicle_classes = (1, 7)
+        self.zone_rects = np.zeros((0, 4), dtype=np.float32)
+        self.region_escalation = region_escalation
+        self.max_regions = max_regions
+        self.padding = padding
+        self.crop_size = crop_size
+        self.iou_threshold = iou_threshold
+
+        self.frame_count = 0
+        self.escalated_frame_count = 0
+        self.region_escalation_count = 0
+        self.full_frame_escalation_count = 0
+        self.tracker_escalation_count = 0
+
+
+    def set_zones(self, zones, zone_margin=40):
+        '''
+        Sets the measurement zones near which unmatched tracks trigger escalation.
+
+            Parameters:
+                zones (list): List of areas, such as the entry and exit areas.
+                zone_margin (int): Distance in pixels around a zone that counts as near the zone.
+        '''
+        zone_rects = []
+        for zone in zones:
+            zone = np.array(zone, dtype=np.float32)
+            zone_rects.append([zone[:, 0].min() - zone_margin, zone[:, 1].min() - zone_margin,
+                               zone[:, 0].max() + zone_margin, zone[:, 1].max() + zone_margin])
+        self.zone_rects = np.array(zone_rects, dtype=np.float32).reshape(-1, 4)
+
+
+    def get_escalation_regions(self, detections, unmatched_tracks):
+        '''
+        Returns the regions the fast model is not sure about.
+
+            Parameters:
+                detections (pytorch tensor object): Fast model detections, each arranged such as: [x_min, y_min, x_max, y_max, confidence, class]
+                unmatched_tracks (list): List of confirmed deepsort Track objects that missed their last detection.
+
+            Returns:
+                regions (list): List of boxes such as: (x_min, y_min, x_max, y_max)
+                tracker_escalation (boolean): True if an unmatched track near the zones asked for escalation.
+        '''
+        low, high = self.uncertainty_band
+        uncertain = ((detections[:, 4] >= low) & (detections[:, 4] < high) &
+                     (detections[:, 5] >= self.vehicle_classes[0]) & (detections[:, 5] <= self.vehicle_classes[1]))
+        regions = [tuple(box) for box in detections[uncertain, :4].tolist()]
+
+        tracker_escalation = False
+        for track in unmatched_tracks:
+            x_min, y_min, x_max, y_max = track.to_tlbr()
+            if np.any((x_min <= self.zone_rects[:, 2]) & (x_max >= self.zone_rects[:, 0]) &
+                      (y_min <= self.zone_rects[:, 3]) & (y_max >= self.zone_rects[:, 1])):
+                regions.append((x_min, y_min, x_max, y_max))
+                tracker_escalation = True
+
+        return regions, tracker_escalation
+
+
+    def get_detection_results(self, frame, unmatched_tracks=()):
+        '''
+        Returns detection results from the fast model, refined by the accurate model where the fast model is uncertain.
+
+            Parameters:
+                frame (numpy array): Frame to run inference on.
+                unmatched_tracks (list): List of confirmed deepsort Track objects that missed their last detection.
+
+            Returns:
+                results (pytorch tensor object or DetectionResults object): The results of inference on the given frame.
+        '''
+        self.frame_count += 1
+        results = self.fast_model(frame)
+        detections = results.xyxy[0]
+
+        regions, tracker_escalation = self.get_escalation_regions(detections, unmatched_tracks)
+        if not regions:
+            return results
+
+        self.escalated_frame_count += 1
+        self.tracker_escalation_count += int(tracker_escalation)
+
+        if not self.region_escalation or len(regions) > self.max_regions:
+            self.full_frame_escalation_count += 1
+            return self.accurate_model(frame)
+
+        height, width = frame.shape[:2]
+        crops = [(max(int(x_min) - self.padding, 0), max(int(y_min) - self.padding, 0),
+                  min(int(x_max) + self.padding, width), min(int(y_max) + self.padding, height))
+                 for x_min, y_min, x_max, y_max in regions]
+        crops = [crop for crop in crops if crop[2] > crop[0] and crop[3] > crop[1]]
+        if not crops:
+            return results
+        self.region_escalation_count += len(crops)
+
+        accurate_results = self.accurate_model([frame[y_min: y_max, x_min: x_max] for x_min, y_min, x_max, y_max in crops], size=self.crop_size)
+
+        # Fast model detections centered inside an escalated region are replaced by the accurate ones.
+        centers_x = (detections[:, 0] + detections[:, 2]) / 2
+        centers_y = (detections[:, 1] + detections[:, 3]) / 2
+        replaced = torch.zeros(detections.shape[0], dtype=torch.bool, device=detections.device)
+        merged = []
+        for (x_min, y_min, x_max, y_max), crop_detections in zip(crops, accurate_results.xyxy):
+            replaced |= (centers_x >= x_min) & (centers_x <= x_max) & (centers_y >= y_min) & (centers_y <= y_max)
+            crop_detections = crop_detections.clone().to(detections.device)
+            crop_detections[:, [0, 2]] += x_min
+            crop_detections[:, [1, 3]] += y_min
+            merged.append(crop_detections)
+        merged = torch.cat([detections[~replaced]] + merged, dim=0)
+        keep = nms(merged[:, :4], merged[:, 4], self.iou_threshold)
+
+        return DetectionResults(merged[keep])
+
+
+    def get_summary(self):
+        '''
+        Returns a short summary of how often the accurate model ran.
+
+            Returns:
+                summary (string): Escalated frames, regions and full frames.
+        '''
+        escalated_percentage = 100 * self.escalated_frame_count / max(self.frame_count, 1)
+
+        return (f"Cascaded detector escalated {self.escalated_frame_count} of {self.frame_count} frames ({escalated_percentage:.1f}%): "
+                f"{self.region_escalation_count} regions, {self.full_frame_escalation_count} full frames, "
+                f"{self.tracker_escalation_count} requested by unmatched tracks near the zones.")
+
+
+class DetectionResults():
+    '''
+    Minimal stand-in for yolov5 Detections holding results assembled outside of a single model call.
+
+        Attributes:
+            xyxy (list): List with one tensor of detected objects, each arranged such as: [x_min, y_min, x_max, y_max, confidence, class]
+    '''
+
+    def __init__(self, detections):
+        '''
+        Constructor for DetectionResults class.
+
+            Parameters:
+                detections (pytorch tensor object): Tensor of detected objects in frame co-ordinates.
+        '''
+        self.xyxy = [detections]
+
+
+class AttentionCropper():
+    '''
+    Class for running detection only on regions around motion and predicted tracks.
+
+        Attributes:
+            detector (Detector object): Detector that runs the full frame sweeps.
+            crop_model (model object): Model that runs on the crops.
+            frame_size (tuple): Size of the video frames as (width, height).
+            crop_size (int): Inference size used for the batched crops.
+            padding (int): Padding in pixels added around each region.
+            full_frame_interval (int): Number of frames between full frame sweeps that catch newcomers.
+            max_crops (int): Maximum number of crops before falling back to a full frame sweep.
+            max_crop_fraction (float): Fraction of the frame the crops may cover before falling back to a full frame sweep.
+            iou_threshold (float): IoU threshold for the cross-crop non maximum suppression.
+            frame_count (int): Number of frames processed.
+            inferred_pixels (int): Number of pixels sent to the model.
+            full_frame_count (int): Number of full frame sweeps.
+    '''
+
+    def __init__(self, detector, frame_size, crop_size=320, padding=32, full_frame_interval=15, max_crops=8,
+                 max_crop_fraction=0.5, iou_threshold=0.45, min_blob_area=4, crop_model=None):
+        '''
+        Constructor for AttentionCropper class.
+
+            Parameters:
+                detector (Detector object): Detector that runs the full frame sweeps.
+                frame_size (tuple): Size of the video frames as (width, height).
+                crop_size (int): Inference size used for the batched crops.
+                padding (int): Padding in pixels added around each region.
+                full_frame_interval (int): Number of frames between full frame sweeps that catch newcomers.
+                max_crops (int): Maximum number of crops before falling back to a full frame sweep.
+                max_crop_fraction (float): Fraction of the frame the crops may cover before falling back to a full frame sweep.
+                iou_threshold (float): IoU threshold for the cross-crop non maximum suppression.
+                min_blob_area (int): Minimum area of a motion blob in the downsampled motion mask.
+                crop_model (model object): Model that runs on the crops. None for the accurate model of a cascaded detector,
+                                           since the crops skip its escalation, or the model of any other detector.
+        '''
+        self.detector = detector
+        if crop_model is None:
+            crop_model = detector.accurate_model if isinstance(detector, CascadedVehicleDetector) else detector.get_detection_model()
+        self.crop_model = crop_model
+        self.frame_size = frame_size
+        self.crop_size = crop_size
+        self.padding = padding
+        self.full_frame_interval = full_frame_interval
+        self.max_crops = max_crops
+        self.max_crop_fraction = max_crop_fraction
+        self.iou_threshold = iou_threshold
+        self.min_blob_area = min_blob_area
+
+        self.frame_count = 0
+        self.inferred_pixels = 0
+        self.full_frame_count = 0
+
+
+    def get_motion_regions(self, motion_mask, scale):
+        '''
+        Returns the bounding boxes of motion blobs in frame co-ordinates.
+
+            Parameters:
+                motion_mask (numpy array): Downsampled binary mask of changed pixels.
+                scale (float): Factor by which the motion mask was downsampled.
+
+            Returns:
+                regions (list): List of boxes such as: (x_min, y_min, x_max, y_max)
+        '''
+        motion_mask = cv2.dilate(motion_mask, np.ones((3, 3), dtype=np.uint8), iterations=2)
+        contours, _ = cv2.findContours(motion_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        regions = []
+        for contour in contours:
+            if cv2.contourArea(contour) < self.min_blob_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            regions.append((x / scale, y / scale, (x + w) / scale, (y + h) / scale))
+
+        return regions
+
+
+    def get_track_regions(self, tracks):
+        '''
+        Returns the kalman filter predicted boxes of the live tracks for the current frame.
+
+            Parameters:
+                tracks (list): List of deepsort Track objects.
+
+            Returns:
+                regions (list): List of boxes such as: (x_min, y_min, x_max, y_max)
+        '''
+        regions = []
+        for track in tracks:
+            x_min, y_min, x_max, y_max = track.to_tlbr()
+            velocity_x, velocity_y = track.mean[4], track.mean[5]
+            regions.append((x_min + velocity_x, y_min + velocity_y, x_max + velocity_x, y_max + velocity_y))
+
+        return regions
+
+
+    def merge_regions(self, regions):
+        '''
+        Pads the regions, clips them to the frame and merges the overlapping ones.
+
+            Parameters:
+                regions (list): List of boxes such as: (x_min, y_min, x_max, y_max)
+
+            Returns:
+                crops (list): List of integer crop boxes such as: (x_min, y_min, x_max, y_max)
+        '''
+        width, height = self.frame_size
+        crops = [[max(int(x_min) - self.padding, 0), max(int(y_min) - self.padding, 0),
+                  min(int(x_max) + self.padding, width), min(int(y_max) + self.padding, height)]
+                 for x_min, y_min, x_max, y_max in regions]
+        crops = [crop for crop in crops if crop[2] > crop[0] and crop[3] > crop[1]]
+
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(crops)):
+                for j in range(i + 1, len(crops)):
+                    a, b = crops[i], crops[j]
+                    if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                        crops[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del crops[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        return crops
+
+
+    def get_detection_results(self, frame, motion_mask=None, motion_scale=1.0, tracks=()):
+        '''
+        Returns detection results for the frame by running the model only on the regions of interest.
+
+            Parameters:
+                frame (numpy array): Frame to run inference on.
+                motion_mask (numpy array): Downsampled binary mask of changed pixels, if available.
+                motion_scale (float): Factor by which the motion mask was downsampled.
+                tracks (list): List of deepsort Track objects.
+
+            Returns:
+                results (DetectionResults object): The merged results in frame co-ordinates.
+        '''
+        self.frame_count += 1
+        width, height = self.frame_size
+
+        regions = self.get_track_regions(tracks)
+        if motion_mask is not None:
+            regions += self.get_motion_regions(motion_mask, motion_scale)
+        crops = self.merge_regions(regions)
+        crop_area = sum((x_max - x_min) * (y_max - y_min) for x_min, y_min, x_max, y_max in crops)
+
+        if (self.frame_count % self.full_frame_interval == 1 or len(crops) > self.max_crops
+                or crop_area > self.max_crop_fraction * width * height):
+            self.full_frame_count += 1
+            self.inferred_pixels += width * height
+            results = self.detector.get_detection_results(frame)
+
+            return DetectionResults(results.xyxy[0])
+
+        if not crops:
+            return DetectionResults(torch.zeros((0, 6)))
+
+        self.inferred_pixels += crop_area
+        results = self.crop_model([frame[y_min: y_max, x_min: x_max] for x_min, y_min, x_max, y_max in crops], size=self.crop_size)
+
+        detections = []
+        for (x_min, y_min, _, _), crop_detections in zip(crops, results.xyxy):
+            crop_detections = crop_detections.clone()
+            crop_detections[:, [0, 2]] += x_min
+            crop_detections[:, [1, 3]] += y_min
+            detections.append(crop_detections)
+        detections = torch.cat(detections, dim=0)
+
+        # Vehicles cut by a crop border show up in neighbouring crops as well.
+        keep = nms(detections[:, :4], detections[:, 4], self.iou_threshold)
+
+        return DetectionResults(detections[keep])
+
+
+    def get_summary(self):
+        '''
+        Returns a short summary of the pixels sent to the model.
+
+            Returns:
+                summary (string): Full frame sweeps and inferred pixels relative to full frame inference.
+        '''
+        full_frame_pixels = max(self.frame_count * self.frame_size[0] * self.frame_size[1], 1)
+
+        return f"Attention cropper ran {self.full_frame_count} full frame sweeps over {self.frame_count} frames and inferred {100 * self.inferred_pixels / full_frame_pixels:.1f}% of the full frame pixels."
+
+
+    def get_state(self):
+        '''
+        Returns the frame counters to store in a checkpoint.
+
+            Returns:
+                state (dict): Attributes that change while processing.
+        '''
+
+        return {"frame_count": self.frame_count, "inferred_pixels": self.inferred_pixels, "full_frame_count": self.full_frame_count}
+
+
+    def set_state(self, state):
+        '''
+        Restores the frame counters of a checkpoint.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        self.__dict__.update(state)
@@ -0,0 +1,637 @@
+import os
+import csv
+import time
+import sqlite3
+import threading
+from datetime import datetime
+import numpy as np
+
+
+class SpeedEventStore():
+    '''
+    Columnar store of speed events partitioned by camera and day.
+
+    Every partition is a directory holding chunks of events saved as structured .npy arrays sorted by
+    timestamp, and an index with the timestamp and speed range of each chunk. Queries only open the
+    partitions and chunks whose ranges overlap the requested ones, and chunks are memory-mapped.
+    Buffered events are written once chunk_size of them are waiting or the oldest waited flush_interval
+    seconds, so a quiet camera still shows up for other readers. The last chunk of a partition is merged
+    into the next write while it is smaller than chunk_size, so frequent flushes do not fragment a partition.
+    Every event keeps its sequence number within its partition, which checkpoints roll back to.
+    Only one process should write to a camera at a time.
+
+        Attributes:
+            store_path (str): Root directory of the store.
+            chunk_size (int): Number of buffered events per partition before a chunk is written.
+            flush_interval (float): Maximum number of seconds an event stays buffered.
+            event_dtype (numpy dtype): Columns of an event.
+            chunk_dtype (numpy dtype): Columns of an event in a chunk file.
+            index_dtype (numpy dtype): Columns of a partition index entry.
+    '''
+
+    event_dtype = np.dtype([("timestamp", "f8"), ("speed", "f4"), ("id", "i8"), ("video_time", "f8")])
+    chunk_dtype = np.dtype(event_dtype.descr + [("sequence", "i8")])
+    index_dtype = np.dtype([("chunk", "i4"), ("rows", "i4"), ("timestamp_min", "f8"), ("timestamp_max", "f8"),
+                            ("speed_min", "f4"), ("speed_max", "f4"), ("sequence_min", "i8"), ("sequence_max", "i8")])
+
+    def __init__(self, store_path, chunk_size=4096, flush_interval=60.0):
+        '''
+        Constructor for SpeedEventStore class. Starts the background flusher.
+
+            Parameters:
+                store_path (str): Root directory of the store.
+                chunk_size (int): Number of buffered events per partition before a chunk is written.
+                flush_interval (float): Maximum number of seconds an event stays buffered.
+        '''
+        if not os.path.exists(store_path):
+            os.makedirs(store_path)
+
+        self.store_path = store_path
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.buffers = {}  # {(camera, day): [event rows]}
+        self.buffer_times = {}  # {(camera, day): monotonic time the oldest buffered event was added}
+        self.sequences = {}  # {(camera, day): sequence number of the next event}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.flusher_thread = threading.Thread(target=self.flush_old_buffers, name="event-store-flusher", daemon=True)
+        self.flusher_thread.start()
+
+
+    def get_partition_path(self, camera, day):
+        '''
+        Returns the directory of a partition.
+
+            Parameters:
+                camera (str): Name of the camera.
+                day (str): Day of the events such as: YYYY-MM-DD
+
+            Returns:
+                partition_path (str): Directory of the partition.
+        '''
+
+        return os.path.join(self.store_path, f"camera={camera}", f"day={day}")
+
+
+    def get_chunk_path(self, partition_path, chunk):
+        '''
+        Returns the file of a chunk.
+
+            Parameters:
+                partition_path (str): Directory of the partition.
+                chunk (int): Number of the chunk.
+
+            Returns:
+                chunk_path (str): Path of the chunk file.
+        '''
+
+        return os.path.join(partition_path, f"chunk_{int(chunk):06d}.npy")
+
+
+    def add(self, camera, timestamp, id, speed, video_time):
+        '''
+        Adds a speed event to the store.
+
+            Parameters:
+                camera (str): Name of the camera.
+                timestamp (float): Wall clock time of the event as seconds since the epoch.
+                id (int): ID of the tracked object.
+                speed (float or str): Speed of the object in Km/h. Anything that is not a number is stored as NaN.
+                video_time (float): Time of the event in the video in seconds.
+        '''
+        speed = speed if isinstance(speed, (int, float)) else np.nan
+        key = (camera, datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d"))
+
+        with self.lock:
+            if key not in self.sequences:
+                index = self.read_index(self.get_partition_path(*key))
+                self.sequences[key] = int(index["sequence_max"].max()) + 1 if len(index) else 0
+            buffer = self.buffers.setdefault(key, [])
+            if not buffer:
+                self.buffer_times[key] = time.monotonic()
+            buffer.append((timestamp, speed, id, video_time, self.sequences[key]))
+            self.sequences[key] += 1
+            if len(buffer) >= self.chunk_size:
+                self.write_chunk(key)
+
+
+    def read_index(self, partition_path):
+        '''
+        Reads the chunk index of a partition.
+
+            Parameters:
+                partition_path (str): Directory of the partition.
+
+            Returns:
+                index (numpy array): Index entries sorted by the smallest timestamp of each chunk.
+        '''
+        index_path = os.path.join(partition_path, "index.npy")
+        if not os.path.exists(index_path):
+            return np.zeros(0, dtype=self.index_dtype)
+
+        return np.load(index_path)
+
+
+    def write_chunk(self, key):
+        '''
+        Writes the buffered events of a partition, merged with the last chunk if that one is small.
+
+            Parameters:
+                key (tuple): Partition key such as: (camera, day)
+        '''
+        rows = self.buffers.pop(key, [])
+        self.buffer_times.pop(key, None)
+        if not rows:
+            return
+
+        partition_path = self.get_partition_path(*key)
+        if not os.path.exists(partition_path):
+            os.makedirs(partition_path)
+
+        events = np.array(rows, dtype=self.chunk_dtype)
+        index = self.read_index(partition_path)
+        replaced_chunks = []
+        if len(index):
+            last_entry = index[np.argmax(index["chunk"])]
+            if last_entry["rows"] < self.chunk_size:
+                events = np.concatenate([np.load(self.get_chunk_path(partition_path, last_entry["chunk"])), events])
+                replaced_chunks.append(int(last_entry["chunk"]))
+
+        self.replace_chunks(partition_path, index, replaced_chunks, events)
+
+
+    def replace_chunks(self, partition_path, index, replaced_chunks, events):
+        '''
+        Writes events as new chunks of at most chunk_size events in place of the replaced chunks.
+        The new chunk files are written before the index, and the replaced ones are removed after it.
+
+            Parameters:
+                partition_path (str): Directory of the partition.
+                index (numpy array): Current index of the partition.
+                replaced_chunks (list): Numbers of the chunks whose events are part of the given events.
+                events (numpy array): Events of the new chunks, with the columns of chunk_dtype.
+        '''
+        next_chunk = int(index["chunk"].max()) + 1 if len(index) else 0
+        index = index[~np.isin(index["chunk"], replaced_chunks)]
+        events = events[np.argsort(events["timestamp"], kind="stable")]
+
+        entries = []
+        for first in range(0, len(events), self.chunk_size):
+            chunk_events = events[first: first + self.chunk_size]
+            np.save(self.get_chunk_path(partition_path, next_chunk), chunk_events)
+            speeds = chunk_events["speed"][~np.isnan(chunk_events["speed"])]
+            entries.append((next_chunk, len(chunk_events), chunk_events["timestamp"][0], chunk_events["timestamp"][-1],
+                            speeds.min() if len(speeds) else np.nan, speeds.max() if len(speeds) else np.nan,
+                            chunk_events["sequence"].min(), chunk_events["sequence"].max()))
+            next_chunk += 1
+        index = np.sort(np.concatenate([index, np.array(entries, dtype=self.index_dtype)]), order="timestamp_min")
+
+        # The index is replaced atomically so readers never see a partial file.
+        temporary_path = os.path.join(partition_path, "index.tmp.npy")
+        np.save(temporary_path, index)
+        os.replace(temporary_path, os.path.join(partition_path, "index.npy"))
+        for chunk in replaced_chunks:
+            os.remove(self.get_chunk_path(partition_path, chunk))
+
+
+    def flush_old_buffers(self):
+        '''
+        Method run by the background flusher. Writes the buffers whose oldest event waited flush_interval seconds.
+        '''
+        while not self.stopped.wait(min(self.flush_interval, 1.0)):
+            with self.lock:
+                now = time.monotonic()
+                for key in [key for key, added in self.buffer_times.items() if now - added >= self.flush_interval]:
+                    self.write_chunk(key)
+
+
+    def flush(self):
+        '''
+        Writes the buffered events of every partition.
+        '''
+        with self.lock:
+            for key in list(self.buffers):
+                self.write_chunk(key)
+
+
+    def close(self):
+        '''
+        Writes the remaining buffered events and stops the background flusher.
+        '''
+        self.stopped.set()
+        if self.flusher_thread.is_alive():
+            self.flusher_thread.join()
+        self.flush()
+
+
+    def get_state(self, camera):
+        '''
+        Writes the buffered events and returns the number of events in every partition of a camera, to store in a checkpoint.
+
+            Parameters:
+                camera (str): Name of the camera.
+
+            Returns:
+                state (dict): Sequence number of the next event per partition directory such as: {"day=2024-05-01": 1200}
+        '''
+        self.flush()
+        state = {}
+        for partition_path in self.get_partitions(camera):
+            index = self.read_index(partition_path)
+            state[os.path.basename(partition_path)] = int(index["sequence_max"].max()) + 1 if len(index) else 0
+
+        return state
+
+
+    def set_state(self, camera, state):
+        '''
+        Removes the events of a camera written after a checkpoint, so resuming from it does not store them twice.
+
+            Parameters:
+                camera (str): Name of the camera.
+                state (dict): State returned by get_state.
+        '''
+        with self.lock:
+            for key in [key for key in self.buffers if key[0] == camera]:
+                del self.buffers[key]
+                self.buffer_times.pop(key, None)
+            self.sequences = {key: sequence for key, sequence in self.sequences.items() if key[0] != camera}
+
+            for partition_path in self.get_partitions(camera):
+                next_sequence = state.get(os.path.basename(partition_path), 0)
+                index = self.read_index(partition_path)
+                replaced_chunks = index["chunk"][index["sequence_max"] >= next_sequence].tolist()
+                kept = [events[events["sequence"] < next_sequence] for events in
+                        (np.load(self.get_chunk_path(partition_path, chunk)) for chunk in replaced_chunks)]
+                events = np.concatenate(kept) if kept else np.zeros(0, dtype=self.chunk_dtype)
+                self.replace_chunks(partition_path, index, replaced_chunks, events)
+
+
+    def get_partitions(self, camera=None, start=None, end=None):
+        '''
+        Returns the partitions that can hold events of the given camera and time range.
+
+            Parameters:
+                camera (str): Name of the camera. All cameras if None.
+                start (datetime): Earliest time of the events. Unbounded if None.
+                end (datetime): Latest time of the events. Unbounded if None.
+
+            Returns:
+                partition_paths (list): Directories of the matching partitions.
+        '''
+        # A day partition is named after local midnight, so the bounds are compared as dates.
+        first_day = start.strftime("%Y-%m-%d") if start is not None else None
+        last_day = end.strftime("%Y-%m-%d") if end is not None else None
+
+        partition_paths = []
+        for camera_directory in sorted(os.listdir(self.store_path)):
+            if not camera_directory.startswith("camera=") or (camera is not None and camera_directory != f"camera={camera}"):
+                continue
+            for day_directory in sorted(os.listdir(os.path.join(self.store_path, camera_directory))):
+                day = day_directory[len("day="):]
+                if (first_day is not None and day < first_day) or (last_day is not None and day > last_day):
+                    continue
+                partition_paths.append(os.path.join(self.store_path, camera_directory, day_directory))
+
+        return partition_paths
+
+
+    def query(self, camera=None, start=None, end=None, min_speed=None, max_speed=None, hours=None):
+        '''
+        Returns the events matching every given filter.
+
+            Parameters:
+                camera (str): Name of the camera. All cameras if None.
+                start (datetime): Earliest time of the events. Unbounded if None.
+                end (datetime): Latest time of the events. Unbounded if None.
+                min_speed (float): Smallest speed in Km/h. Unbounded if None.
+                max_speed (float): Largest speed in Km/h. Unbounded if None.
+                hours (tuple): Range of the hour of day, such as (7, 9) for 7 to 9 AM, on every day. Any hour if None.
+
+            Returns:
+                events (numpy array): Matching events sorted by timestamp within each partition.
+        '''
+        self.flush()
+        start_timestamp = start.timestamp() if start is not None else -np.inf
+        end_timestamp = end.timestamp() if end is not None else np.inf
+
+        results = []
+        for partition_path in self.get_partitions(camera, start, end):
+            while True:
+                try:
+                    results += self.query_partition(partition_path, start_timestamp, end_timestamp, min_speed, max_speed, hours)
+                except FileNotFoundError:
+                    # A chunk was merged into a new one after the index was read, so the partition is read again.
+                    continue
+                break
+
+        if not results:
+            return np.zeros(0, dtype=self.event_dtype)
+
+        return np.concatenate(results)
+
+
+    def query_partition(self, partition_path, start_timestamp, end_timestamp, min_speed, max_speed, hours):
+        '''
+        Returns the events of one partition matching every given filter.
+
+            Parameters:
+                partition_path (str): Directory of the partition.
+                start_timestamp (float): Earliest time of the events as seconds since the epoch.
+                end_timestamp (float): Latest time of the events as seconds since the epoch.
+                min_speed (float): Smallest speed in Km/h. Unbounded if None.
+                max_speed (float): Largest speed in Km/h. Unbounded if None.
+                hours (tuple): Range of the hour of day, such as (7, 9) for 7 to 9 AM, on every day. Any hour if None.
+
+            Returns:
+                results (list): Matching events per chunk.
+        '''
+        low_speed = min_speed if min_speed is not None else -np.inf
+        high_speed = max_speed if max_speed is not None else np.inf
+        index = self.read_index(partition_path)
+        candidates = index[(index["timestamp_max"] >= start_timestamp) & (index["timestamp_min"] <= end_timestamp)]
+        if min_speed is not None or max_speed is not None:
+            candidates = candidates[(candidates["speed_max"] >= low_speed) & (candidates["speed_min"] <= high_speed)]
+
+        results = []
+        for entry in candidates:
+            events = np.load(self.get_chunk_path(partition_path, entry["chunk"]), mmap_mode="r")
+            first = np.searchsorted(events["timestamp"], start_timestamp, side="left")
+            last = np.searchsorted(events["timestamp"], end_timestamp, side="right")
+            events = events[first: last]
+
+            mask = np.ones(len(events), dtype=bool)
+            if min_speed is not None or max_speed is not None:
+                mask &= (events["speed"] >= low_speed) & (events["speed"] <= high_speed)
+            if hours is not None:
+                hour_of_day = np.array([datetime.fromtimestamp(timestamp).hour for timestamp in events["timestamp"]], dtype=np.int64)
+                mask &= (hour_of_day >= hours[0]) & (hour_of_day < hours[1])
+
+            # The sequence numbers are internal to the store, so only the event columns are returned.
+            selected = events[mask]
+            matches = np.empty(len(selected), dtype=self.event_dtype)
+            for name in self.event_dtype.names:
+                matches[name] = selected[name]
+            results.append(matches)
+
+        return results
+
+
+    def export_csv(self, csv_path, **filters):
+        '''
+        Writes the events matching the filters to a CSV file.
+
+            Parameters:
+                csv_path (str): Path of the CSV file.
+                filters (dict): Filters accepted by query.
+        '''
+        events = self.query(**filters)
+        with open(csv_path, 'w', encoding='UTF8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['ID', 'timestamp', 'speed(km/h)', 'video_time(s)'])
+            for event in events:
+                speed = "Inconclusive" if np.isnan(event["speed"]) else round(float(event["speed"]), 3)
+                writer.writerow([int(event["id"]), datetime.fromtimestamp(event["timestamp"]).strftime("%d-%m-%Y %H:%M:%S"),
+                                 speed, round(float(event["video_time"]), 3)])
+
+
+
+class SQLiteEventStore():
+    '''
+    Speed event store backed by a local SQLite database.
+
+    The database runs in WAL mode so readers never block the writers, and events are inserted in
+    transactional batches of at most batch_size events or flush_interval seconds. A background flusher
+    inserts a batch whose first event waited flush_interval seconds, so a quiet feed still reaches other
+    readers. Every worker process opens its own connection and SQLite serialises the writers, so several
+    processes can share one file.
+
+        Attributes:
+            database_path (str): Path of the SQLite database file.
+            batch_size (int): Number of buffered events that triggers an insert.
+            flush_interval (float): Maximum number of seconds an event stays buffered.
+            busy_timeout (int): Milliseconds a writer waits for the database lock.
+    '''
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS speed_events ("
+        "camera TEXT NOT NULL, timestamp REAL NOT NULL, id INTEGER NOT NULL, speed REAL, video_time REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS speed_events_camera_timestamp ON speed_events (camera, timestamp)",
+        "CREATE INDEX IF NOT EXISTS speed_events_speed ON speed_events (speed)",
+    )
+    insert_statement = "INSERT INTO speed_events (camera, timestamp, id, speed, video_time) VALUES (?, ?, ?, ?, ?)"
+
+    def __init__(self, database_path, batch_size=256, flush_interval=1.0, busy_timeout=30000):
+        '''
+        Constructor for SQLiteEventStore class. Starts the background flusher.
+
+            Parameters:
+                database_path (str): Path of the SQLite database file.
+                batch_size (int): Number of buffered events that triggers an insert.
+                flush_interval (float): Maximum number of seconds an event stays buffered.
+                busy_timeout (int): Milliseconds a writer waits for the database lock.
+        '''
+        database_directory = os.path.dirname(database_path)
+        if database_directory and not os.path.exists(database_directory):
+            os.makedirs(database_directory)
+
+        self.database_path = database_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.busy_timeout = busy_timeout
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+        self.last_flush = time.monotonic()
+
+        connection = self.get_connection()
+        with connection:
+            for statement in self.schema:
+                connection.execute(statement)
+
+        self.stopped = threading.Event()
+        self.flusher_thread = threading.Thread(target=self.flush_old_buffer, name="sqlite-event-store-flusher", daemon=True)
+        self.flusher_thread.start()
+
+
+    def get_connection(self):
+        '''
+        Returns the connection of the current process, opening it if needed.
+
+            Returns:
+                connection (sqlite3 Connection object): Connection to the database.
+        '''
+        if self.connection is None or self.connection_pid != os.getpid():
+            # Connections must not cross a fork, so every process opens its own.
+            self.connection = sqlite3.connect(self.database_path, timeout=self.busy_timeout / 1000, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+            self.connection_pid = os.getpid()
+
+        return self.connection
+
+
+    def add(self, camera, timestamp, id, speed, video_time):
+        '''
+        Adds a speed event to the store.
+
+            Parameters:
+                camera (str): Name of the camera.
+                timestamp (float): Wall clock time of the event as seconds since the epoch.
+                id (int): ID of the tracked object.
+                speed (float or str): Speed of the object in Km/h. Anything that is not a number is stored as NULL.
+                video_time (float): Time of the event in the video in seconds.
+        '''
+        speed = float(speed) if isinstance(speed, (int, float)) else None
+
+        with self.lock:
+            if not self.buffer:
+                self.last_flush = time.monotonic()
+            self.buffer.append((camera, float(timestamp), int(id), speed, float(video_time)))
+            if len(self.buffer) >= self.batch_size:
+                self.write_buffer()
+
+
+    def write_buffer(self):
+        '''
+        Inserts the buffered events in one transaction.
+        '''
+        if not self.buffer:
+            return
+
+        connection = self.get_connection()
+        with connection:
+            connection.executemany(self.insert_statement, self.buffer)
+        self.buffer = []
+
+
+    def flush_old_buffer(self):
+        '''
+        Method run by the background flusher. Inserts the buffered events once the first of them waited flush_interval seconds.
+        '''
+        while not self.stopped.wait(min(self.flush_interval, 0.1)):
+            with self.lock:
+                if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+                    self.write_buffer()
+
+
+    def flush(self):
+        '''
+        Inserts the buffered events.
+        '''
+        with self.lock:
+            self.write_buffer()
+
+
+    def get_state(self, camera):
+        '''
+        Inserts the buffered events and returns the last row of a camera, to store in a checkpoint.
+
+            Parameters:
+                camera (str): Name of the camera.
+
+            Returns:
+                state (dict): Largest rowid of the events of the camera.
+        '''
+        with self.lock:
+            self.write_buffer()
+            row = self.get_connection().execute("SELECT MAX(rowid) FROM speed_events WHERE camera = ?", (camera,)).fetchone()
+
+        return {"last_rowid": row[0] if row[0] is not None else 0}
+
+
+    def set_state(self, camera, state):
+        '''
+        Deletes the events of a camera inserted after a checkpoint, so resuming from it does not store them twice.
+
+            Parameters:
+                camera (str): Name of the camera.
+                state (dict): State returned by get_state.
+        '''
+        with self.lock:
+            self.buffer = [event for event in self.buffer if event[0] != camera]
+            connection = self.get_connection()
+            with connection:
+                connection.execute("DELETE FROM speed_events WHERE camera = ? AND rowid > ?", (camera, state["last_rowid"]))
+
+
+    def close(self):
+        '''
+        Inserts the remaining buffered events, stops the background flusher and closes the connection.
+        '''
+        self.stopped.set()
+        if self.flusher_thread.is_alive():
+            self.flusher_thread.join()
+        with self.lock:
+            self.write_buffer()
+            if self.connection is not None and self.connection_pid == os.getpid():
+                self.connection.close()
+                self.connection = None
+
+
+    def query(self, camera=None, start=None, end=None, min_speed=None, max_speed=None, hours=None):
+        '''
+        Returns the events matching every given filter.
+
+            Parameters:
+                camera (str): Name of the camera. All cameras if None.
+                start (datetime): Earliest time of the events. Unbounded if None.
+                end (datetime): Latest time of the events. Unbounded if None.
+                min_speed (float): Smallest speed in Km/h. Unbounded if None.
+                max_speed (float): Largest speed in Km/h. Unbounded if None.
+                hours (tuple): Range of the hour of day, such as (7, 9) for 7 to 9 AM, on every day. Any hour if None.
+
+            Returns:
+                events (numpy array): Matching events sorted by timestamp, with the columns of SpeedEventStore.
+        '''
+        conditions, parameters = [], []
+        if camera is not None:
+            conditions.append("camera = ?")
+            parameters.append(camera)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            parameters.append(start.timestamp())
+        if end is not None:
+            conditions.append("timestamp <= ?")
+            parameters.append(end.timestamp())
+        if min_speed is not None:
+            conditions.append("speed >= ?")
+            parameters.append(min_speed)
+        if max_speed is not None:
+            conditions.append("speed <= ?")
+            parameters.append(max_speed)
+        if hours is not None:
+            conditions.append("CAST(strftime('%H', timestamp, 'unixepoch', 'localtime') AS INTEGER) >= ?")
+            conditions.append("CAST(strftime('%H', timestamp, 'unixepoch', 'localtime') AS INTEGER) < ?")
+            parameters += [hours[0], hours[1]]
+
+        statement = "SELECT timestamp, speed, id, video_time FROM speed_events"
+        if conditions:
+            statement += " WHERE " + " AND ".join(conditions)
+        with self.lock:
+            # The connection is shared with the flusher, so statements on it never interleave.
+            self.write_buffer()
+            rows = self.get_connection().execute(statement + " ORDER BY timestamp", parameters).fetchall()
+
+        return np.array([(timestamp, np.nan if speed is None else speed, id, video_time) for timestamp, speed, id, video_time in rows],
+                        dtype=SpeedEventStore.event_dtype)
+
+
+    def export_csv(self, csv_path, **filters):
+        '''
+        Writes the events matching the filters to a CSV file.
+
+            Parameters:
+                csv_path (str): Path of the CSV file.
+                filters (dict): Filters accepted by query.
+        '''
+        events = self.query(**filters)
+        with open(csv_path, 'w', encoding='UTF8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['ID', 'timestamp', 'speed(km/h)', 'video_time(s)'])
+            for event in events:
+                speed = "Inconclusive" if np.isnan(event["speed"]) else round(float(event["speed"]), 3)
+                writer.writerow([int(event["id"]), datetime.fromtimestamp(event["timestamp"]).strftime("%d-%m-%Y %H:%M:%S"),
+                                 speed, round(float(event["video_time"]), 3)])
@@ -0,0 +1,205 @@
+import os
+import gc
+import time
+import torch
+import multiprocessing as mp
+import detection as d
+import tracker as t
+import camera as c
+import speed as s
+import utilities as u
+from deep_sort.deep.feature_extractor import Extractor
+
+
+def get_private_memory():
+    '''
+    Returns the memory only the calling process uses, which is what every extra worker adds.
+
+        Returns:
+            private_memory (int): Private resident bytes, or None where /proc is not available.
+    '''
+    try:
+        with open("/proc/self/smaps_rollup") as file:
+            return 1024 * sum(int(line.split()[1]) for line in file if line.startswith(("Private_Clean:", "Private_Dirty:")))
+    except OSError:
+        return None
+
+
+class ForkServer():
+    '''
+    Loads the detection and re-identification models once and forks worker processes from the loaded parent.
+
+    Workers inherit the imported modules and model weights instead of importing torch, the yolov5 tree and
+    torchreid and reading the weights again, so starting one takes milliseconds. The weights are never written
+    after loading, so their pages stay shared copy-on-write between all workers. gc.freeze keeps the garbage
+    collector from writing to the headers of the inherited objects, which would otherwise copy their pages.
+
+    The models are kept on the CPU, since CUDA can not be used in a forked child once the parent initialized it.
+    The parent also loads with one torch thread and never runs inference, so no thread pool exists at fork time,
+    and every worker sets its own number of threads after the fork.
+
+        Attributes:
+            detector (VehicleDetector object): Detector inherited by the workers.
+            extractor (Extractor object): Feature extractor inherited by the workers.
+            threads_per_worker (int): Number of torch threads of each worker.
+            processes (list): Started worker processes.
+            load_seconds (float): Time spent importing and loading the models.
+            start_seconds (float): Total time spent starting workers.
+    '''
+
+    def __init__(self, weights_path=os.path.join("yolov5", "models", "yolov5s.pt"), reid_model="osnet_x0_25", threads_per_worker=1):
+        '''
+        Constructor for ForkServer class. Loads the models.
+
+            Parameters:
+                weights_path (string): Path to the detector weights.
+                reid_model (string): Name of the re-identification model.
+                threads_per_worker (int): Number of torch threads of each worker. Usually the number of cores divided by the number of workers.
+        '''
+        if "fork" not in mp.get_all_start_methods():
+            raise Exception("The fork server needs the fork start method, which this platform does not provide.")
+        if torch.cuda.is_initialized():
+            raise Exception("CUDA was initialized before the fork server, so workers could not use the models.")
+
+        start = time.monotonic()
+        torch.set_num_threads(1)
+        self.detector = d.VehicleDetector(model_wights_path=weights_path, device="cpu")
+        self.extractor = Extractor(reid_model, use_cuda=False)
+        self.load_seconds = time.monotonic() - start
+
+        self.threads_per_worker = threads_per_worker
+        self.context = mp.get_context("fork")
+        self.processes = []
+        self.start_seconds = 0.0
+        gc.collect()
+        gc.freeze()
+
+
+    def run_worker(self, target, args):
+        '''
+        Entry point of a worker process. Configures torch for the worker and runs the target.
+
+            Parameters:
+                target (callable): Function called with the server followed by args.
+                args (tuple): Arguments of the target.
+        '''
+        torch.set_num_threads(self.threads_per_worker)
+        target(self, *args)
+
+
+    def start(self, target, args=()):
+        '''
+        Forks a worker process.
+
+            Parameters:
+                target (callable): Function called in the worker with the server followed by args.
+                                   The models are available as server.detector and server.extractor.
+                args (tuple): Arguments of the target.
+
+            Returns:
+                process (Process object): The started worker.
+        '''
+        start = time.monotonic()
+        process = self.context.Process(target=self.run_worker, args=(target, args))
+        process.start()
+        self.start_seconds += time.monotonic() - start
+        self.processes.append(process)
+
+        return process
+
+
+    def get_tracker(self):
+        '''
+        Returns a new tracker using the inherited feature extractor. Called in a worker, it loads no weights.
+
+            Returns:
+                tracker (VehicleTracker object): Tracker with its own state.
+        '''
+
+        return t.VehicleTracker(extractor=self.extractor)
+
+
+    def join(self):
+        '''
+        Waits for every started worker to finish.
+
+            Returns:
+                exit_codes (list): Exit code per worker.
+        '''
+        for process in self.processes:
+            process.join()
+
+        return [process.exitcode for process in self.processes]
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the server.
+
+            Returns:
+                summary (string): Model load time and mean worker start time.
+        '''
+        mean_milliseconds = 1000 * self.start_seconds / max(len(self.processes), 1)
+
+        return f"Fork server loaded the models in {self.load_seconds:.1f} s and started {len(self.processes)} workers in {mean_milliseconds:.1f} ms on average."
+
+
+def process_camera(server, name, video_path, roi, zones, length, starting_time=6, confidence_threshold=0.5, data_path="Data"):
+    '''
+    Worker measuring the speeds of one video with the models of the fork server.
+
+        Parameters:
+            server (ForkServer object): Server the worker was forked from.
+            name (string): Name of the camera, also used for its log and report.
+            video_path (string): Path to the video.
+            roi (list): Co-ordinates for region of interest.
+            zones (tuple): Entry area, exit area and deleting line.
+            length (float): Length of the processing area in meters.
+            starting_time (int): Hour of the day the recording started.
+            confidence_threshold (float): Threshold for minimum confidence of detection.
+            data_path (string): Directory of the logs, reports and frames.
+    '''
+    # Threads of the parent do not exist after the fork, so the logger and reporter are created in the worker.
+    logger = u.Logger(data_path, name)
+    logger.info("Worker started with %s KiB of private memory.", (get_private_memory() or 0) // 1024)
+    camera = c.Camera(name, video_path, roi)
+    tracker = server.get_tracker()
+    speed = s.Speed(zones[0], zones[1], zones[2], length, logger)
+    tracker.add_track_deletion_listener(speed.forget)
+    reporter = u.Reporter(os.path.join(data_path, "Reports"), name, os.path.join(data_path, "Frames"), logger,
+                          ['ID', 'timestamp', 'speed(km/h)'], int(starting_time), image_format="jpg", camera_name=name)
+
+    frame_count = 0
+    while True:
+        success, frame = camera.read()
+        if not success:
+            break
+        masked_frame = camera.get_masked_frame(frame)
+        results = server.detector.get_detection_results(masked_frame)
+        tracked_objects_info = tracker.track(results, masked_frame, confidence_threshold)
+        speed.process_frame(masked_frame, tracked_objects_info, False, frame_count, camera.fps, reporter)
+        frame_count += 1
+
+    logger.info("Worker finished with %s KiB of private memory.", (get_private_memory() or 0) // 1024)
+    reporter.close()
+    logger.close()
+
+
+if __name__ == "__main__":
+    # Parameters to change
+    camera_settings = [
+        ("recording", os.path.join("Data", "recording.avi"),
+         [(145, 16), (273, 16), (955, 105), (955, 1072), (230, 1072)],
+         ([(164, 97), (300, 78), (364, 136), (180, 172)],
+          [(255, 534), (727, 343), (870, 484), (306, 747)],
+          [(310, 832), (861, 633), (955, 826), (366, 1050)]),
+         39.0),  # name, video, roi, (entry area, exit area, deleting line), length in meters
+    ]
+    threads_per_worker = max(os.cpu_count() // max(len(camera_settings), 1), 1)
+
+    server = ForkServer(threads_per_worker=threads_per_worker)
+    for settings in camera_settings:
+        server.start(process_camera, settings)
+    print(server.get_summary())
+    print(f"Parent uses {(get_private_memory() or 0) / 2**20:.0f} MiB of private memory.")
+    print("Exit codes:", server.join())
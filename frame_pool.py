@@ -0,0 +1,239 @@
+import time
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+
+class FrameHandle():
+    '''
+    Reference to a frame stored in a FramePool. Handles are small, so they are what is sent through queues
+    between processes instead of the frames themselves.
+
+        Attributes:
+            slot (int): Index of the slot holding the frame.
+            frame_index (int): Index of the frame in its video or stream.
+            timestamp (float): Capture time of the frame in seconds.
+    '''
+
+    def __init__(self, slot, frame_index=None, timestamp=None):
+        '''
+        Constructor for FrameHandle class.
+
+            Parameters:
+                slot (int): Index of the slot holding the frame.
+                frame_index (int): Index of the frame in its video or stream.
+                timestamp (float): Capture time of the frame in seconds.
+        '''
+        self.slot = slot
+        self.frame_index = frame_index
+        self.timestamp = timestamp
+
+
+class FramePool():
+    '''
+    Fixed number of frame slots in shared memory, so decoding, inference and tracking can run in separate
+    processes without copying or pickling every frame on each hop.
+
+    The pool is created once per camera resolution by the parent process and passed to the child processes
+    as a Process argument, which attaches them to the same memory. Frames are then referred to by FrameHandle.
+    Every slot has a reference count in the shared memory: put or acquire hands out a slot with a count of one,
+    retain adds a reference for every additional consumer and release drops one. A slot is reused once its
+    count is back to zero, and a full pool blocks the producer until a consumer releases a slot.
+
+        Attributes:
+            slot_shape (tuple): Shape of a frame such as: (height, width, 3).
+            slot_count (int): Number of slots.
+            dtype (numpy dtype): Type of the frame values.
+            name (str): Name of the shared memory block.
+            frames (numpy array): Views of all slots, shaped (slot_count, *slot_shape).
+            reference_counts (numpy array): Number of references per slot.
+            wait_seconds (float): Time this process spent waiting for a free slot.
+    '''
+
+    header_size = 64  # Slots start on a cache line after the reference counts
+
+
+    def __init__(self, slot_shape, slot_count, dtype=np.uint8, context=None):
+        '''
+        Constructor for FramePool class. Creates the shared memory block.
+
+            Parameters:
+                slot_shape (tuple): Shape of a frame such as: (height, width, 3).
+                slot_count (int): Number of slots. Should cover the frames in flight in all stages plus one per producer.
+                dtype (numpy dtype): Type of the frame values.
+                context (multiprocessing context): Context of the processes using the pool, such as mp.get_context("spawn"). None for the default.
+        '''
+        self.slot_shape = tuple(slot_shape)
+        self.slot_count = slot_count
+        self.dtype = np.dtype(dtype)
+        self.condition = (context or mp).Condition()
+        self.counts_size = -(-4 * slot_count // self.header_size) * self.header_size
+        size = self.counts_size + slot_count * int(np.prod(self.slot_shape)) * self.dtype.itemsize
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.memory.name
+        self.owner = True
+        self.attach_views()
+        self.reference_counts[:] = 0
+
+
+    def attach_views(self):
+        '''
+        Creates the numpy views of the reference counts and slots without copying.
+        '''
+        self.reference_counts = np.ndarray((self.slot_count,), dtype=np.int32, buffer=self.memory.buf)
+        self.frames = np.ndarray((self.slot_count,) + self.slot_shape, dtype=self.dtype, buffer=self.memory.buf, offset=self.counts_size)
+        self.wait_seconds = 0.0
+
+
+    def __getstate__(self):
+        return {
+            "slot_shape": self.slot_shape,
+            "slot_count": self.slot_count,
+            "dtype": self.dtype,
+            "condition": self.condition,
+            "counts_size": self.counts_size,
+            "name": self.name,
+        }
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.memory = shared_memory.SharedMemory(name=self.name)
+        self.owner = False
+        self.attach_views()
+
+
+    def acquire(self, timeout=None, frame_index=None, timestamp=None):
+        '''
+        Reserves a free slot with a reference count of one, waiting for one to be released if the pool is full.
+        The caller writes the frame into get_frame(handle), for example with cv2.VideoCapture.read(image=...)
+        to decode straight into shared memory.
+
+            Parameters:
+                timeout (float): Seconds to wait for a free slot. None to wait until one is released.
+                frame_index (int): Index of the frame in its video or stream.
+                timestamp (float): Capture time of the frame in seconds.
+
+            Returns:
+                handle (FrameHandle object): Handle of the slot, or None if no slot was released in time.
+        '''
+        start = time.monotonic()
+        with self.condition:
+            while True:
+                free_slots = np.flatnonzero(self.reference_counts == 0)
+                if len(free_slots):
+                    slot = int(free_slots[0])
+                    self.reference_counts[slot] = 1
+                    break
+                remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    self.wait_seconds += time.monotonic() - start
+                    return None
+                self.condition.wait(remaining)
+        self.wait_seconds += time.monotonic() - start
+
+        return FrameHandle(slot, frame_index, timestamp)
+
+
+    def put(self, frame, timeout=None, frame_index=None, timestamp=None):
+        '''
+        Copies a frame into a free slot.
+
+            Parameters:
+                frame (numpy array): Frame of the pool's shape.
+                timeout (float): Seconds to wait for a free slot. None to wait until one is released.
+                frame_index (int): Index of the frame in its video or stream.
+                timestamp (float): Capture time of the frame in seconds.
+
+            Returns:
+                handle (FrameHandle object): Handle of the slot, or None if no slot was released in time.
+        '''
+        if frame.shape != self.slot_shape:
+            raise Exception(f"Frame of shape {frame.shape} does not fit the slots of shape {self.slot_shape}.")
+
+        handle = self.acquire(timeout, frame_index, timestamp)
+        if handle is not None:
+            self.frames[handle.slot] = frame
+
+        return handle
+
+
+    def get_frame(self, handle):
+        '''
+        Returns the frame of a handle. The array is a view of the shared memory, valid until the handle is released.
+
+            Parameters:
+                handle (FrameHandle object): Handle of a retained slot.
+
+            Returns:
+                frame (numpy array): View of the slot.
+        '''
+
+        return self.frames[handle.slot]
+
+
+    def retain(self, handle, count=1):
+        '''
+        Adds references to a slot before its handle is passed to more consumers.
+
+            Parameters:
+                handle (FrameHandle object): Handle of a retained slot.
+                count (int): Number of references to add.
+        '''
+        with self.condition:
+            if self.reference_counts[handle.slot] <= 0:
+                raise Exception(f"Slot {handle.slot} was already released.")
+            self.reference_counts[handle.slot] += count
+
+
+    def release(self, handle):
+        '''
+        Drops a reference to a slot. The slot is reused once every reference is released.
+
+            Parameters:
+                handle (FrameHandle object): Handle of a retained slot.
+        '''
+        with self.condition:
+            if self.reference_counts[handle.slot] <= 0:
+                raise Exception(f"Slot {handle.slot} was already released.")
+            self.reference_counts[handle.slot] -= 1
+            if self.reference_counts[handle.slot] == 0:
+                self.condition.notify_all()
+
+
+    def get_used_slots(self):
+        '''
+        Returns the number of slots holding a frame.
+
+            Returns:
+                used_slots (int): Number of slots with references.
+        '''
+        with self.condition:
+            return int(np.count_nonzero(self.reference_counts))
+
+
+    def close(self):
+        '''
+        Detaches this process from the pool. The process that created the pool also frees the shared memory.
+        Views returned by get_frame must not be used afterwards.
+        '''
+        if self.memory is None:
+            return
+
+        del self.frames, self.reference_counts
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+        self.memory = None
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the pool.
+
+            Returns:
+                summary (str): Size of the pool and the time this process waited for free slots.
+        '''
+        slot_size = int(np.prod(self.slot_shape)) * self.dtype.itemsize
+
+        return f"Frame pool {self.name}: {self.slot_count} slots of {slot_size / 2**20:.1f} MiB, waited {self.wait_seconds:.2f} s for free slots."
@@ -0,0 +1,97 @@
+import time
+import numpy as np
+import multiprocessing as mp
+import frame_pool as fp
+
+
+# Frames of a 1080p camera passed from a decoding process to a consuming process
+frame_shape = (1080, 1920, 3)
+frame_count = 500
+slot_count = 8
+
+
+def consume(frame):
+    '''
+    Reads a sparse grid of the frame, standing in for a stage that uses it.
+    '''
+
+    return int(frame[::64, ::64].sum())
+
+
+def queue_consumer(frames, results):
+    '''
+    Receives pickled frames from a queue.
+    '''
+    latencies = []
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        sent, frame = item
+        consume(frame)
+        latencies.append(time.perf_counter() - sent)
+    results.put(latencies)
+
+
+def pool_consumer(pool, handles, results):
+    '''
+    Receives frame handles from a queue and reads the frames from the pool.
+    '''
+    latencies = []
+    while True:
+        item = handles.get()
+        if item is None:
+            break
+        sent, handle = item
+        consume(pool.get_frame(handle))
+        latencies.append(time.perf_counter() - sent)
+        pool.release(handle)
+    results.put(latencies)
+    pool.close()
+
+
+def run_queue(context, frame):
+    frames, results = context.Queue(maxsize=slot_count), context.Queue()
+    consumer = context.Process(target=queue_consumer, args=(frames, results))
+    consumer.start()
+    start = time.perf_counter()
+    for frame_index in range(frame_count):
+        frame[0, 0, 0] = frame_index % 256
+        frames.put((time.perf_counter(), frame))
+    frames.put(None)
+    latencies = results.get()
+    seconds = time.perf_counter() - start
+    consumer.join()
+
+    return seconds, latencies
+
+
+def run_pool(context, frame):
+    pool = fp.FramePool(frame_shape, slot_count, context=context)
+    handles, results = context.Queue(), context.Queue()
+    consumer = context.Process(target=pool_consumer, args=(pool, handles, results))
+    consumer.start()
+    start = time.perf_counter()
+    for frame_index in range(frame_count):
+        frame[0, 0, 0] = frame_index % 256
+        # The frame is copied once into shared memory, where a decoder could write it directly.
+        handles.put((time.perf_counter(), pool.put(frame, frame_index=frame_index)))
+    handles.put(None)
+    latencies = results.get()
+    seconds = time.perf_counter() - start
+    consumer.join()
+    pool.close()
+
+    return seconds, latencies
+
+
+if __name__ == "__main__":
+    context = mp.get_context("spawn")
+    frame = np.random.default_rng(0).integers(0, 256, frame_shape, dtype=np.uint8)
+
+    print(f"{frame_count} frames of {frame_shape} ({frame.nbytes / 2**20:.1f} MiB) from one process to another")
+    print("transport     | frames/s | mean latency (ms) | p99 latency (ms)")
+    for name, run in (("pickled queue", run_queue), ("frame pool", run_pool)):
+        seconds, latencies = run(context, frame)
+        latencies = 1000 * np.array(latencies)
+        print(f"{name:13s} | {frame_count / seconds:8.0f} | {latencies.mean():17.2f} | {np.percentile(latencies, 99):16.2f}")
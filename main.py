@@ -3,10 +3,18 @@ import tracker as t
 import camera as c
 import speed as s
 import utilities as u
+import event_store as e
+import traffic_stats as ts
+import calibration as cal
+import renderer as r
+import recorder as rec
+import cache as ch
+import checkpoint as cp
 from tqdm import tqdm
 import os
 import cv2
 import numpy as np
+from datetime import date, timedelta
 
 
 
@@ -22,80 +30,255 @@ entry_area = [(164, 97), (300, 78), (364, 136), (180, 172)]
 exit_area = [(255, 534), (727, 343), (870, 484), (306, 747)]
 deleting_line = [(310, 832), (861, 633), (955, 826), (366, 1050)]
 length = 39.0  # in meters
+# Image points with their ground coordinates in meters for perspective correct speeds, at least four pairs.
+# None to scale distances by the length above, e.g.
+# calibration_points = ([(164, 97), (300, 78), (870, 484), (306, 747)], [(0.0, 0.0), (7.0, 0.0), (7.0, 39.0), (0.0, 39.0)])
+calibration_points = None
 
 video_name = "recording.avi"
+stream_source = None  # RTSP url or device number of a live camera to read instead of the video. A video path replays it in real time
 logger_name = video_name.split(".")[0]
 report_file_name = logger_name
 starting_time = 6
+recording_date = None  # Day the video was recorded, e.g. date(2024, 5, 1). None to take it from the modification time of the video
+log_level = "INFO"  # DEBUG to trace every vehicle crossing the zones
+crop_format = "jpg"  # Format of the saved vehicle crops: png, jpg or webp
+event_store_type = "columnar"  # Also keep the speed events in a queryable store: columnar, sqlite or None
 
 # Flags to annotate or save the annotated video
 show_video = False
-save_video = True
+save_video = False  # The whole annotated video, large and slow to encode
+save_clips = True  # Short clips around every speed event
+clip_pre_roll = 3.0  # in seconds
+clip_post_roll = 2.0  # in seconds
+proxy_fps = None  # Frame rate of a downscaled full length proxy next to the clips, e.g. 2. None for no proxy
+annotate_interval = 1  # Draw boxes and labels on every n-th frame
+annotate_events_only = False  # Draw boxes and labels only on frames with a speed event
+playback_speed = 1
+
+# Motion gate to skip detection on frames where nothing moves inside the roi
+use_motion_gate = True
+motion_sensitivity = 0.002  # Fraction of roi pixels that must change to count as motion
+
+# Run detection only on keyframes and use tracker predicted boxes in between
+use_keyframes = True
+max_keyframe_interval = 6
+
+# Run detection only on crops around motion and predicted tracks, with periodic full frame sweeps
+use_attention_crops = False
+
+# Run the nano model on every frame and escalate to the larger model only when uncertain
+use_cascaded_detector = False
 
+# Keep the detections and re-identification features of a run, so reruns with other tracking or speed parameters skip inference.
+# The run recording the cache detects every frame with motion, also between keyframes, since reruns place their keyframes elsewhere
+use_detection_cache = True
+confidence_threshold = 0.5
 
-detector = d.VehicleDetector(model_wights_path=os.path.join("yolov5", "models", "yolov5s.pt"))
+# Store the state of the run periodically and resume from it after a crash
+use_checkpoints = True
+checkpoint_interval = 60.0  # in seconds
+
+
+if use_cascaded_detector:
+    detector = d.CascadedVehicleDetector(fast_model_weights_path=os.path.join("yolov5", "models", "yolov5n.pt"),
+                                         accurate_model_weights_path=os.path.join("yolov5", "models", "yolov5s.pt"))
+else:
+    detector = d.VehicleDetector(model_wights_path=os.path.join("yolov5", "models", "yolov5s.pt"))
 tracker = t.VehicleTracker()
-camera = c.Camera("Test", os.path.join("Data", video_name), roi)
+if stream_source is not None:
+    # A live stream can neither be resumed nor cached by its contents.
+    use_checkpoints = False
+    use_detection_cache = False
+checkpointer = cp.Checkpointer(os.path.join("Data", f"{logger_name}.checkpoint"), checkpoint_interval)
+checkpoint = checkpointer.load() if use_checkpoints else None
+if stream_source is not None:
+    camera = c.LiveCamera("Test", stream_source, roi)
+else:
+    camera = c.Camera("Test", os.path.join("Data", video_name), roi, processed_until=checkpoint["frame_count"] if checkpoint else None)
 frame_skipper = u.FrameSkipper(1)
-logger = u.Logger(os.path.join("Data"), logger_name)
-reporter = u.Reporter(os.path.join("Data", "Reports"), report_file_name, os.path.join("Data", "Frames"), logger, ['ID', 'timestamp', 'speed(km/h)'], int(starting_time))
-speed = s.Speed(entry_area, exit_area, deleting_line, length, logger)
+logger = u.Logger(os.path.join("Data"), logger_name, level=log_level)
+if event_store_type == "columnar":
+    event_store = e.SpeedEventStore(os.path.join("Data", "Events"))
+elif event_store_type == "sqlite":
+    event_store = e.SQLiteEventStore(os.path.join("Data", "Events", "speed_events.db"))
+else:
+    event_store = None
+reporter = u.Reporter(os.path.join("Data", "Reports"), report_file_name, os.path.join("Data", "Frames"), logger, ['ID', 'timestamp', 'speed(km/h)'], int(starting_time), image_format=crop_format,
+                      event_store=event_store, camera_name=camera.name, recording_date=recording_date or camera.get_recording_date(),
+                      recording_start=camera.start_wall_time if stream_source is not None else None)
+logger.info("Events are stored from the recording start %s on.", reporter.recording_start)
+if calibration_points is not None:
+    ground_calibration = cal.GroundCalibration(camera.process_coordinates(calibration_points[0], display_dimension=(962, 1080)),
+                                               calibration_points[1], camera.size)
+    logger.info(ground_calibration.get_summary())
+else:
+    ground_calibration = None
+# A vehicle can pass a zone edge between two processed frames, so containment counts as a hit whenever frames are skipped.
+count_containment = use_motion_gate or use_keyframes or frame_skipper.frames_skipped_before_processing > 1
+speed_zones, frame_zones = u.get_zones(camera.size, entry_area, exit_area, deleting_line)
+speed = s.Speed(*speed_zones, length, logger, count_containment=count_containment, calibration=ground_calibration)
+tracker.add_track_deletion_listener(speed.forget)
+traffic_aggregator = ts.TrafficAggregator()
+speed.add_event_listener(lambda id, vehicle_speed, time: traffic_aggregator.add(
+    camera.name, (reporter.recording_start + timedelta(seconds=time)).timestamp(), vehicle_speed))
+motion_gate = u.MotionGate(camera.roi, camera.size, sensitivity=motion_sensitivity)
+attention_cropper = d.AttentionCropper(detector, camera.size)
 
 if save_video:
-    output_video = cv2.VideoWriter(os.path.join("Data", f"output_{video_name}"), 
+    output_name = f"output_{video_name}"
+    if checkpoint is not None:
+        # An AVI can not be appended to, so the resumed part goes next to the video written before the crash.
+        output_name = f"output_{logger_name}_from_{checkpoint['frame_count']}{os.path.splitext(video_name)[1]}"
+        logger.info("Writing the annotated video from the checkpoint on to %s.", output_name)
+    output_video = cv2.VideoWriter(os.path.join("Data", output_name), 
                                 cv2.VideoWriter_fourcc(*'MJPG'),
                                 camera.fps, camera.size)
 
 
 roi = camera.process_coordinates(roi, display_dimension=(962, 1080))
-entry_area = camera.process_coordinates(entry_area, display_dimension=(962, 1080))
-exit_area = camera.process_coordinates(exit_area, display_dimension=(962, 1080))
-deleting_line = camera.process_coordinates(deleting_line, display_dimension=(962, 1080))
+entry_area, exit_area, deleting_line = frame_zones
+if use_detection_cache and (use_attention_crops or use_cascaded_detector):
+    # Crops and escalations depend on the tracks, so replaying them with other tracker parameters would not be equivalent.
+    logger.warning("The detection cache is disabled with attention crops and the cascaded detector.")
+    use_detection_cache = False
+if use_detection_cache:
+    weights_paths = [os.path.join("yolov5", "models", "yolov5s.pt")]
+    detection_cache = ch.DetectionCache(os.path.join("Data", "Cache"), os.path.join("Data", video_name), weights_paths,
+                                        {"reid_model": "osnet_x0_25", "confidence_threshold": confidence_threshold, "roi": roi,
+                                         "use_motion_gate": use_motion_gate, "motion_sensitivity": motion_sensitivity,
+                                         "frames_skipped_before_processing": frame_skipper.frames_skipped_before_processing},
+                                        resume=checkpoint is not None)
+keyframe_scheduler = u.KeyframeScheduler([entry_area, exit_area], max_interval=max_keyframe_interval)
+if use_cascaded_detector:
+    detector.set_zones([entry_area, exit_area])
+render_output = save_video or save_clips or show_video
+if render_output:
+    renderer = r.AnnotationRenderer(camera.size, [entry_area, exit_area, deleting_line], [output_video] if save_video else [],
+                                    show=show_video, wait_time=int(camera.fps * playback_speed) if show_video else 1,
+                                    annotate_interval=annotate_interval, events_only=annotate_events_only, logger=logger)
+    speed.add_event_listener(renderer.add_event)
+if save_clips:
+    clip_recorder = rec.ClipRecorder(os.path.join("Data", "Clips"), logger_name, camera.fps, camera.size,
+                                     pre_roll=clip_pre_roll, post_roll=clip_post_roll, render=renderer.render, proxy_fps=proxy_fps)
+    speed.add_event_listener(clip_recorder.add_event)
+    renderer.add_recorder(clip_recorder)
 
 
-FRAME_COUNT = 0
-p_bar = tqdm(total = camera.total_frames)
-logger.info("Starting processing frames.")
+
+def detect(masked_frame):
+    '''
+    Runs the selected detector and the re-identification model on a frame.
+
+        Parameters:
+            masked_frame (numpy array): Masked frame to run inference on.
+
+        Returns:
+            detections (tuple): xywhs, confidences, classes and features of the detections.
+    '''
+    if use_attention_crops:
+        results = attention_cropper.get_detection_results(masked_frame, motion_gate.motion_mask if use_motion_gate else None,
+                                                          motion_gate.scale, tracker.get_tracks())
+    elif use_cascaded_detector:
+        results = detector.get_detection_results(masked_frame, tracker.unmatched_tracks)
+    else:
+        results = detector.get_detection_results(masked_frame)
+    xywhs, confidences, classes = tracker.get_detections(results, confidence_threshold)
+
+    return xywhs, confidences, classes, tracker.get_features(xywhs, masked_frame)
+
+
+FRAME_COUNT = camera.processed_until or 0
 annotate = True
-playback_speed = 1
+tracked_objects_info = []
+checkpoint_components = {"tracker": tracker, "speed": speed, "frame_skipper": frame_skipper, "motion_gate": motion_gate,
+                         "keyframe_scheduler": keyframe_scheduler, "attention_cropper": attention_cropper, "reporter": reporter,
+                         "traffic_aggregator": traffic_aggregator}
+if use_detection_cache:
+    checkpoint_components["detection_cache"] = detection_cache
+if checkpoint is not None:
+    FRAME_COUNT, loop_state = checkpointer.restore(checkpoint_components, checkpoint)
+    tracked_objects_info = loop_state["tracked_objects_info"]
+    logger.info("Resuming from the checkpoint at frame %s.", FRAME_COUNT)
+p_bar = tqdm(total = camera.total_frames, initial = FRAME_COUNT)
+logger.info("Starting processing frames.")
 
 while True:
-    success, frame = camera.video.read()
+    success, frame = camera.read()
 
     if success:
         p_bar.update(1)
         
         if frame_skipper.if_process_frame():
             masked_frame = camera.get_masked_frame(frame)
-            results = detector.get_detection_results(masked_frame)
-            tracked_objects_info = tracker.track(results, masked_frame, confidence_threshold=0.5)
 
-            masked_frame = speed.process_frame(masked_frame, tracked_objects_info, save_video, 
-                                               FRAME_COUNT, camera.fps, reporter)
+            if not use_motion_gate or motion_gate.if_motion(frame):
+                keyframe = not use_keyframes or keyframe_scheduler.if_keyframe(tracker.get_tracks())
+                if use_detection_cache:
+                    detections = detection_cache.detect_frame(FRAME_COUNT, lambda: detect(masked_frame), keyframe)
+                elif keyframe:
+                    detections = detect(masked_frame)
+                if keyframe:
+                    tracked_objects_info = tracker.track_with_features(*detections, masked_frame.shape)
+                else:
+                    tracked_objects_info = tracker.predict(keyframe_scheduler.frames_since_keyframe)
+            else:
+                tracked_objects_info = tracker.coast()
+                if use_detection_cache:
+                    detection_cache.add_step(FRAME_COUNT, detection_cache.coasted_step)
+
+            masked_frame = speed.process_frame(masked_frame, tracked_objects_info, False, 
+                                               FRAME_COUNT, camera.fps, reporter, timestamp=camera.frame_timestamp)
 
         frame_skipper.increment_skipped_frame_count()
         frame_skipper.reset_skipped_frame_count()
+        # Time of the frame as Speed reports it, which places the clips of its events.
+        frame_time = camera.frame_timestamp if camera.frame_timestamp is not None else FRAME_COUNT / camera.fps
         FRAME_COUNT += 1
 
-        if save_video:
-            cv2.polylines(masked_frame,[np.array([entry_area[0], entry_area[1], entry_area[2], entry_area[3]], np.int32)], True, (15, 220, 18), 6)
-            cv2.polylines(masked_frame,[np.array([exit_area[0], exit_area[1], exit_area[2], exit_area[3]], np.int32)], True, (15, 220, 18), 6)
-            cv2.polylines(masked_frame,[np.array([deleting_line[0], deleting_line[1], deleting_line[2], deleting_line[3]], np.int32)], True, (15, 220, 18), 6)
-            
-            if show_video:
-                cv2.imshow("Video", masked_frame)
-                k = cv2.waitKey(int(camera.fps * playback_speed))
-                if k == ord('q'):
-                    break
-            
-            output_video.write(masked_frame)
-
-    elif p_bar.n == camera.total_frames:
+        if render_output:
+            renderer.submit(masked_frame, speed.get_annotations(tracked_objects_info), frame_time)
+            renderer.display()
+            if renderer.stopped:
+                break
+
+        if use_checkpoints and checkpointer.if_due():
+            checkpointer.save(FRAME_COUNT, checkpoint_components, {"tracked_objects_info": tracked_objects_info})
+
+    elif p_bar.n == camera.total_frames or stream_source is not None:
+        if stream_source is not None:
+            camera.close()
+            logger.info(camera.get_summary())
+        if use_motion_gate:
+            logger.info(motion_gate.get_summary())
+        if use_keyframes:
+            logger.info(keyframe_scheduler.get_summary())
+        if use_attention_crops:
+            logger.info(attention_cropper.get_summary())
+        if use_cascaded_detector:
+            logger.info(detector.get_summary())
+        logger.info("Speed state size: %s", speed.get_state_size())
+        if use_detection_cache:
+            detection_cache.close()
+            logger.info(detection_cache.get_summary())
+        if render_output:
+            renderer.close()
+            logger.info(renderer.get_summary())
+        if save_clips:
+            clip_recorder.close()
+            logger.info(clip_recorder.get_summary())
+        reporter.close()
+        for window in traffic_aggregator.get_history(camera.name, 3600):
+            logger.info("Traffic statistics: %s", window)
+        if use_checkpoints:
+            checkpointer.remove()
+            logger.info(checkpointer.get_summary())
         logger.info("Finished processing.")
+        logger.close()
         break
 
     else:
         frame_skipper.increment_skipped_frame_count()
         FRAME_COUNT += 1
-        logger.error(f"Error at {FRAME_COUNT}. Frame could not be captured.")
+        logger.error("Error at %s. Frame could not be captured.", FRAME_COUNT)
         continue
\ No newline at end of file
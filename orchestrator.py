@@ -0,0 +1,282 @@
+import os
+import asyncio
+import torch
+from concurrent.futures import ThreadPoolExecutor
+import detection as d
+import tracker as t
+import camera as c
+import speed as s
+import utilities as u
+from deep_sort.deep.feature_extractor import Extractor, BatchedExtractor
+
+
+class BatchingDetector():
+    '''
+    Runs one detector for many cameras by gathering their frames into batches.
+
+    Frames submitted within max_wait seconds of the first waiting frame are sent to the model in one AutoShape
+    call of at most max_batch_size frames. The model runs on its own thread so the event loop keeps reading
+    frames meanwhile, and every caller gets the results of its own frame back.
+
+        Attributes:
+            detector (Detector object): Detector whose model is shared.
+            max_batch_size (int): Maximum number of frames per model call.
+            max_wait (float): Seconds a frame waits for others to join its batch.
+            batch_count (int): Number of model calls.
+            frame_count (int): Number of frames detected.
+    '''
+
+    def __init__(self, detector, max_batch_size=8, max_wait=0.01):
+        '''
+        Constructor for BatchingDetector class.
+
+            Parameters:
+                detector (Detector object): Detector whose model is shared.
+                max_batch_size (int): Maximum number of frames per model call.
+                max_wait (float): Seconds a frame waits for others to join its batch.
+        '''
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batching-detector")
+        self.queue = None
+        self.batch_task = None
+        self.batch_count = 0
+        self.frame_count = 0
+
+
+    def start(self):
+        '''
+        Starts gathering batches. Must be called from the running event loop.
+        '''
+        self.queue = asyncio.Queue()
+        self.batch_task = asyncio.get_running_loop().create_task(self.run_batches())
+
+
+    async def detect(self, frame):
+        '''
+        Detects the objects of a frame as part of the next batch.
+
+            Parameters:
+                frame (numpy array): Frame to run inference on.
+
+            Returns:
+                results (DetectionResults object): The results of inference on the given frame.
+        '''
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((frame, future))
+
+        return await future
+
+
+    async def run_batches(self):
+        '''
+        Task gathering the queued frames into batches and resolving their results.
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0)))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await loop.run_in_executor(self.executor, self.detector.get_detection_model(), [frame for frame, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            for (_, future), detections in zip(batch, results.xyxy):
+                future.set_result(d.DetectionResults(detections))
+            self.batch_count += 1
+            self.frame_count += len(batch)
+
+
+    async def close(self):
+        '''
+        Stops gathering batches.
+        '''
+        if self.batch_task is not None:
+            self.batch_task.cancel()
+            try:
+                await self.batch_task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=True)
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the batches.
+
+            Returns:
+                summary (string): Frames, model calls and mean batch size.
+        '''
+
+        return f"Batching detector ran {self.frame_count} frames in {self.batch_count} batches ({self.frame_count / max(self.batch_count, 1):.2f} frames per batch)."
+
+
+class CameraPipeline():
+    '''
+    Tracking and speed estimation of one camera, fed by the shared detector and feature extractor.
+
+        Attributes:
+            camera (Camera object): Video file or live stream of the camera.
+            tracker (VehicleTracker object): Tracker of this camera, using the shared extractor.
+            speed (Speed object): Speed state of this camera.
+            logger (Logger object): Log of this camera.
+            reporter (Reporter object): Report of this camera.
+            frame_count (int): Number of frames processed.
+    '''
+
+    def __init__(self, name, source, roi, zones, length, batching_detector, extractor, executor, data_path="Data",
+                 starting_time=6, confidence_threshold=0.5, live=False):
+        '''
+        Constructor for CameraPipeline class.
+
+            Parameters:
+                name (string): Name of the camera, also used for its log and report.
+                source (string): Path to the video, or the stream of a live camera.
+                roi (list): Co-ordinates for region of interest.
+                zones (tuple): Entry area, exit area and deleting line.
+                length (float): Length of the processing area in meters.
+                batching_detector (BatchingDetector object): Detector shared by all cameras.
+                extractor (Extractor or BatchedExtractor object): Feature extractor shared by all cameras.
+                executor (ThreadPoolExecutor object): Threads for reading frames and tracking without blocking the event loop.
+                data_path (string): Directory of the logs, reports and frames.
+                starting_time (int): Hour of the day the recording started.
+                confidence_threshold (float): Threshold for minimum confidence of detection.
+                live (boolean): True if the source is a live stream.
+        '''
+        self.camera = c.LiveCamera(name, source, roi) if live else c.Camera(name, source, roi)
+        self.tracker = t.VehicleTracker(extractor=extractor)
+        self.logger = u.Logger(data_path, name)
+        self.reporter = u.Reporter(os.path.join(data_path, "Reports"), name, os.path.join(data_path, "Frames"), self.logger,
+                                   ['ID', 'timestamp', 'speed(km/h)'], int(starting_time), image_format="jpg", camera_name=name,
+                                   recording_start=self.camera.start_wall_time if live else None)
+        self.speed = s.Speed(zones[0], zones[1], zones[2], length, self.logger)
+        self.tracker.add_track_deletion_listener(self.speed.forget)
+        self.batching_detector = batching_detector
+        self.executor = executor
+        self.confidence_threshold = confidence_threshold
+        self.live = live
+        self.frame_count = 0
+
+
+    def read_masked_frame(self):
+        '''
+        Reads the next frame and masks it to the roi. Runs on an executor thread.
+
+            Returns:
+                success (boolean): True if a frame was read.
+                masked_frame (numpy array): Masked frame, or None.
+        '''
+        success, frame = self.camera.read()
+
+        return success, self.camera.get_masked_frame(frame) if success else None
+
+
+    async def run(self):
+        '''
+        Processes the frames of the camera until it ends. Frames of one camera are processed in order.
+        '''
+        loop = asyncio.get_running_loop()
+        self.logger.info("Starting processing frames.")
+        while True:
+            success, masked_frame = await loop.run_in_executor(self.executor, self.read_masked_frame)
+            if not success:
+                break
+
+            results = await self.batching_detector.detect(masked_frame)
+            tracked_objects_info = await loop.run_in_executor(self.executor, self.tracker.track, results, masked_frame, self.confidence_threshold)
+            self.speed.process_frame(masked_frame, tracked_objects_info, False, self.frame_count, self.camera.fps, self.reporter,
+                                     timestamp=self.camera.frame_timestamp)
+            self.frame_count += 1
+
+        if self.live:
+            self.camera.close()
+            self.logger.info(self.camera.get_summary())
+        self.logger.info("Speed state size: %s", self.speed.get_state_size())
+        self.reporter.close()
+        self.logger.info("Finished processing.")
+        self.logger.close()
+
+
+class Orchestrator():
+    '''
+    Runs many cameras in one process and one event loop with one copy of the detection and re-identification models.
+
+        Attributes:
+            detector (VehicleDetector object): Detector shared by all cameras.
+            extractor (BatchedExtractor object): Feature extraction service batching the crops of all cameras.
+            batching_detector (BatchingDetector object): Gathers the frames of all cameras into batches.
+            pipelines (list): CameraPipeline per camera.
+    '''
+
+    def __init__(self, camera_settings, weights_path=os.path.join("yolov5", "models", "yolov5s.pt"), reid_model="osnet_x0_25",
+                 max_batch_size=8, max_wait=0.01, max_crop_batch_size=64, data_path="Data"):
+        '''
+        Constructor for Orchestrator class.
+
+            Parameters:
+                camera_settings (list): Per camera a dictionary with the CameraPipeline parameters name, source, roi, zones and length,
+                                        and optionally starting_time, confidence_threshold and live.
+                weights_path (string): Path to the detector weights.
+                reid_model (string): Name of the re-identification model.
+                max_batch_size (int): Maximum number of frames per detector call.
+                max_wait (float): Seconds a frame waits for frames of other cameras to join its batch.
+                max_crop_batch_size (int): Maximum number of crops per re-identification call.
+                data_path (string): Directory of the logs, reports and frames.
+        '''
+        self.detector = d.VehicleDetector(model_wights_path=weights_path)
+        self.extractor = BatchedExtractor(Extractor(reid_model, use_cuda=torch.cuda.is_available()), max_crop_batch_size)
+        self.batching_detector = BatchingDetector(self.detector, max_batch_size, max_wait)
+        self.executor = ThreadPoolExecutor(max_workers=2 * len(camera_settings), thread_name_prefix="camera-pipeline")
+        self.pipelines = [CameraPipeline(batching_detector=self.batching_detector, extractor=self.extractor, executor=self.executor,
+                                         data_path=data_path, **settings) for settings in camera_settings]
+
+
+    async def run_pipelines(self):
+        '''
+        Runs every camera pipeline until all of them end.
+        '''
+        self.batching_detector.start()
+        try:
+            await asyncio.gather(*(pipeline.run() for pipeline in self.pipelines))
+        finally:
+            await self.batching_detector.close()
+            self.executor.shutdown(wait=True)
+            self.extractor.close()
+
+
+    def run(self):
+        '''
+        Runs every camera pipeline in a new event loop until all of them end.
+        '''
+        asyncio.run(self.run_pipelines())
+
+
+if __name__ == "__main__":
+    # Parameters to change
+    camera_settings = [
+        {
+            "name": "recording",
+            "source": os.path.join("Data", "recording.avi"),
+            "roi": [(145, 16), (273, 16), (955, 105), (955, 1072), (230, 1072)],
+            "zones": ([(164, 97), (300, 78), (364, 136), (180, 172)],
+                      [(255, 534), (727, 343), (870, 484), (306, 747)],
+                      [(310, 832), (861, 633), (955, 826), (366, 1050)]),
+            "length": 39.0,  # in meters
+        },
+    ]
+    max_batch_size = 8
+    max_wait = 0.01  # in seconds
+
+    orchestrator = Orchestrator(camera_settings, max_batch_size=max_batch_size, max_wait=max_wait)
+    orchestrator.run()
+    print(orchestrator.batching_detector.get_summary())
+    print(orchestrator.extractor.get_summary())
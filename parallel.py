@@ -0,0 +1,308 @@
+import os
+import multiprocessing
+import cv2
+import numpy as np
+import torch
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import linear_sum_assignment
+import detection as d
+import tracker as t
+import camera as c
+import speed as s
+import utilities as u
+
+
+def get_chunks(total_frames, chunk_count, overlap_frames):
+    '''
+    Splits a video into chunks processed by separate workers.
+
+    Every chunk except the first also reads the overlap_frames before its own range. Its tracker warms up
+    there, and the tracks of both chunks in that window are used to stitch them together.
+
+        Parameters:
+            total_frames (int): Number of frames of the video.
+            chunk_count (int): Number of chunks.
+            overlap_frames (int): Number of frames read by two neighbouring chunks.
+
+        Returns:
+            chunks (list): Tuples such as: (first frame read, first frame owned, end of the owned range)
+    '''
+    bounds = np.linspace(0, total_frames, chunk_count + 1).astype(int)
+
+    return [(max(int(start) - overlap_frames, 0), int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def process_chunk(video_path, roi, chunk, overlap_frames, weights_path, config_path, confidence_threshold=0.5, threads=1):
+    '''
+    Detects and tracks the vehicles of one chunk. Runs in a worker process with its own detector and tracker.
+
+        Parameters:
+            video_path (str): Path to the video.
+            roi (list): Co-ordinates for region of interest.
+            chunk (tuple): Chunk such as: (first frame read, first frame owned, end of the owned range)
+            overlap_frames (int): Number of frames read by two neighbouring chunks.
+            weights_path (str): Path to the detector weights.
+            config_path (str): Path to the deepsort config file.
+            confidence_threshold (float): Threshold for minimum confidence of detection.
+            threads (int): Number of torch threads of the worker.
+
+        Returns:
+            tracks (dict): Tracked objects per frame such as: {frame index: [(x_min, y_min, x_max, y_max, id), ...]}
+            head_embeddings (dict): Mean appearance of each track in the frames before the owned range such as: {id: vector}
+            tail_embeddings (dict): Mean appearance of each track in the last overlap_frames of the owned range such as: {id: vector}
+    '''
+    torch.set_num_threads(threads)
+    read_start, start, end = chunk
+    detector = d.VehicleDetector(model_wights_path=weights_path)
+    tracker = t.VehicleTracker(config_path=config_path)
+    camera = c.Camera("Chunk", video_path, roi)
+    camera.seek(read_start)
+    samples = tracker.get_tracker_model().tracker.metric.samples
+
+    tracks = {}
+    embedding_sums = {"head": {}, "tail": {}}
+    for frame_index in range(read_start, end):
+        success, frame = camera.video.read()
+        if not success:
+            break
+
+        masked_frame = camera.get_masked_frame(frame)
+        xywhs, confidences, classes = tracker.get_detections(detector.get_detection_results(masked_frame), confidence_threshold)
+        features = tracker.get_features(xywhs, masked_frame)
+        tracks[frame_index] = tracker.track_with_features(xywhs, confidences, classes, features, masked_frame.shape)
+
+        window = "head" if frame_index < start else "tail" if frame_index >= end - overlap_frames else None
+        if window is not None:
+            for *_, id in tracks[frame_index]:
+                if samples.get(id):
+                    embedding_sums[window][id] = embedding_sums[window].get(id, 0) + samples[id][-1]
+    camera.video.release()
+
+    head_embeddings, tail_embeddings = ({id: total / np.linalg.norm(total) for id, total in sums.items()}
+                                        for sums in (embedding_sums["head"], embedding_sums["tail"]))
+
+    return tracks, head_embeddings, tail_embeddings
+
+
+def get_overlap_ious(tracks_a, tracks_b, frames):
+    '''
+    Returns the mean IoU of every pair of tracks of two chunks over the frames they share.
+
+        Parameters:
+            tracks_a (dict): Tracked objects per frame of the earlier chunk.
+            tracks_b (dict): Tracked objects per frame of the later chunk.
+            frames (range): Frames processed by both chunks.
+
+        Returns:
+            ids_a (list): Track IDs of the earlier chunk.
+            ids_b (list): Track IDs of the later chunk.
+            ious (numpy array): IoU summed over the frames where both tracks exist, divided by the frames where either exists.
+    '''
+    ids_a = sorted({object_info[4] for frame in frames for object_info in tracks_a.get(frame, [])})
+    ids_b = sorted({object_info[4] for frame in frames for object_info in tracks_b.get(frame, [])})
+    index_a = {id: i for i, id in enumerate(ids_a)}
+    index_b = {id: i for i, id in enumerate(ids_b)}
+    iou_sums = np.zeros((len(ids_a), len(ids_b)))
+    frames_a = np.zeros(len(ids_a))
+    frames_b = np.zeros(len(ids_b))
+    frames_both = np.zeros((len(ids_a), len(ids_b)))
+
+    for frame in frames:
+        objects_a, objects_b = tracks_a.get(frame, []), tracks_b.get(frame, [])
+        rows = [index_a[object_info[4]] for object_info in objects_a]
+        columns = [index_b[object_info[4]] for object_info in objects_b]
+        frames_a[rows] += 1
+        frames_b[columns] += 1
+        if not objects_a or not objects_b:
+            continue
+
+        boxes_a = np.array([object_info[:4] for object_info in objects_a], dtype=np.float64)
+        boxes_b = np.array([object_info[:4] for object_info in objects_b], dtype=np.float64)
+        width = np.clip(np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2]) - np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0]), 0, None)
+        height = np.clip(np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3]) - np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1]), 0, None)
+        intersection = width * height
+        area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+        area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+        iou_sums[np.ix_(rows, columns)] += intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+        frames_both[np.ix_(rows, columns)] += 1
+
+    frames_either = frames_a[:, None] + frames_b[None, :] - frames_both
+
+    return ids_a, ids_b, iou_sums / np.maximum(frames_either, 1)
+
+
+def stitch_chunks(chunks, chunk_results, min_iou=0.3, min_similarity=0.8, iou_weight=0.5):
+    '''
+    Gives the tracks of all chunks global IDs and merges them into one timeline.
+
+    At each boundary the tracks of the two chunks in the shared frames are paired by the Hungarian algorithm
+    on a mix of their mean IoU and the cosine similarity of their appearance. A pair is the same vehicle if
+    it overlaps well, or if it overlaps at all and looks alike. Every frame is taken from the chunk owning it.
+
+        Parameters:
+            chunks (list): Chunks as returned by get_chunks.
+            chunk_results (list): Results of process_chunk per chunk.
+            min_iou (float): Mean IoU above which overlapping tracks are the same vehicle.
+            min_similarity (float): Appearance similarity above which touching tracks are the same vehicle.
+            iou_weight (float): Weight of the IoU against the appearance similarity when pairing tracks.
+
+        Returns:
+            merged_tracks (dict): Tracked objects per frame with global IDs such as: {frame index: [(x_min, y_min, x_max, y_max, id), ...]}
+            stitched_count (int): Number of tracks continued across a boundary.
+    '''
+    global_ids = {}  # {(chunk index, local ID): global ID}
+    next_id = 1
+    stitched_count = 0
+
+    for k, (chunk, (tracks, head_embeddings, _)) in enumerate(zip(chunks, chunk_results)):
+        if k > 0:
+            previous_tracks, _, previous_tail_embeddings = chunk_results[k - 1]
+            ids_a, ids_b, ious = get_overlap_ious(previous_tracks, tracks, range(chunk[0], chunk[1]))
+            if ids_a and ids_b:
+                similarities = np.zeros_like(ious)
+                for i, id_a in enumerate(ids_a):
+                    for j, id_b in enumerate(ids_b):
+                        if id_a in previous_tail_embeddings and id_b in head_embeddings:
+                            similarities[i, j] = float(np.dot(previous_tail_embeddings[id_a], head_embeddings[id_b]))
+
+                rows, columns = linear_sum_assignment(-(iou_weight * ious + (1 - iou_weight) * similarities))
+                for i, j in zip(rows, columns):
+                    if ious[i, j] >= min_iou or (ious[i, j] > 0 and similarities[i, j] >= min_similarity):
+                        if (k - 1, ids_a[i]) in global_ids:
+                            global_ids[(k, ids_b[j])] = global_ids[(k - 1, ids_a[i])]
+                            stitched_count += 1
+
+        for frame_index in range(chunk[1], chunk[2]):
+            for *_, id in tracks.get(frame_index, []):
+                if (k, id) not in global_ids:
+                    global_ids[(k, id)] = next_id
+                    next_id += 1
+
+    merged_tracks = {}
+    for k, (chunk, (tracks, _, _)) in enumerate(zip(chunks, chunk_results)):
+        for frame_index in range(chunk[1], chunk[2]):
+            merged_tracks[frame_index] = [(*object_info[:4], global_ids[(k, object_info[4])]) for object_info in tracks.get(frame_index, [])]
+
+    return merged_tracks, stitched_count
+
+
+class DeferredReporter():
+    '''
+    Collects the speed events of a pass without frames, so only the frames with events have to be decoded afterwards.
+
+        Attributes:
+            frame_index (int): Index of the frame being processed, set by the caller.
+            events (list): Events such as: (frame index, id, speed, bbox, time)
+    '''
+
+    def __init__(self):
+        self.frame_index = 0
+        self.events = []
+
+    def add_to_report(self, frame, id, speed, bbox, time):
+        self.events.append((self.frame_index, id, speed, bbox, time))
+
+
+def measure_speeds(camera, merged_tracks, speed, reporter):
+    '''
+    Runs the speed estimation sequentially over the merged tracks, then decodes only the frames with events for the report.
+
+        Parameters:
+            camera (Camera object): Camera of the video.
+            merged_tracks (dict): Tracked objects per frame with global IDs.
+            speed (Speed object): Speed estimation.
+            reporter (Reporter object): Reporter receiving the events with their frames.
+
+        Returns:
+            event_count (int): Number of reported events.
+    '''
+    deferred_reporter = DeferredReporter()
+    for frame_index in range(camera.total_frames):
+        deferred_reporter.frame_index = frame_index
+        speed.process_frame(None, merged_tracks.get(frame_index, []), False, frame_index, camera.fps, deferred_reporter)
+
+    events = deferred_reporter.events
+    camera.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    grabbed_count = 0
+    for event_frame_index, id, vehicle_speed, bbox, time in events:
+        # Frames are only demuxed, and decoded when an event needs them.
+        while grabbed_count <= event_frame_index:
+            camera.video.grab()
+            grabbed_count += 1
+        success, frame = camera.video.retrieve()
+        if success:
+            reporter.add_to_report(camera.get_masked_frame(frame), id, vehicle_speed, bbox, time)
+
+    return len(events)
+
+
+def process_video(video_path, roi, zones, length, logger, reporter, workers=None, overlap_seconds=10.0,
+                  weights_path=os.path.join("yolov5", "models", "yolov5s.pt"), config_path=os.path.join("deep_sort", "configs", "deep_sort.yaml"),
+                  confidence_threshold=0.5):
+    '''
+    Processes one video with detection and tracking split over several worker processes.
+
+    The report matches a sequential run that detects on every frame, except for tracks that could not be
+    stitched at a chunk boundary. The overlap should be longer than a vehicle needs to confirm its track.
+
+        Parameters:
+            video_path (str): Path to the video.
+            roi (list): Co-ordinates for region of interest.
+            zones (tuple): Entry area, exit area and deleting line.
+            length (float): Length of the processing area in meters.
+            logger (Logger object): Logger object for logging.
+            reporter (Reporter object): Reporter object for adding to reports.
+            workers (int): Number of worker processes. All cores if None.
+            overlap_seconds (float): Seconds read by two neighbouring chunks.
+            weights_path (str): Path to the detector weights.
+            config_path (str): Path to the deepsort config file.
+            confidence_threshold (float): Threshold for minimum confidence of detection.
+
+        Returns:
+            speed (Speed object): Speed estimation holding the state after the last frame.
+    '''
+    workers = workers or os.cpu_count()
+    camera = c.Camera("Parallel", video_path, roi)
+    overlap_frames = int(overlap_seconds * camera.fps)
+    chunks = get_chunks(camera.total_frames, workers, overlap_frames)
+    threads = max(os.cpu_count() // len(chunks), 1)
+    logger.info("Processing %s frames in %s chunks with %s frames of overlap.", camera.total_frames, len(chunks), overlap_frames)
+
+    # Spawned workers do not inherit the torch and OpenCV thread pools of this process.
+    with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(process_chunk, video_path, roi, chunk, overlap_frames, weights_path, config_path, confidence_threshold, threads)
+                   for chunk in chunks]
+        chunk_results = [future.result() for future in futures]
+
+    merged_tracks, stitched_count = stitch_chunks(chunks, chunk_results)
+    logger.info("Stitched %s tracks across chunk boundaries.", stitched_count)
+
+    speed = s.Speed(zones[0], zones[1], zones[2], length, logger)
+    event_count = measure_speeds(camera, merged_tracks, speed, reporter)
+    camera.video.release()
+    logger.info("Reported %s speed events.", event_count)
+
+    return speed
+
+
+if __name__ == "__main__":
+    # Parameters to change
+    roi = [(145, 16), (273, 16), (955, 105), (955, 1072), (230, 1072)]
+    entry_area = [(164, 97), (300, 78), (364, 136), (180, 172)]
+    exit_area = [(255, 534), (727, 343), (870, 484), (306, 747)]
+    deleting_line = [(310, 832), (861, 633), (955, 826), (366, 1050)]
+    length = 39.0  # in meters
+    video_name = "recording.avi"
+    starting_time = 6
+    workers = None  # Number of worker processes. All cores if None
+    overlap_seconds = 10.0
+
+    logger_name = video_name.split(".")[0]
+    logger = u.Logger(os.path.join("Data"), logger_name)
+    reporter = u.Reporter(os.path.join("Data", "Reports"), logger_name, os.path.join("Data", "Frames"), logger,
+                          ['ID', 'timestamp', 'speed(km/h)'], int(starting_time), image_format="jpg")
+    speed = process_video(os.path.join("Data", video_name), roi, (entry_area, exit_area, deleting_line), length, logger, reporter,
+                          workers=workers, overlap_seconds=overlap_seconds)
+    logger.info("Speed state size: %s", speed.get_state_size())
+    reporter.close()
+    logger.close()
@@ -0,0 +1,184 @@
+import os
+import cv2
+import threading
+from collections import deque
+
+
+class ClipRecorder():
+    '''
+    Records short clips around speed events instead of the whole video.
+
+    The frames of the last pre_roll seconds are kept JPEG compressed in a ring buffer, together with the objects
+    to annotate on them. A 1080p frame takes about 0.3 MB instead of 6 MB that way, and the ring never holds more
+    than max_ring_bytes, dropping its oldest frames first, so a long pre-roll can shorten the start of a clip but
+    not exhaust the memory. When a vehicle is measured, a clip starting pre_roll seconds before its exit time and
+    ending post_roll seconds after it is written. Events whose clips overlap are merged into one clip. Only the
+    frames of a clip are rendered and encoded as video. Optionally a downscaled low frame rate proxy of the whole
+    video is written as well.
+
+    Frames are matched to events by their time in the video, the same time Speed reports exit times in, so
+    clips stay in place when processing resumes from a checkpoint or a live camera drops frames. The
+    recorder is fed by the AnnotationRenderer through record, on its render thread.
+
+        Attributes:
+            clip_directory (str): Directory the clips are written to.
+            video_name (str): Name of the video, used as prefix of the clips.
+            fps (float): Frame rate of the video.
+            frame_size (tuple): Size of the frames such as: (width, height).
+            pre_roll (float): Seconds recorded before an event.
+            post_roll (float): Seconds recorded after an event.
+            render (callable): Draws a frame of a clip, called with the frame and its objects.
+            ring_quality (int): JPEG quality of the frames in the ring from 0 to 100.
+            max_ring_bytes (int): Largest size of the compressed frames in the ring.
+            ring_bytes (int): Size of the compressed frames in the ring.
+            clips_written (int): Number of clips written.
+            bytes_written (int): Size of the written clips and proxy on disk.
+    '''
+
+    def __init__(self, clip_directory, video_name, fps, frame_size, pre_roll=3.0, post_roll=2.0, render=None,
+                 proxy_fps=None, proxy_scale=0.25, fourcc="mp4v", ring_quality=90, max_ring_bytes=64 * 2 ** 20):
+        '''
+        Constructor for ClipRecorder class.
+
+            Parameters:
+                clip_directory (str): Directory the clips are written to.
+                video_name (str): Name of the video, used as prefix of the clips.
+                fps (float): Frame rate of the video.
+                frame_size (tuple): Size of the frames such as: (width, height).
+                pre_roll (float): Seconds recorded before an event. The ring holds this many seconds of compressed frames.
+                post_roll (float): Seconds recorded after an event.
+                render (callable): Draws a frame of a clip, such as AnnotationRenderer.render. None to write the frames as they are.
+                proxy_fps (float): Frame rate of the full length proxy. None to not write a proxy.
+                proxy_scale (float): Scale of the proxy frames.
+                fourcc (str): Codec of the clips and the proxy.
+                ring_quality (int): JPEG quality of the frames in the ring from 0 to 100.
+                max_ring_bytes (int): Largest size of the compressed frames in the ring, about 200 1080p frames by default.
+        '''
+        if not os.path.exists(clip_directory):
+            os.makedirs(clip_directory)
+
+        self.clip_directory = clip_directory
+        self.video_name = video_name
+        self.fps = fps
+        self.frame_size = tuple(frame_size)
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.render = render if render is not None else (lambda frame, objects: frame)
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+
+        self.ring_quality = ring_quality
+        self.max_ring_bytes = max_ring_bytes
+        self.ring = deque()  # (time, JPEG encoded frame, objects) of the frames of the last pre_roll seconds
+        self.ring_bytes = 0
+        self.events = []  # (start time, end time, Object ID) of clips not started yet
+        self.events_lock = threading.Lock()
+        self.clip_writer = None
+        self.clip_path = None
+        self.clip_end = -1.0
+        self.clips_written = 0
+        self.bytes_written = 0
+
+        self.proxy_writer = None
+        if proxy_fps is not None:
+            self.proxy_fps = proxy_fps
+            self.next_proxy_time = None
+            self.proxy_size = (int(self.frame_size[0] * proxy_scale), int(self.frame_size[1] * proxy_scale))
+            self.proxy_path = os.path.join(clip_directory, f"{video_name}_proxy.mp4")
+            self.proxy_writer = cv2.VideoWriter(self.proxy_path, self.fourcc, proxy_fps, self.proxy_size)
+
+
+    def add_event(self, id, speed, exit_time):
+        '''
+        Speed event listener scheduling a clip around the exit time of the measured vehicle.
+
+            Parameters:
+                id (int): ID of the measured object.
+                speed (float or str): Measured speed.
+                exit_time (float): Exit time in seconds.
+        '''
+        with self.events_lock:
+            self.events.append((exit_time - self.pre_roll, exit_time + self.post_roll, id))
+
+
+    def record(self, frame, objects, time):
+        '''
+        Adds the next frame of the video. The ring keeps a compressed copy, so the frame can be reused afterwards.
+
+            Parameters:
+                frame (numpy array): Frame of the video without annotations.
+                objects (list): Tuples such as: (x_min, y_min, x_max, y_max, id, speed) to annotate on the frame, or None.
+                time (float): Time of the frame in the video in seconds.
+        '''
+        with self.events_lock:
+            started = [event for event in self.events if event[0] <= time]
+            self.events = [event for event in self.events if event[0] > time]
+
+        for start, end, id in started:
+            if self.clip_writer is None:
+                self.open_clip(start, id)
+            self.clip_end = max(self.clip_end, end)
+
+        if self.clip_writer is not None:
+            self.clip_writer.write(self.render(frame, objects))
+            if time >= self.clip_end:
+                self.close_clip()
+
+        if self.proxy_writer is not None and (self.next_proxy_time is None or time >= self.next_proxy_time):
+            self.next_proxy_time = (time if self.next_proxy_time is None else self.next_proxy_time) + 1 / self.proxy_fps
+            self.proxy_writer.write(cv2.resize(self.render(frame, objects), self.proxy_size, interpolation=cv2.INTER_AREA))
+
+        encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.ring_quality])[1]
+        self.ring.append((time, encoded, objects))
+        self.ring_bytes += encoded.nbytes
+        while len(self.ring) > 1 and (self.ring[0][0] < time - self.pre_roll or self.ring_bytes > self.max_ring_bytes):
+            self.ring_bytes -= self.ring.popleft()[1].nbytes
+
+
+    def open_clip(self, start, id):
+        '''
+        Starts a clip with the buffered frames from the given time on.
+
+            Parameters:
+                start (float): Time of the first frame of the clip in seconds.
+                id (int): ID of the object the clip is named after.
+        '''
+        self.clip_path = os.path.join(self.clip_directory, f"{self.video_name}_{max(start, 0):09.2f}s_id{id}.mp4")
+        self.clip_writer = cv2.VideoWriter(self.clip_path, self.fourcc, self.fps, self.frame_size)
+        for time, encoded, objects in self.ring:
+            if time >= start:
+                self.clip_writer.write(self.render(cv2.imdecode(encoded, cv2.IMREAD_COLOR), objects))
+
+
+    def close_clip(self):
+        '''
+        Finishes the current clip.
+        '''
+        self.clip_writer.release()
+        self.clip_writer = None
+        self.clips_written += 1
+        if os.path.exists(self.clip_path):
+            self.bytes_written += os.path.getsize(self.clip_path)
+
+
+    def close(self):
+        '''
+        Finishes the current clip and the proxy.
+        '''
+        if self.clip_writer is not None:
+            self.close_clip()
+        if self.proxy_writer is not None:
+            self.proxy_writer.release()
+            self.proxy_writer = None
+            if os.path.exists(self.proxy_path):
+                self.bytes_written += os.path.getsize(self.proxy_path)
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the recorded clips.
+
+            Returns:
+                summary (str): Number of clips, their size on disk and the size of the ring.
+        '''
+        return (f"Clip recorder: {self.clips_written} clips written, {self.bytes_written / 2 ** 20:.1f} MiB on disk, "
+                f"{len(self.ring)} frames in a {self.ring_bytes / 2 ** 20:.1f} MiB ring")
@@ -0,0 +1,333 @@
+import cv2
+import queue
+import atexit
+import threading
+import numpy as np
+from collections import OrderedDict
+
+
+class AnnotationRenderer():
+    '''
+    Draws the annotated output video on its own thread so the analytics loop does not wait for drawing or encoding.
+
+    The zones and roi never change, so they are drawn once onto an overlay that is composited onto every frame.
+    Labels are rendered once per text and reused as sprites. Boxes and labels can be throttled to every n-th
+    frame or to frames with a speed event, which leaves the other frames with only the overlay. Frames are drawn
+    onto a buffer of the renderer, so submitted frames are never modified. Recorders such as a ClipRecorder get
+    the frames undrawn with their objects and time, and only render the frames they keep.
+
+    When rendering falls behind and the queue is full, the oldest waiting frame is dropped instead of blocking
+    the analytics loop, like a LiveCamera drops frames the pipeline could not take. Drops are counted and logged.
+
+        Attributes:
+            frame_size (tuple): Size of the frames such as: (width, height).
+            writers (list): Objects receiving the rendered frames through write(frame), such as a VideoWriter.
+            recorders (list): Objects receiving the frames through record(frame, objects, time), such as a ClipRecorder.
+            show (boolean): True if the rendered frames are shown in a window by display, on the main thread.
+            wait_time (int): Milliseconds to wait for a key press after showing a frame.
+            annotate_interval (int): Boxes and labels are drawn on every n-th frame.
+            events_only (boolean): True if boxes and labels are only drawn on frames with a speed event.
+            alpha (float): Opacity of the static overlay.
+            max_sprites (int): Number of label sprites kept.
+            stopped (boolean): True once "q" was pressed in the window.
+            frames_rendered (int): Number of frames written or shown.
+            frames_annotated (int): Number of frames with boxes and labels.
+            frames_dropped (int): Number of queued frames dropped because rendering fell behind.
+            logger (Logger object): Logger warning about dropped frames, or None.
+    '''
+
+    def __init__(self, frame_size, zones, writers=(), roi=None, show=False, wait_time=1, annotate_interval=1, events_only=False,
+                 zone_color=(15, 220, 18), zone_thickness=6, alpha=1.0, max_sprites=512, queue_size=32,
+                 logger=None):
+        '''
+        Constructor for AnnotationRenderer class.
+
+            Parameters:
+                frame_size (tuple): Size of the frames such as: (width, height).
+                zones (list): Polygons drawn on every frame such as: [[(x, y), ...], ...]
+                writers (list): Objects receiving the rendered frames through write(frame), such as a VideoWriter.
+                roi (list): Region of interest drawn on every frame. None to leave it out.
+                show (boolean): True if the rendered frames are shown in a window by display, on the main thread.
+                wait_time (int): Milliseconds to wait for a key press after showing a frame.
+                annotate_interval (int): Boxes and labels are drawn on every n-th frame.
+                events_only (boolean): True if boxes and labels are only drawn on frames with a speed event.
+                zone_color (tuple): Color of the zones.
+                zone_thickness (int): Line width of the zones.
+                alpha (float): Opacity of the static overlay.
+                max_sprites (int): Number of label sprites kept.
+                queue_size (int): Number of frames waiting to be rendered before the oldest is dropped.
+                logger (Logger object): Logger warning about dropped frames. None to only count them.
+        '''
+        self.frame_size = tuple(frame_size)
+        self.writers = list(writers)
+        self.recorders = []
+        self.show = show
+        self.wait_time = wait_time
+        self.annotate_interval = annotate_interval
+        self.events_only = events_only
+        self.alpha = alpha
+        self.max_sprites = max_sprites
+        self.stopped = False
+        self.frames_rendered = 0
+        self.frames_annotated = 0
+        self.frames_dropped = 0
+        self.logger = logger
+        self.submitted_count = 0
+        self.event_pending = False
+
+        self.overlay, self.overlay_mask, self.overlay_rect = self.build_overlay(zones, roi, zone_color, zone_thickness)
+        self.sprites = OrderedDict()  # {label text: sprite image}
+        self.buffer = None
+
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.display_queue = queue.Queue()
+        self.render_thread = threading.Thread(target=self.drain_frames, name="annotation-renderer", daemon=True)
+        self.render_thread.start()
+        self.closed = False
+        atexit.register(self.close)
+
+
+    def build_overlay(self, zones, roi, zone_color, zone_thickness):
+        '''
+        Draws the static zones once.
+
+            Parameters:
+                zones (list): Polygons to draw.
+                roi (list): Region of interest to draw, or None.
+                zone_color (tuple): Color of the zones.
+                zone_thickness (int): Line width of the zones.
+
+            Returns:
+                overlay (numpy array): Overlay image cropped to the drawn region.
+                overlay_mask (numpy array): Boolean mask of the drawn pixels of the cropped overlay.
+                overlay_rect (tuple): Region of the frame covered by the overlay such as: (x, y, width, height).
+        '''
+        width, height = self.frame_size
+        overlay = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        polygons = [np.array(zone, np.int32) for zone in zones]
+        if roi is not None:
+            polygons.append(np.array(roi, np.int32))
+        cv2.polylines(overlay, polygons, True, zone_color, zone_thickness)
+        cv2.polylines(mask, polygons, True, 255, zone_thickness)
+
+        # Compositing only touches the bounding rectangle of the drawn lines.
+        x, y, w, h = cv2.boundingRect(mask)
+
+        return overlay[y:y + h, x:x + w], mask[y:y + h, x:x + w] > 0, (x, y, w, h)
+
+
+    def composite_overlay(self, frame):
+        '''
+        Composites the static overlay onto a frame in place.
+
+            Parameters:
+                frame (numpy array): Frame to draw on.
+        '''
+        x, y, w, h = self.overlay_rect
+        region = frame[y:y + h, x:x + w]
+        if self.alpha >= 1.0:
+            np.copyto(region, self.overlay, where=self.overlay_mask[..., None])
+        else:
+            blended = cv2.addWeighted(self.overlay, self.alpha, region, 1.0 - self.alpha, 0)
+            np.copyto(region, blended, where=self.overlay_mask[..., None])
+
+
+    def get_sprite(self, text, font=cv2.FONT_HERSHEY_SIMPLEX, font_size=1, font_color=(255, 255, 255), font_thickness=1):
+        '''
+        Returns the label image of a text, rendering it on first use.
+
+            Parameters:
+                text (str): Label text.
+
+            Returns:
+                sprite (numpy array): Text on a black background.
+        '''
+        sprite = self.sprites.get(text, None)
+        if sprite is not None:
+            self.sprites.move_to_end(text)
+            return sprite
+
+        (text_width, text_height), _ = cv2.getTextSize(text, font, font_size, font_thickness)
+        sprite = np.zeros((text_height + font_size, text_width, 3), dtype=np.uint8)
+        cv2.putText(sprite, text, (0, text_height + font_size - 1), font, font_size, font_color, font_thickness)
+        self.sprites[text] = sprite
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+
+        return sprite
+
+
+    def annotate(self, frame, objects, color_primary=(72, 72, 255), box_width=2):
+        '''
+        Draws the boxes and labels of the tracked objects in place.
+
+            Parameters:
+                frame (numpy array): Frame to draw on.
+                objects (list): Tuples such as: (x_min, y_min, x_max, y_max, id, speed). Only objects with a speed get a label.
+                color_primary (tuple): Color of the bounding boxes.
+                box_width (int): Width of the bounding boxes.
+        '''
+        frame_height, frame_width = frame.shape[:2]
+        for x_min, y_min, x_max, y_max, id, speed in objects:
+            cv2.rectangle(frame, (int(x_min), int(y_min)), (int(x_max), int(y_max)), color_primary, box_width)
+            if not speed:
+                continue
+
+            sprite = self.get_sprite("ID: " + str(id) + " Speed: " + str(speed) + " Km/h")
+            pos_x = max(int(x_min) - 20, 0)
+            pos_y = max(int(y_min) - 20, 0)
+            h = min(sprite.shape[0], frame_height - pos_y)
+            w = min(sprite.shape[1], frame_width - pos_x)
+            frame[pos_y:pos_y + h, pos_x:pos_x + w] = sprite[:h, :w]
+
+
+    def render(self, frame, objects=None):
+        '''
+        Draws the overlay and the given boxes and labels onto a copy of a frame. Only called on the render thread.
+
+            Parameters:
+                frame (numpy array): Frame to render. It is not modified.
+                objects (list): Tuples such as: (x_min, y_min, x_max, y_max, id, speed). None to only draw the overlay.
+
+            Returns:
+                rendered_frame (numpy array): Buffer of the renderer holding the rendered frame, valid until the next call.
+        '''
+        if self.buffer is None or self.buffer.shape != frame.shape:
+            self.buffer = np.empty_like(frame)
+        np.copyto(self.buffer, frame)
+        self.composite_overlay(self.buffer)
+        if objects is not None:
+            self.annotate(self.buffer, objects)
+
+        return self.buffer
+
+
+    def add_recorder(self, recorder):
+        '''
+        Adds a recorder receiving every frame undrawn through record(frame, objects, time). It can render the frames it keeps with render.
+
+            Parameters:
+                recorder (ClipRecorder object): Recorder to add. Must be added before the first frame is submitted.
+        '''
+        self.recorders.append(recorder)
+
+
+    def add_event(self, id, speed, exit_time):
+        '''
+        Speed event listener marking the next submitted frame as a frame with an event.
+
+            Parameters:
+                id (int): ID of the measured object.
+                speed (float or str): Measured speed.
+                exit_time (float): Exit time in seconds.
+        '''
+        self.event_pending = True
+
+
+    def submit(self, frame, objects=(), time=None):
+        '''
+        Queues a frame for rendering without blocking. If the queue is full, the oldest waiting frame is dropped.
+        The frame must not be modified by the caller afterwards, but it is never drawn on, so the same frame can be
+        submitted again.
+
+            Parameters:
+                frame (numpy array): Frame to render.
+                objects (list): Tuples such as: (x_min, y_min, x_max, y_max, id, speed) of the tracked objects.
+                time (float): Time of the frame in the video in seconds, as used by Speed. Needed by recorders.
+        '''
+        if self.events_only:
+            annotate = self.event_pending
+        else:
+            annotate = self.submitted_count % self.annotate_interval == 0
+        self.event_pending = False
+        self.submitted_count += 1
+        item = (frame, list(objects) if annotate else None, time)
+        while True:
+            try:
+                self.frame_queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                self.frame_queue.get_nowait()
+            except queue.Empty:
+                continue
+            self.frame_queue.task_done()
+            self.frames_dropped += 1
+            if self.logger is not None and (self.frames_dropped == 1 or self.frames_dropped % 100 == 0):
+                self.logger.warning("Rendering fell behind, %d frames dropped so far.", self.frames_dropped)
+
+
+    def drain_frames(self):
+        '''
+        Method run by the render thread. Draws, writes and shows the queued frames in order.
+        '''
+        while True:
+            item = self.frame_queue.get()
+            if item is None:
+                self.frame_queue.task_done()
+                break
+
+            frame, objects, time = item
+            if self.writers or self.show:
+                rendered_frame = self.render(frame, objects)
+                if objects is not None:
+                    self.frames_annotated += 1
+                for writer in self.writers:
+                    writer.write(rendered_frame)
+                if self.show:
+                    # HighGUI is not thread safe, so the window is only touched by display on the main thread.
+                    self.display_queue.put(rendered_frame.copy())
+            for recorder in self.recorders:
+                recorder.record(frame, objects, time)
+            self.frames_rendered += 1
+            self.frame_queue.task_done()
+
+
+    def display(self):
+        '''
+        Shows the rendered frames waiting for the window. Must be called from the main thread. Does nothing if show is off.
+        '''
+        while True:
+            try:
+                frame = self.display_queue.get_nowait()
+            except queue.Empty:
+                return
+
+            cv2.imshow("Video", frame)
+            if cv2.waitKey(self.wait_time) == ord('q'):
+                self.stopped = True
+
+
+    def flush(self):
+        '''
+        Blocks until every queued frame has been rendered.
+        '''
+        if self.render_thread.is_alive():
+            self.frame_queue.join()
+
+
+    def close(self):
+        '''
+        Renders the remaining frames and stops the render thread.
+        '''
+        if self.closed:
+            return
+
+        self.closed = True
+        if self.render_thread.is_alive():
+            self.frame_queue.put(None)
+            self.render_thread.join()
+
+
+    def get_summary(self):
+        '''
+        Returns a summary of the rendered frames.
+
+            Returns:
+                summary (str): Number of rendered, annotated and dropped frames.
+        '''
+        return (f"Annotation renderer: {self.frames_rendered} frames rendered, {self.frames_annotated} annotated, "
+                f"{self.frames_dropped} dropped, {len(self.sprites)} label sprites cached")
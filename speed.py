@@ -3,6 +3,137 @@ import cv2
 import numpy as np
 
 
+class ZoneStateTable():
+    '''
+    Compact per-vehicle state of the speed stage indexed by track ID.
+
+    Every vehicle that entered the entry area owns a slot in a set of NumPy columns. Slots of deleted
+    vehicles are reused, so the table only grows with the number of vehicles alive at the same time.
+
+        Attributes:
+            state (numpy array): Lifecycle state per slot. One of: OUTSIDE, ENTERED, MEASURED
+            entry_time (numpy array): Time of entry in seconds per slot.
+            entry_bbox (numpy array): Bounding box at entry per slot, arranged such as: [x_min, y_min, x_max, y_max]
+            speed (numpy array): Measured speed per slot as reported, None before the measurement.
+            last_seen (numpy array): Time in seconds the vehicle was last seen per slot.
+            slot_ids (numpy array): Track ID owning each slot, -1 for free slots.
+            id_to_slot (dict): Slot of every live track ID.
+    '''
+
+    OUTSIDE = 0
+    ENTERED = 1
+    MEASURED = 2
+
+    def __init__(self, capacity=64):
+        '''
+        Constructor for ZoneStateTable class.
+
+            Parameters:
+                capacity (int): Initial number of slots.
+        '''
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.entry_time = np.zeros(capacity, dtype=np.float64)
+        self.entry_bbox = np.zeros((capacity, 4), dtype=np.float64)
+        self.speed = np.full(capacity, None, dtype=object)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.slot_ids = np.full(capacity, -1, dtype=np.int64)
+        self.id_to_slot = {}
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+
+    def __len__(self):
+        '''
+        Returns the number of live vehicles.
+        '''
+
+        return len(self.id_to_slot)
+
+
+    def __contains__(self, id):
+        '''
+        Check to see if a track ID has a live slot.
+        '''
+
+        return id in self.id_to_slot
+
+
+    def get_slots(self, ids):
+        '''
+        Returns the slots of the given track IDs.
+
+            Parameters:
+                ids (list): List of track IDs.
+
+            Returns:
+                slots (numpy array): Slot per track ID, -1 if the ID has no live slot.
+        '''
+
+        return np.array([self.id_to_slot.get(id, -1) for id in ids], dtype=np.int64)
+
+
+    def allocate(self, id):
+        '''
+        Returns a free slot for a track ID, doubling the columns if every slot is taken.
+
+            Parameters:
+                id (int): Track ID.
+
+            Returns:
+                slot (int): Slot of the track ID.
+        '''
+        if not self.free_slots:
+            capacity = len(self.state)
+            self.state = np.concatenate([self.state, np.zeros(capacity, dtype=np.int8)])
+            self.entry_time = np.concatenate([self.entry_time, np.zeros(capacity, dtype=np.float64)])
+            self.entry_bbox = np.concatenate([self.entry_bbox, np.zeros((capacity, 4), dtype=np.float64)])
+            self.speed = np.concatenate([self.speed, np.full(capacity, None, dtype=object)])
+            self.last_seen = np.concatenate([self.last_seen, np.zeros(capacity, dtype=np.float64)])
+            self.slot_ids = np.concatenate([self.slot_ids, np.full(capacity, -1, dtype=np.int64)])
+            self.free_slots = list(range(2 * capacity - 1, capacity - 1, -1))
+
+        slot = self.free_slots.pop()
+        self.id_to_slot[id] = slot
+        self.slot_ids[slot] = id
+
+        return slot
+
+
+    def release(self, id):
+        '''
+        Frees the slot of a track ID.
+
+            Parameters:
+                id (int): Track ID.
+
+            Returns:
+                released (boolean): True if the track ID had a live slot.
+        '''
+        slot = self.id_to_slot.pop(id, None)
+        if slot is None:
+            return False
+
+        self.state[slot] = self.OUTSIDE
+        self.speed[slot] = None
+        self.slot_ids[slot] = -1
+        self.free_slots.append(slot)
+
+        return True
+
+
+    def get_speed(self, slot):
+        '''
+        Returns the measured speed of a slot the way it is reported.
+
+            Parameters:
+                slot (int): Slot of a measured vehicle.
+
+            Returns:
+                speed (float or str): Speed in Km/h, or "Inconclusive".
+        '''
+
+        return self.speed[slot]
+
+
 class Speed():
     '''
     Class to handle everything related to speed calculation.
@@ -13,9 +144,15 @@ class Speed():
             deleting_line (Polygon): Deleting line.
             length (float): Length of the processing area.
             logger (Logger object): Logger object for logging.
+            max_state_age (float): Seconds after which the state of an object that was not seen is dropped.
+            interpolate_crossings (boolean): True if zone crossing times are interpolated between processed frames.
+            count_containment (boolean): True if a box fully inside a zone, or a zone fully inside a box, counts as intersecting it,
+                                         so skipped frames cannot hide a crossing. False for the edge intersections of if_intersect.
+            calibration (GroundCalibration object): Ground calibration of the camera. None to scale distances by the length of the processing area.
     '''
 
-    def __init__(self, entry_area, exit_area, deleting_line, length, logger):
+    def __init__(self, entry_area, exit_area, deleting_line, length, logger, max_state_age=60.0, interpolate_crossings=True,
+                 count_containment=False, calibration=None):
         '''
         Constructor method for speed class.
         
@@ -25,17 +162,220 @@ class Speed():
                 deleting_line (Polygon): Deleting line.
                 length (float): Length of the processing area.
                 logger (Logger object): Logger object for logging.`
+                max_state_age (float): Seconds after which the state of an object that was not seen is dropped.
+                interpolate_crossings (boolean): True if zone crossing times are interpolated between processed frames.
+                count_containment (boolean): True if a box fully inside a zone, or a zone fully inside a box, counts as intersecting it.
+                                             Only needed when frames are skipped, by the motion gate or keyframes for example.
+                calibration (GroundCalibration object): Ground calibration of the camera. None to scale distances by the length of the processing area.
         '''
         self.entry_area = Polygon(entry_area[0], entry_area[1], entry_area[2], entry_area[3])
         self.exit_area = Polygon(exit_area[0], exit_area[1], exit_area[2], exit_area[3])
         self.deleting_line = Polygon(deleting_line[0], deleting_line[1], deleting_line[2], deleting_line[3])
         self.length = length * 0.001
         self.logger = logger
+        self.calibration = calibration
+        self.entry_line = np.asarray(entry_area[:2], dtype=np.float32)  # First edge of the entry area, which distances are measured from
         self.pixel_distance = int(self.shortest_distance(list(reversed(exit_area))))
         self.pixel_ratio = self.length / self.pixel_distance
         
-        self.entered_the_polygon = {}  # {Object ID: entry_time}
-        self.speed_dictionary = {}  # {Object ID: speed}
+        # Edges of the entry area, exit area and deleting line as segments such as: [zone, edge, end point, (x, y)]
+        zones = np.array([entry_area[:4], exit_area[:4], deleting_line[:4]], dtype=np.float64)
+        self.zone_edges = np.stack([zones, np.roll(zones, -1, axis=1)], axis=2)
+
+        self.state_table = ZoneStateTable()
+        self.event_listeners = []  # Callables receiving (Object ID, speed, exit_time) for every measured vehicle
+        self.max_state_age = max_state_age
+        self.last_expiry_time = 0.0
+        self.expired_count = 0
+        self.forgotten_count = 0
+        self.interpolate_crossings = interpolate_crossings
+        self.count_containment = count_containment
+        self.previous_observations = {}  # {Object ID: (time, bbox)} of the last processed frame the object was seen in
+
+
+    def add_event_listener(self, listener):
+        '''
+        Registers a callable that is notified of every speed measurement.
+
+            Parameters:
+                listener (callable): Called with the object ID, the speed and the exit time in seconds.
+        '''
+        self.event_listeners.append(listener)
+
+
+    @property
+    def entered_the_polygon(self):
+        '''
+        View of the vehicles that crossed the entry area such as: {Object ID: [entry_time, object_bbox]}
+        '''
+        table = self.state_table
+        entered = {}
+        for id, slot in table.id_to_slot.items():
+            x_min, y_min, x_max, y_max = table.entry_bbox[slot]
+            entered[id] = [table.entry_time[slot], [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]]
+
+        return entered
+
+
+    @property
+    def speed_dictionary(self):
+        '''
+        View of the vehicles with a measured speed such as: {Object ID: speed}
+        '''
+        table = self.state_table
+
+        return {id: table.get_speed(slot) for id, slot in table.id_to_slot.items() if table.state[slot] == ZoneStateTable.MEASURED}
+
+
+    def forget(self, id):
+        '''
+        Drops the state of an object, for example when the tracker deletes its track.
+
+            Parameters:
+                id (int): ID of the tracked object.
+        '''
+        self.previous_observations.pop(id, None)
+        if self.state_table.release(id):
+            self.forgotten_count += 1
+
+
+    def expire_stale_state(self, current_time):
+        '''
+        Drops the state of objects that were not seen for longer than max_state_age.
+
+            Parameters:
+                current_time (float): The current time of the video in seconds.
+        '''
+        table = self.state_table
+        self.last_expiry_time = current_time
+        stale_slots = np.flatnonzero((table.slot_ids >= 0) & (current_time - table.last_seen > self.max_state_age))
+        for slot in stale_slots:
+            table.release(int(table.slot_ids[slot]))
+        self.expired_count += len(stale_slots)
+
+        stale_ids = [id for id, (time, _) in self.previous_observations.items() if current_time - time > self.max_state_age]
+        for id in stale_ids:
+            del self.previous_observations[id]
+
+
+    def get_state_size(self):
+        '''
+        Returns gauges of the live per-object state.
+
+            Returns:
+                state_size (dict): Number of live, entered and measured objects, slots allocated and objects dropped so far.
+        '''
+        table = self.state_table
+        live = table.slot_ids >= 0
+
+        return {
+            "live": len(table),
+            "entered": int(np.count_nonzero(live & (table.state == ZoneStateTable.ENTERED))),
+            "measured": int(np.count_nonzero(live & (table.state == ZoneStateTable.MEASURED))),
+            "slots": len(table.state),
+            "expired": self.expired_count,
+            "forgotten": self.forgotten_count,
+        }
+
+
+    def get_state(self):
+        '''
+        Returns the per-object state to store in a checkpoint.
+
+            Returns:
+                state (dict): Attributes that change while processing.
+        '''
+
+        return {
+            "state_table": self.state_table,
+            "previous_observations": self.previous_observations,
+            "last_expiry_time": self.last_expiry_time,
+            "expired_count": self.expired_count,
+            "forgotten_count": self.forgotten_count,
+        }
+
+
+    def set_state(self, state):
+        '''
+        Restores the per-object state of a checkpoint.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        self.__dict__.update(state)
+
+
+    def get_annotations(self, tracked_objects_info):
+        '''
+        Returns the tracked objects with their measured speeds for drawing outside of process_frame.
+
+            Parameters:
+                tracked_objects_info (list): List of tuples containing info about tracked objects.
+
+            Returns:
+                annotations (list): Tuples such as: (x_min, y_min, x_max, y_max, id, speed). Speed is None until the object is measured.
+        '''
+        slots = self.state_table.get_slots([object_info[4] for object_info in tracked_objects_info])
+
+        return [(*object_info[:5], self.state_table.get_speed(slot) if slot >= 0 else None)
+                for object_info, slot in zip(tracked_objects_info, slots)]
+
+
+    def get_zone_membership(self, boxes):
+        '''
+        Checks every bounding box against the entry area, exit area and deleting line in one pass.
+
+        A box counts as intersecting a zone when one of its edges touches one of the zone edges, which is
+        what if_intersect computes with sympy. With count_containment a box lying fully inside a zone, or a
+        zone lying fully inside a box, counts as well.
+
+            Parameters:
+                boxes (numpy array): Bounding boxes, each arranged such as: [x_min, y_min, x_max, y_max]
+
+            Returns:
+                membership (numpy array): Boolean array of shape (boxes, 3) for the entry area, exit area and deleting line.
+        '''
+        x_min, y_min, x_max, y_max = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+        corners = np.stack([np.stack([x_min, y_min], axis=1), np.stack([x_max, y_min], axis=1),
+                            np.stack([x_max, y_max], axis=1), np.stack([x_min, y_max], axis=1)], axis=1)
+        box_edges = np.stack([corners, np.roll(corners, -1, axis=1)], axis=2)
+
+        # Broadcast to [box, zone, box edge, zone edge, (x, y)]
+        p1 = box_edges[:, None, :, None, 0]
+        p2 = box_edges[:, None, :, None, 1]
+        q1 = self.zone_edges[None, :, None, :, 0]
+        q2 = self.zone_edges[None, :, None, :, 1]
+
+        def orientation(a, b, c):
+            return (b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) - (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0])
+
+        def on_segment(a, b, c):
+            return ((np.minimum(a[..., 0], b[..., 0]) <= c[..., 0]) & (c[..., 0] <= np.maximum(a[..., 0], b[..., 0])) &
+                    (np.minimum(a[..., 1], b[..., 1]) <= c[..., 1]) & (c[..., 1] <= np.maximum(a[..., 1], b[..., 1])))
+
+        d1, d2 = orientation(q1, q2, p1), orientation(q1, q2, p2)
+        d3, d4 = orientation(p1, p2, q1), orientation(p1, p2, q2)
+        crossing = (d1 * d2 < 0) & (d3 * d4 < 0)
+        touching = (((d1 == 0) & on_segment(q1, q2, p1)) | ((d2 == 0) & on_segment(q1, q2, p2)) |
+                    ((d3 == 0) & on_segment(p1, p2, q1)) | ((d4 == 0) & on_segment(p1, p2, q2)))
+
+        membership = np.any(crossing | touching, axis=(2, 3))
+        if not self.count_containment:
+            return membership
+
+        # Without touching edges the shapes overlap only if a corner of one lies inside the other.
+        corner = corners[:, None, 0]
+        a, b = self.zone_edges[None, :, :, 0], self.zone_edges[None, :, :, 1]
+        straddles = (a[..., 1] > corner[..., None, 1]) != (b[..., 1] > corner[..., None, 1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing_x = a[..., 0] + (corner[..., None, 1] - a[..., 1]) * (b[..., 0] - a[..., 0]) / (b[..., 1] - a[..., 1])
+        box_inside_zone = np.count_nonzero(straddles & (corner[..., None, 0] < crossing_x), axis=2) % 2 == 1
+
+        zone_corner = self.zone_edges[None, :, 0, 0]
+        zone_inside_box = ((x_min[:, None] <= zone_corner[..., 0]) & (zone_corner[..., 0] <= x_max[:, None]) &
+                           (y_min[:, None] <= zone_corner[..., 1]) & (zone_corner[..., 1] <= y_max[:, None]))
+
+        return membership | box_inside_zone | zone_inside_box
 
 
     def if_intersect(self, object_bbox, area):
@@ -79,8 +419,7 @@ class Speed():
             Returns:
                 distance (float): The distance value.
         '''
-        p1 = np.asarray(tuple(self.entry_area.vertices[0]), dtype=np.float32)
-        p2 = np.asarray(tuple(self.entry_area.vertices[1]), dtype=np.float32)
+        p1, p2 = self.entry_line
         x1_y1, x2_y2 = object_bbox[-2: ]
         p3 = ((x1_y1[0] + x2_y2[0]) / 2, (x1_y1[1] + x2_y2[1]) / 2)
         p3 = np.asarray(p3, dtype=np.float32)
@@ -88,7 +427,43 @@ class Speed():
         return np.linalg.norm(np.cross(p2 - p1, p1 - p3)) / np.linalg.norm(p2 - p1)
 
 
-    def process_frame(self, frame, tracked_objects_info, annotate, frame_count, fps, reporter):
+    def get_crossing(self, id, object_box, current_time, zone_index, samples=16, passes=2):
+        '''
+        Estimates when a box first touched a zone by interpolating between the previous observation of the
+        object and the current one, so the crossing time is not quantized to the processed frames.
+
+            Parameters:
+                id (int): ID of the tracked object.
+                object_box (numpy array): Current bounding box arranged such as: [x_min, y_min, x_max, y_max]
+                current_time (float): The current time of the video in seconds.
+                zone_index (int): Zone being crossed. 0 for the entry area and 1 for the exit area.
+                samples (int): Number of interpolated boxes tested per pass.
+                passes (int): Number of refinement passes.
+
+            Returns:
+                crossing_time (float): Estimated time in seconds at which the box touched the zone.
+                crossing_box (numpy array): Interpolated bounding box at the crossing time.
+        '''
+        previous = self.previous_observations.get(id, None)
+        if not self.interpolate_crossings or previous is None or previous[0] >= current_time:
+            return current_time, object_box
+
+        previous_time, previous_box = previous
+        low, high = 0.0, 1.0
+        for _ in range(passes):
+            fractions = np.linspace(low, high, samples + 1)
+            boxes = previous_box + fractions[:, None] * (object_box - previous_box)
+            touching = self.get_zone_membership(boxes)[:, zone_index]
+            if touching[0]:
+                # The object already touched the zone when it was last seen, so there is nothing to interpolate.
+                return current_time, object_box
+            first = int(np.argmax(touching))
+            low, high = fractions[first - 1], fractions[first]
+
+        return previous_time + high * (current_time - previous_time), previous_box + high * (object_box - previous_box)
+
+
+    def process_frame(self, frame, tracked_objects_info, annotate, frame_count, fps, reporter, timestamp=None):
         '''
         Process the given frame to calculate speed for all tracked objects.
 
@@ -99,61 +474,97 @@ class Speed():
                 frame_count (int): The number of frame currently being processed.
                 fps (int): The FPS of the video.
                 reporter (Reporter object): Reporter object for adding to reports.
+                timestamp (float): Capture time of the frame in seconds, such as from a live camera. None to derive it from the frame count.
 
             Returns:
                 processed_frame (numpy array): Processed image frame. It could be annotated if specified.
         '''
-        for object_info in tracked_objects_info:
-            x_min, y_min, x_max, y_max, id = object_info
+        current_time = timestamp if timestamp is not None else frame_count / fps  # in seconds
+        if current_time - self.last_expiry_time > self.max_state_age:
+            self.expire_stale_state(current_time)
+
+        if len(tracked_objects_info) == 0:
+            return frame
+
+        table = self.state_table
+        objects = np.array(tracked_objects_info, dtype=np.float64).reshape(-1, 5)
+        ids = [object_info[4] for object_info in tracked_objects_info]
+        membership = self.get_zone_membership(objects[:, :4])
+
+        # Transitions of every tracked box for this frame, computed from its state before the frame.
+        slots = table.get_slots(ids)
+        states = np.where(slots >= 0, table.state[slots], ZoneStateTable.OUTSIDE)
+        entered = states != ZoneStateTable.OUTSIDE
+        entering = ~entered & membership[:, 0]
+        exiting = entered & membership[:, 1]
+        deleting = (entered | entering) & membership[:, 2]
+        table.last_seen[slots[entered]] = current_time
+
+        # Without annotation only the boxes that emit an event need the Python loop.
+        if annotate:
+            indices = range(len(tracked_objects_info))
+        else:
+            indices = np.flatnonzero(entering | (exiting & (states != ZoneStateTable.MEASURED)) | deleting)
+
+        for i in indices:
+            x_min, y_min, x_max, y_max, id = tracked_objects_info[i]
             object_bbox = [(x_min, y_min), (x_min + (x_max - x_min), y_min), (x_max, y_max), (x_min, y_min + (y_max - y_min))]
             speed = None
             # self.logger.debug(f"Object ID: {id} being tracked.")
 
-            if self.entered_the_polygon.get(id, None) is None and not self.if_intersect(object_bbox, self.entry_area):
-                # The bbox with the same ID is not in the entered_the_polygon dictionary
-                # and it has not crossed entry area. We do not need to calculate speed for this bbox.
-                pass
-
-            elif self.entered_the_polygon.get(id, None) is None and self.if_intersect(object_bbox, self.entry_area):
-                # The bbox with the same ID is not in the entered_the_polygon dictionary
+            if entering[i]:
+                # The bbox with the same ID has not entered before
                 # and it has just crossed entry area. We need to start processing this bbox.
-                entry_time = frame_count / fps  # in seconds
-                self.entered_the_polygon[id] = [entry_time, object_bbox]
-                self.logger.debug(f"Object with ID: {id} crossed the entry line. {self.entered_the_polygon} {self.speed_dictionary}")
+                entry_time, entry_bbox = self.get_crossing(id, objects[i, :4], current_time, 0)
+                slot = table.allocate(id)
+                table.state[slot] = ZoneStateTable.ENTERED
+                table.entry_time[slot] = entry_time
+                table.entry_bbox[slot] = entry_bbox
+                table.last_seen[slot] = current_time
+                self.logger.debug(lambda: f"Object with ID: {id} crossed the entry line. {self.entered_the_polygon} {self.speed_dictionary}")
 
-            elif self.entered_the_polygon.get(id, None) is not None and self.if_intersect(object_bbox, self.exit_area):
-                # The bbox with the same ID is in the entered_the_polygon dictionary
+            elif exiting[i]:
+                # The bbox with the same ID has entered before
                 # and it has just crossed exit area. We need to calculate speed.
-                if self.speed_dictionary.get(id, None) is None:
+                slot = slots[i]
+                if table.state[slot] != ZoneStateTable.MEASURED:
                     # Speed for this ID had not been calculated before.
-                    exit_time = frame_count / fps  # in seconds
-                    pixel_distance_from_bbox = self.shortest_distance(self.entered_the_polygon[id][1])
-                    speed = self.calculate_speed(self.entered_the_polygon[id][0], exit_time, pixel_distance_from_bbox)
+                    exit_time, exit_bbox = self.get_crossing(id, objects[i, :4], current_time, 1)
+                    exit_time = float(exit_time)
+                    if self.calibration is not None:
+                        speed = self.calculate_ground_speed(float(table.entry_time[slot]), exit_time, table.entry_bbox[slot], exit_bbox)
+                    else:
+                        x1, y1, x2, y2 = table.entry_bbox[slot]
+                        pixel_distance_from_bbox = self.shortest_distance([(x1, y1), (x2, y1), (x2, y2), (x1, y2)])
+                        speed = self.calculate_speed(float(table.entry_time[slot]), exit_time, pixel_distance_from_bbox)
                     
-                    if speed < 1:
+                    # NaN when a calibrated position lies above the horizon.
+                    if not speed >= 1:
                         speed = "Inconclusive"
 
-                    self.speed_dictionary[id] = speed
-                    self.logger.debug(f"Object with ID: {id} crossed the exit line: {exit_time}. entry_time: {self.entered_the_polygon} {self.speed_dictionary}")
+                    table.state[slot] = ZoneStateTable.MEASURED
+                    table.speed[slot] = speed
+                    self.logger.debug(lambda: f"Object with ID: {id} crossed the exit line: {exit_time}. entry_time: {self.entered_the_polygon} {self.speed_dictionary}")
                     
                     if speed:
                         reporter.add_to_report(frame, id, speed, (x_min, y_min, x_max, y_max), exit_time)
+                        for listener in self.event_listeners:
+                            listener(id, speed, exit_time)
 
                 else:
-                    speed = self.speed_dictionary[id]
+                    speed = table.get_speed(slot)
 
-            if self.entered_the_polygon.get(id, None) is not None and self.if_intersect(object_bbox, self.deleting_line):
-                # The bbox with the same ID is in the entered_the_polygon dictionary
+            if deleting[i]:
+                # The bbox with the same ID has entered before
                 # and it has just crossed the deleting line. We need to delete this ID.
-                del self.entered_the_polygon[id]
-                if self.speed_dictionary.get(id, None):
-                    del self.speed_dictionary[id]
-                
-                self.logger.debug(f"Object with ID: {id} crossed the delete line. {self.entered_the_polygon} {self.speed_dictionary}")
+                table.release(id)
+                self.logger.debug(lambda: f"Object with ID: {id} crossed the delete line. {self.entered_the_polygon} {self.speed_dictionary}")
 
             if annotate:
                 frame = self.annotate(frame, [x_min, y_min, x_max, y_max], speed, id)
 
+        self.previous_observations.update(zip(ids, ((current_time, box) for box in objects[:, :4])))
+
         return frame
 
 
@@ -198,4 +609,24 @@ class Speed():
                 speed (float): Speed of an object in Kilometers per hour (Km/h).
         '''
         
-        return round(((self.length - (pixel_distance_from_bbox * self.pixel_ratio)) / (exit_time - entry_time)) * 3600, 3)
\ No newline at end of file
+        return round(((self.length - (pixel_distance_from_bbox * self.pixel_ratio)) / (exit_time - entry_time)) * 3600, 3)
+
+
+    def calculate_ground_speed(self, entry_time, exit_time, entry_bbox, exit_bbox):
+        '''
+        Calculates the speed of the object from the ground distance between its entry and exit positions.
+
+            Parameters:
+                entry_time (float): The time of entry in seconds.
+                exit_time (float): The time of exit in seconds.
+                entry_bbox (numpy array): Bounding box at entry arranged such as: [x_min, y_min, x_max, y_max]
+                exit_bbox (numpy array): Bounding box at exit arranged such as: [x_min, y_min, x_max, y_max]
+
+            Returns:
+                speed (float): Speed of an object in Kilometers per hour (Km/h). NaN if a position could not be mapped to the ground.
+        '''
+        # The bottom center of a box is where the vehicle touches the road.
+        distance = self.calibration.get_distance(((entry_bbox[0] + entry_bbox[2]) / 2, entry_bbox[3]),
+                                                 ((exit_bbox[0] + exit_bbox[2]) / 2, exit_bbox[3]))
+
+        return round((distance * 0.001 / (exit_time - entry_time)) * 3600, 3)
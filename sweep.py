@@ -0,0 +1,273 @@
+import os
+import csv
+import random
+import itertools
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import tracker as t
+import speed as s
+import cache as ch
+import utilities as u
+
+
+# Parameters passed to the tracker. Every other parameter of a configuration is passed to Speed.
+tracker_parameters = ("max_dist", "max_iou_distance", "max_age", "n_init", "nn_budget")
+
+
+class NullLogger():
+    '''
+    Logger that drops every message.
+    '''
+
+    def debug(self, message, *args):
+        pass
+
+
+class SweepReporter():
+    '''
+    Reporter that keeps the measured speeds in memory.
+
+        Attributes:
+            speeds (dict): Measured speeds such as: {Object ID: speed}
+    '''
+
+    def __init__(self):
+        self.speeds = {}
+
+    def add_to_report(self, frame, id, speed, bbox, time):
+        self.speeds[id] = speed
+
+
+def get_grid_configurations(space):
+    '''
+    Returns every combination of the given parameter values.
+
+        Parameters:
+            space (dict): Values to try per parameter such as: {"max_dist": [0.1, 0.2], "n_init": [2, 3]}
+
+        Returns:
+            configurations (list): Dictionaries of parameter values.
+    '''
+    names = list(space)
+
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def get_random_configurations(space, count, seed=0):
+    '''
+    Returns randomly drawn parameter values.
+
+        Parameters:
+            space (dict): Per parameter either a list of values to choose from, or a (low, high) tuple to draw uniformly from.
+                          Integer bounds draw integers.
+            count (int): Number of configurations.
+            seed (int): Seed of the random draws.
+
+        Returns:
+            configurations (list): Dictionaries of parameter values.
+    '''
+    generator = random.Random(seed)
+    configurations = []
+    for _ in range(count):
+        configuration = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                configuration[name] = generator.randint(low, high) if isinstance(low, int) and isinstance(high, int) else generator.uniform(low, high)
+            else:
+                configuration[name] = generator.choice(values)
+        configurations.append(configuration)
+
+    return configurations
+
+
+def get_iou(box, boxes):
+    '''
+    Returns the intersection over union of a box with other boxes.
+
+        Parameters:
+            box (numpy array): Box arranged such as: [x_min, y_min, x_max, y_max]
+            boxes (numpy array): Boxes arranged such as: [[x_min, y_min, x_max, y_max], ...]
+
+        Returns:
+            ious (numpy array): IoU per box.
+    '''
+    width = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    height = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    intersection = width * height
+    union = (box[2] - box[0]) * (box[3] - box[1]) + (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) - intersection
+
+    return intersection / np.maximum(union, 1e-9)
+
+
+def evaluate(configuration, cache_directory, cache_key, frame_shape, fps, config_path, zones, length,
+             use_keyframes=True, max_keyframe_interval=6, use_motion_gate=True, switch_window=30, switch_iou=0.3):
+    '''
+    Replays the cached detections with one configuration and returns its metrics.
+
+    Keyframes are scheduled from the tracks of this configuration as main.py does, and the cached detections
+    are used on them. The other frames with motion are predicted, and frames the motion gate coasted are coasted.
+
+    A track that appears on top of a track which vanished within switch_window frames is counted as an ID
+    switch. Without ground truth this is a proxy, but it ranks configurations by how often they fragment tracks.
+
+        Parameters:
+            configuration (dict): Tracker and Speed parameters.
+            cache_directory (str): Directory holding the cache entries.
+            cache_key (str): Key of the cache entry to replay.
+            frame_shape (tuple): Shape of the video frames such as: (height, width, 3).
+            fps (float): Frame rate of the video.
+            config_path (str): Path to the deepsort config file with the defaults.
+            zones (tuple): Zones passed to Speed and zones in frame coordinates, as returned by utilities.get_zones.
+            length (float): Length of the processing area in meters.
+            use_keyframes (boolean): True to run detection only on keyframes, as main.py does.
+            max_keyframe_interval (int): Largest number of frames between keyframes.
+            use_motion_gate (boolean): True if the cache was recorded with the motion gate, as main.py does.
+            switch_window (int): Number of frames a vanished track is considered for ID switches.
+            switch_iou (float): Minimum overlap of a new track with a vanished one to count as an ID switch.
+
+        Returns:
+            metrics (dict): The configuration with its track, ID switch and speed statistics.
+    '''
+    detection_cache = ch.DetectionCache(cache_directory, key=cache_key)
+    tracker = t.Tracker()
+    tracker.set_tracker_model(None, config_path, **{name: value for name, value in configuration.items() if name in tracker_parameters})
+    speed_zones, frame_zones = zones
+    speed_parameters = {"entry_area": speed_zones[0], "exit_area": speed_zones[1], "deleting_line": speed_zones[2], "length": length,
+                        "count_containment": use_motion_gate or use_keyframes}
+    speed_parameters.update({name: value for name, value in configuration.items() if name not in tracker_parameters})
+    speed = s.Speed(logger=NullLogger(), **speed_parameters)
+    reporter = SweepReporter()
+    keyframe_scheduler = u.KeyframeScheduler([frame_zones[0], frame_zones[1]], max_interval=max_keyframe_interval)
+
+    last_seen = {}  # {Object ID: (frame index, box)}
+    id_switches = 0
+    frame_indices = detection_cache.frame_indices
+    cached = set(frame_indices.tolist())
+    frames_since_detection = 0
+    for frame_index in range(int(frame_indices[0]), int(frame_indices[-1]) + 1) if len(frame_indices) else ():
+        if frame_index in cached:
+            if not use_keyframes or keyframe_scheduler.if_keyframe(tracker.get_tracks()):
+                tracked_objects_info = tracker.track_with_features(*detection_cache.get(frame_index), frame_shape)
+            else:
+                tracked_objects_info = tracker.predict(keyframe_scheduler.frames_since_keyframe)
+            frames_since_detection = 0
+        else:
+            # Frames without detections are advanced as in the recorded run. Entries recorded without steps
+            # only know the number of frames since the last detection.
+            frames_since_detection += 1
+            step = detection_cache.get_step(frame_index) if detection_cache.has_steps else frames_since_detection
+            if step is None:
+                continue
+            elif step == detection_cache.coasted_step:
+                tracked_objects_info = tracker.coast()
+            else:
+                tracked_objects_info = tracker.predict(step)
+
+        current_ids = {object_info[4] for object_info in tracked_objects_info}
+        vanished = [(id, box) for id, (seen, box) in last_seen.items() if id not in current_ids and frame_index - seen <= switch_window]
+        for x_min, y_min, x_max, y_max, id in tracked_objects_info:
+            box = np.array([x_min, y_min, x_max, y_max], dtype=np.float64)
+            if id not in last_seen and vanished and get_iou(box, np.array([vanished_box for _, vanished_box in vanished])).max() > switch_iou:
+                id_switches += 1
+            last_seen[id] = (frame_index, box)
+
+        speed.process_frame(None, tracked_objects_info, False, frame_index, fps, reporter)
+
+    speeds = np.array([value for value in reporter.speeds.values() if isinstance(value, (float, int))], dtype=np.float64)
+    metrics = dict(configuration)
+    metrics.update({
+        "tracks": len(last_seen),
+        "id_switches": id_switches,
+        "measured": len(speeds),
+        "inconclusive": len(reporter.speeds) - len(speeds),
+        "mean_speed": round(float(speeds.mean()), 3) if len(speeds) else float("nan"),
+        "std_speed": round(float(speeds.std()), 3) if len(speeds) else float("nan"),
+    })
+    for q in (15, 50, 85):
+        metrics[f"p{q}_speed"] = round(float(np.percentile(speeds, q)), 3) if len(speeds) else float("nan")
+
+    return metrics
+
+
+def run_sweep(configurations, cache_directory, cache_key, video_path, zones, length, use_keyframes=True, max_keyframe_interval=6,
+              use_motion_gate=True, config_path=os.path.join("deep_sort", "configs", "deep_sort.yaml"), workers=None, table_path=None):
+    '''
+    Evaluates configurations in parallel over a recorded detection cache and writes a comparison table.
+
+        Parameters:
+            configurations (list): Dictionaries of tracker and Speed parameters.
+            cache_directory (str): Directory holding the cache entries.
+            cache_key (str): Key of the recorded cache entry.
+            video_path (str): Path to the video, only read for its frame size and rate.
+            zones (tuple): Zones passed to Speed and zones in frame coordinates, as returned by utilities.get_zones.
+            length (float): Length of the processing area in meters.
+            use_keyframes (boolean): True to run detection only on keyframes, as main.py does.
+            max_keyframe_interval (int): Largest number of frames between keyframes.
+            use_motion_gate (boolean): True if the cache was recorded with the motion gate, as main.py does.
+            config_path (str): Path to the deepsort config file with the defaults.
+            workers (int): Number of processes. All cores if None.
+            table_path (str): Path of the CSV comparison table. None to not write one.
+
+        Returns:
+            results (list): Metrics per configuration, sorted by ID switches and then by inconclusive measurements.
+    '''
+    video = cv2.VideoCapture(video_path)
+    frame_shape = (int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(video.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+    fps = video.get(cv2.CAP_PROP_FPS)
+    video.release()
+
+    arguments = (cache_directory, cache_key, frame_shape, fps, config_path, zones, length, use_keyframes, max_keyframe_interval, use_motion_gate)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(evaluate, configurations, *([argument] * len(configurations) for argument in arguments)))
+    results.sort(key=lambda metrics: (metrics["id_switches"], metrics["inconclusive"]))
+
+    if table_path is not None:
+        header = list(dict.fromkeys(name for metrics in results for name in metrics))
+        with open(table_path, 'w', encoding='UTF8', newline='') as file:
+            writer = csv.DictWriter(file, header)
+            writer.writeheader()
+            writer.writerows(results)
+
+    return results
+
+
+if __name__ == "__main__":
+    # Parameters to change
+    video_name = "recording.avi"
+    cache_key = None  # Key of the cache entry logged by main.py. None for the most recently recorded entry
+    entry_area = [(164, 97), (300, 78), (364, 136), (180, 172)]
+    exit_area = [(255, 534), (727, 343), (870, 484), (306, 747)]
+    deleting_line = [(310, 832), (861, 633), (955, 826), (366, 1050)]
+    length = 39.0  # in meters
+    use_keyframes = True  # As set in main.py
+    max_keyframe_interval = 6
+    use_motion_gate = True
+    search_space = {
+        "max_dist": [0.1, 0.2, 0.3],
+        "max_iou_distance": [0.5, 0.7],
+        "max_age": [15, 30, 60],
+        "n_init": [2, 3],
+    }
+    random_count = None  # Number of random configurations instead of the full grid, with (low, high) tuples allowed in the search space
+
+    cache_directory = os.path.join("Data", "Cache")
+    if cache_key is None:
+        entries = [entry for entry in os.listdir(cache_directory) if os.path.exists(os.path.join(cache_directory, entry, "index.npz"))]
+        cache_key = max(entries, key=lambda entry: os.path.getmtime(os.path.join(cache_directory, entry, "index.npz")))
+
+    video_path = os.path.join("Data", video_name)
+    video = cv2.VideoCapture(video_path)
+    frame_size = (int(video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    video.release()
+    zones = u.get_zones(frame_size, entry_area, exit_area, deleting_line)
+
+    if random_count is None:
+        configurations = get_grid_configurations(search_space)
+    else:
+        configurations = get_random_configurations(search_space, random_count)
+    results = run_sweep(configurations, cache_directory, cache_key, video_path, zones, length, use_keyframes, max_keyframe_interval,
+                        use_motion_gate, table_path=os.path.join("Data", f"sweep_{video_name.split('.')[0]}.csv"))
+    for metrics in results[:10]:
+        print(metrics)
@@ -0,0 +1,57 @@
+import numpy as np
+import cache as ch
+import utilities as u
+
+
+zone = [(100, 100), (200, 100), (200, 200), (100, 200)]
+
+
+class Track():
+
+    def __init__(self, box):
+        self.box = np.array(box, dtype=np.float64)
+        self.mean = np.array([0, 0, 0, box[3] - box[1], 0, 0, 0, 0], dtype=np.float64)
+        self.covariance = np.eye(8) * 1e-4
+
+    def to_tlbr(self):
+        return self.box
+
+
+def get_detections(frame_index):
+    xywhs = np.array([[frame_index, 10, 20, 20]], dtype=np.float32)
+    return xywhs, np.array([0.9], dtype=np.float32), np.array([2], dtype=np.float32), np.ones((1, 4), dtype=np.float32)
+
+
+def run(cache, max_dist, frame_count=60):
+    '''
+    Processes frames like main.py. The tracks, and so the keyframes, depend on max_dist as they would with the real tracker.
+    '''
+    keyframe_scheduler = u.KeyframeScheduler([zone], max_interval=6)
+    detected_frames, keyframes = [], []
+    for frame_index in range(frame_count):
+        tracks = [Track((120, 120, 160, 160))] if max_dist > 0.2 and 20 <= frame_index < 40 else []
+        keyframe = keyframe_scheduler.if_keyframe(tracks)
+        detections = cache.detect_frame(frame_index, lambda: detected_frames.append(frame_index) or get_detections(frame_index), keyframe)
+        if keyframe:
+            keyframes.append(frame_index)
+            assert detections[0][0, 0] == frame_index
+        else:
+            assert detections is None
+    cache.close()
+
+    return detected_frames, keyframes
+
+
+def test_rerun_with_other_tracker_parameters_has_no_misses(tmp_path):
+    video_path, weights_path = tmp_path / "video.avi", tmp_path / "weights.pt"
+    video_path.write_bytes(b"video")
+    weights_path.write_bytes(b"weights")
+    settings = {"confidence_threshold": 0.5}
+
+    detected_frames, recorded_keyframes = run(ch.DetectionCache(str(tmp_path / "Cache"), str(video_path), [str(weights_path)], settings), max_dist=0.1)
+    assert detected_frames == list(range(60))
+
+    cache = ch.DetectionCache(str(tmp_path / "Cache"), str(video_path), [str(weights_path)], settings)
+    detected_frames, keyframes = run(cache, max_dist=0.3)
+    assert cache.complete and keyframes != recorded_keyframes
+    assert detected_frames == [] and cache.misses == 0 and cache.hits == len(keyframes)
@@ -0,0 +1,52 @@
+from datetime import datetime
+import pytest
+import checkpoint as cp
+import event_store as e
+
+
+class Counter():
+
+    def __init__(self):
+        self.count = 0
+
+    def get_state(self):
+        return {"count": self.count}
+
+    def set_state(self, state):
+        self.count = state["count"]
+
+
+@pytest.mark.parametrize("save_level, load_level", [(0, 1), (1, 0), (6, 1)])
+def test_checkpoint_is_read_whatever_level_wrote_it(tmp_path, save_level, load_level):
+    counter = Counter()
+    counter.count = 42
+    cp.Checkpointer(str(tmp_path / "run.checkpoint"), compression_level=save_level).save(120, {"counter": counter}, {"key": "value"})
+
+    restored = Counter()
+    checkpointer = cp.Checkpointer(str(tmp_path / "run.checkpoint"), compression_level=load_level)
+    frame_count, loop_state = checkpointer.restore({"counter": restored}, checkpointer.load())
+
+    assert (frame_count, loop_state, restored.count) == (120, {"key": "value"}, 42)
+
+
+@pytest.mark.parametrize("store_type", ["columnar", "sqlite"])
+def test_event_store_is_rolled_back_to_the_checkpoint(tmp_path, store_type):
+    if store_type == "columnar":
+        store = e.SpeedEventStore(str(tmp_path / "Events"))
+    else:
+        store = e.SQLiteEventStore(str(tmp_path / "events.db"))
+    start = datetime(2024, 5, 1, 6).timestamp()
+
+    store.add("other", start, 1, 80.0, 0.0)
+    store.add("camera", start + 10, 1, 50.0, 10.0)
+    state = store.get_state("camera")
+    store.add("camera", start + 20, 2, 60.0, 20.0)
+    store.add("other", start + 20, 2, 70.0, 20.0)
+    store.flush()
+
+    store.set_state("camera", state)
+    store.add("camera", start + 20, 2, 60.0, 20.0)
+
+    assert list(store.query(camera="camera")["id"]) == [1, 2]
+    assert len(store.query(camera="other")) == 2
+    store.close()
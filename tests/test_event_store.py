@@ -0,0 +1,64 @@
+import os
+import time
+from datetime import datetime
+import event_store as e
+
+
+start = datetime(2024, 5, 1, 6).timestamp()
+
+
+def test_buffered_events_are_written_after_the_flush_interval(tmp_path):
+    store = e.SpeedEventStore(str(tmp_path), flush_interval=0.1)
+    store.add("camera", start, 1, 50.0, 0.0)
+
+    reader = e.SpeedEventStore(str(tmp_path))
+    deadline = time.monotonic() + 5
+    while not len(reader.query(camera="camera")) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert list(reader.query(camera="camera")["id"]) == [1]
+    store.close()
+    reader.close()
+
+
+def test_small_chunks_are_merged_into_the_next_write(tmp_path):
+    store = e.SpeedEventStore(str(tmp_path), chunk_size=8)
+    for id in range(20):
+        store.add("camera", start + id, id, 50.0 + id, float(id))
+        store.get_state("camera")
+
+    partition_path = store.get_partition_path("camera", "2024-05-01")
+    chunks = [name for name in os.listdir(partition_path) if name.startswith("chunk_")]
+    assert len(chunks) == 3 and sorted(store.read_index(partition_path)["rows"]) == [4, 8, 8]
+    assert list(store.query(camera="camera")["id"]) == list(range(20))
+    store.close()
+
+
+def test_rollback_keeps_events_merged_after_the_checkpoint(tmp_path):
+    store = e.SpeedEventStore(str(tmp_path), chunk_size=8)
+    for id in range(5):
+        store.add("camera", start + id, id, 50.0, float(id))
+    state = store.get_state("camera")
+    for id in range(5, 10):
+        store.add("camera", start + id, id, 50.0, float(id))
+    store.flush()
+
+    store.set_state("camera", state)
+    store.add("camera", start + 5, 5, 50.0, 5.0)
+
+    assert list(store.query(camera="camera")["id"]) == list(range(6))
+    store.close()
+
+
+def test_sqlite_events_of_a_quiet_feed_are_inserted_after_the_flush_interval(tmp_path):
+    store = e.SQLiteEventStore(str(tmp_path / "events.db"), flush_interval=0.1)
+    store.add("camera", start, 1, 50.0, 0.0)
+
+    reader = e.SQLiteEventStore(str(tmp_path / "events.db"))
+    deadline = time.monotonic() + 5
+    while not len(reader.query(camera="camera")) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert list(reader.query(camera="camera")["id"]) == [1]
+    store.close()
+    reader.close()
@@ -0,0 +1,47 @@
+import os
+import cv2
+import numpy as np
+import recorder as r
+
+
+def frames(count, size=(320, 240)):
+    for index in range(count):
+        frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        cv2.putText(frame, str(index), (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        yield index, frame
+
+
+def test_ring_keeps_compressed_frames_within_pre_roll(tmp_path):
+    recorder = r.ClipRecorder(str(tmp_path), "video", 8, (320, 240), pre_roll=1.0, post_roll=0.5)
+    for index, frame in frames(50):
+        recorder.record(frame, [], index / 8)
+    recorder.close()
+
+    assert len(recorder.ring) == 9
+    assert recorder.ring_bytes == sum(encoded.nbytes for _, encoded, _ in recorder.ring)
+    assert recorder.ring_bytes < 9 * 320 * 240 * 3 / 10
+
+
+def test_ring_is_capped_in_bytes(tmp_path):
+    recorder = r.ClipRecorder(str(tmp_path), "video", 10, (320, 240), pre_roll=10.0, max_ring_bytes=20000)
+    for index, frame in frames(50):
+        recorder.record(frame, [], index / 10)
+        assert recorder.ring_bytes <= 20000 or len(recorder.ring) == 1
+    recorder.close()
+
+    assert 1 < len(recorder.ring) < 50
+
+
+def test_clip_is_written_from_the_ring(tmp_path):
+    rendered = []
+    render = lambda frame, objects: rendered.append(frame.shape) or frame
+    recorder = r.ClipRecorder(str(tmp_path), "video", 10, (320, 240), pre_roll=1.0, post_roll=0.5, render=render)
+    for index, frame in frames(40):
+        if index == 30:
+            recorder.add_event(1, 50.0, 3.0)
+        recorder.record(frame, [], index / 10)
+    recorder.close()
+
+    assert recorder.clips_written == 1
+    assert rendered == [(240, 320, 3)] * 16
+    assert os.path.getsize(recorder.clip_path) > 0
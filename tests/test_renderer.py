@@ -0,0 +1,45 @@
+import time
+import threading
+import numpy as np
+import renderer as r
+
+
+class BlockedWriter():
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.frames = []
+
+    def write(self, frame):
+        self.released.wait()
+        self.frames.append(int(frame[0, 0, 0]))
+
+
+class WarningLogger():
+
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message, *args):
+        self.warnings.append(message % args)
+
+
+def test_submit_drops_the_oldest_frames_instead_of_blocking():
+    writer = BlockedWriter()
+    logger = WarningLogger()
+    renderer = r.AnnotationRenderer((8, 8), [], [writer], queue_size=4, logger=logger)
+
+    start = time.monotonic()
+    for index in range(20):
+        renderer.submit(np.full((8, 8, 3), index, dtype=np.uint8))
+    assert time.monotonic() - start < 1.0
+
+    writer.released.set()
+    renderer.close()
+
+    assert renderer.frames_dropped > 0
+    assert renderer.frames_rendered + renderer.frames_dropped == 20
+    assert writer.frames == sorted(writer.frames)
+    assert writer.frames[-4:] == [16, 17, 18, 19]
+    assert logger.warnings[0] == "Rendering fell behind, 1 frames dropped so far."
+    assert f"{renderer.frames_dropped} dropped" in renderer.get_summary()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import speed as s
+
+
+entry_area = [(164, 97), (300, 78), (364, 136), (180, 172)]
+exit_area = [(255, 534), (727, 343), (870, 484), (306, 747)]
+deleting_line = [(310, 832), (861, 633), (955, 826), (366, 1050)]
+
+
+class NullLogger():
+
+    def debug(self, message, *args):
+        pass
+
+
+def get_speed(**parameters):
+    return s.Speed(entry_area, exit_area, deleting_line, 39.0, NullLogger(), **parameters)
+
+
+@pytest.mark.parametrize("count_containment", [False, True])
+def test_containment_counts_only_when_enabled(count_containment):
+    speed = get_speed(count_containment=count_containment)
+    box_inside_zone = [240, 105, 260, 125]
+    zone_inside_box = [100, 50, 400, 200]
+    crossing_edge = [150, 90, 200, 140]
+
+    membership = speed.get_zone_membership(np.array([box_inside_zone, zone_inside_box, crossing_edge], dtype=np.float64))
+
+    assert list(membership[:, 0]) == [count_containment, count_containment, True]
+
+
+def test_containment_is_off_by_default():
+    assert not get_speed().count_containment
+
+
+def get_random_zone(generator, size):
+    '''
+    Returns a convex quadrilateral with integer corners on a small grid, so touching and collinear edges are common.
+    '''
+    while True:
+        points = generator.integers(0, size, (4, 2))
+        center = points.mean(axis=0)
+        points = points[np.argsort(np.arctan2(points[:, 1] - center[1], points[:, 0] - center[0]))]
+        if len({tuple(point) for point in points}) == 4:
+            return [tuple(int(value) for value in point) for point in points]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_zone_membership_matches_if_intersect(seed):
+    generator = np.random.default_rng(seed)
+    zones = [get_random_zone(generator, 12), get_random_zone(generator, 12), [(0, 6), (4, 6), (8, 6), (12, 6)]]  # The last is a line
+    speed = s.Speed(zones[0], zones[1], zones[2], 39.0, NullLogger())
+    corners = generator.integers(0, 14, (80, 2, 2))
+    boxes = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+
+    membership = speed.get_zone_membership(boxes.astype(np.float64))
+
+    for box, row in zip(boxes.tolist(), membership):
+        x_min, y_min, x_max, y_max = box
+        object_bbox = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
+        expected = [speed.if_intersect(object_bbox, area) for area in (speed.entry_area, speed.exit_area, speed.deleting_line)]
+        assert list(row) == expected, (box, zones)
@@ -0,0 +1,107 @@
+import os
+import time
+from datetime import date, datetime
+import numpy as np
+import pytest
+import utilities as u
+import event_store as e
+import camera as c
+
+
+def test_logger_and_reporter_write_an_event(tmp_path):
+    logger = u.Logger(str(tmp_path), "camera")
+    store = e.SpeedEventStore(str(tmp_path / "Events"))
+    reporter = u.Reporter(str(tmp_path / "Reports"), "camera", str(tmp_path / "Frames"), logger, ['ID', 'timestamp', 'speed(km/h)'], 6,
+                          image_format="jpg", event_store=store, recording_date=date(2024, 5, 1))
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+
+    logger.info("Starting processing frames.")
+    reporter.add_to_report(frame, 7, 52.5, (10, 10, 40, 40), 90.0)
+    reporter.close()
+    logger.close()
+
+    with open(tmp_path / "camera.log") as file:
+        assert "Starting processing frames." in file.read()
+    with open(tmp_path / "Reports" / "camera_report.csv") as file:
+        assert file.read().splitlines() == ["ID,timestamp,speed(km/h)", "7,6:1:30 AM,52.5"]
+    assert os.path.exists(tmp_path / "Frames" / "camera" / "7.jpg")
+    events = store.query(camera="camera")
+    assert len(events) == 1 and events[0]["id"] == 7
+    assert events[0]["timestamp"] == reporter.recording_start.timestamp() + 90.0
+
+
+def test_reporter_times_events_from_the_recording_start(tmp_path):
+    logger = u.Logger(str(tmp_path), "live")
+    store = e.SpeedEventStore(str(tmp_path / "Events"))
+    recording_start = datetime(2024, 5, 1, 13, 59, 30)
+    reporter = u.Reporter(str(tmp_path / "Reports"), "live", str(tmp_path / "Frames"), logger, ['ID', 'timestamp', 'speed(km/h)'], 6,
+                          image_format="jpg", event_store=store, recording_start=recording_start)
+
+    reporter.add_to_report(np.zeros((100, 100, 3), dtype=np.uint8), 3, 40.0, (10, 10, 40, 40), 45.0)
+    reporter.close()
+    logger.close()
+
+    with open(tmp_path / "Reports" / "live_report.csv") as file:
+        assert file.read().splitlines()[1] == "3,2:0:15 PM,40.0"
+    assert store.query(camera="live")[0]["timestamp"] == recording_start.timestamp() + 45.0
+
+
+def test_logger_batches_until_flushed_and_writes_after_close(tmp_path):
+    logger = u.Logger(str(tmp_path), "batched", flush_interval=60.0, batch_size=3)
+    log_path = tmp_path / "batched.log"
+
+    logger.info("first")
+    logger.info("second")
+    time.sleep(0.1)
+    assert not os.path.exists(log_path) or log_path.read_text() == ""
+    logger.info("third")
+    deadline = time.monotonic() + 5
+    while (not os.path.exists(log_path) or len(log_path.read_text().splitlines()) < 3) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(log_path.read_text().splitlines()) == 3
+
+    logger.info("fourth")
+    logger.flush()
+    logger.close()
+    logger.info("after close")
+    lines = log_path.read_text().splitlines()
+    assert len(lines) == 5 and lines[-1].endswith("after close")
+
+
+def test_reporter_batches_rows_and_refuses_rows_after_close(tmp_path):
+    logger = u.Logger(str(tmp_path), "batched")
+    reporter = u.Reporter(str(tmp_path / "Reports"), "batched", str(tmp_path / "Frames"), logger, ['ID', 'timestamp', 'speed(km/h)'], 6,
+                          flush_interval=60.0, batch_size=2)
+    report_path = tmp_path / "Reports" / "batched_report.csv"
+
+    reporter.add_a_row_to_report(["1", "6:0:1 AM", "50.0"])
+    time.sleep(0.1)
+    assert len(report_path.read_text().splitlines()) == 1
+    reporter.flush()
+    assert len(report_path.read_text().splitlines()) == 2
+
+    reporter.close()
+    with pytest.raises(Exception):
+        reporter.add_a_row_to_report(["2", "6:0:2 AM", "60.0"])
+    with pytest.raises(Exception):
+        reporter.add_to_report(np.zeros((100, 100, 3), dtype=np.uint8), 2, 60.0, (10, 10, 40, 40), 2.0)
+    logger.close()
+
+
+def test_reporter_needs_the_recording_date_to_store_events(tmp_path):
+    logger = u.Logger(str(tmp_path), "undated")
+    with pytest.raises(Exception):
+        u.Reporter(str(tmp_path / "Reports"), "undated", str(tmp_path / "Frames"), logger, ['ID', 'timestamp', 'speed(km/h)'], 6,
+                   event_store=e.SpeedEventStore(str(tmp_path / "Events")))
+    logger.close()
+
+
+def test_get_zones_scales_only_the_frame_zones_as_the_camera_does():
+    entry_area, exit_area, deleting_line = [(164, 97), (300, 78)], [(255, 534), (727, 343)], [(310, 832), (955, 826)]
+    camera = c.Camera.__new__(c.Camera)
+    camera.size = (1920, 1080)
+
+    speed_zones, frame_zones = u.get_zones(camera.size, entry_area, exit_area, deleting_line)
+
+    assert speed_zones == (entry_area, exit_area, deleting_line)
+    assert frame_zones == tuple(camera.process_coordinates(zone, display_dimension=(962, 1080)) for zone in speed_zones)
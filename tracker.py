@@ -11,6 +11,7 @@ class Tracker():
     
         Attributes:
             model (model object): Tracker model.
+            unmatched_tracks (list): Confirmed tracks that missed a detection in the last update.
     '''
 
     def __init__(self):
@@ -18,25 +19,29 @@ class Tracker():
         Constructor for Tracker class.
         '''
         self.model = None
+        self.unmatched_tracks = []
 
     
-    def set_tracker_model(self, model_name, config_path):
+    def set_tracker_model(self, model_name, config_path, extractor=None, **overrides):
         '''
         Sets the model for tracking.
         
             Parameters:
-                model_name (string): Name of the model.
+                model_name (string): Name of the model. None for a model without feature extractor, which only tracks with given features.
                 config_path (string): Path to the config.yaml file.
+                extractor (Extractor or BatchedExtractor object): Feature extractor shared with other trackers. None to load the model of model_name.
+                overrides (dict): Deepsort parameters replacing the ones of the config file, such as: max_dist=0.3
         '''
         if not os.path.exists(config_path):
             raise FileNotFoundError("Invalid path to config file.")
 
         config = get_config()
         config.merge_from_file(config_path)
+        parameters = {"max_dist": config.DEEPSORT.MAX_DIST, "max_iou_distance": config.DEEPSORT.MAX_IOU_DISTANCE,
+                      "max_age": config.DEEPSORT.MAX_AGE, "n_init": config.DEEPSORT.N_INIT, "nn_budget": config.DEEPSORT.NN_BUDGET}
+        parameters.update(overrides)
 
-        self.model = DeepSort(model_name, max_dist=config.DEEPSORT.MAX_DIST, max_iou_distance=config.DEEPSORT.MAX_IOU_DISTANCE,
-                    max_age=config.DEEPSORT.MAX_AGE, n_init=config.DEEPSORT.N_INIT, nn_budget=config.DEEPSORT.NN_BUDGET, 
-                    use_cuda=torch.cuda.is_available())
+        self.model = DeepSort(model_name, use_cuda=torch.cuda.is_available(), extractor=extractor, **parameters)
 
     
     def get_tracker_model(self):
@@ -50,25 +55,58 @@ class Tracker():
         return self.model
 
     
-    def get_tracker_ids(self, results, frame, confidence_threshold):
+    def get_detections(self, results, confidence_threshold):
         '''
-        Fetches the tracker ids using deepsort model.
-        
+        Filters the detections to track and converts them for the deepsort model.
+
             Parameters:
                 results (pytorch tensor object): The results of inference on the given frame.
-                frame (numpy array): Frame to run inference on.
                 confidence_threshold (float): Threshold for minimum confidence of detection.
 
             Returns:
-                tracker_ids (list): List of tracked objects.
+                xywhs (pytorch tensor object): Boxes of the detections arranged such as: [x_center, y_center, width, height]
+                confidences (pytorch tensor object): Confidences of the detections.
+                classes (pytorch tensor object): Classes of the detections.
         '''
         results = results.xyxy[0].clone()  # Copy of results tensor, to avoid changing the original tensor.
         filtered_results = results[torch.where(results[:, 4] > confidence_threshold)]  # Filtered to only include above a certain threshold.
         xywhs = xyxy2xywh(filtered_results[:, 0:4])
         confidences = filtered_results[:, 4]
         classes =  filtered_results[:, 5]
+
+        return xywhs.cpu(), confidences.cpu(), classes.cpu()
+
+
+    def get_features(self, xywhs, frame):
+        '''
+        Extracts the re-identification features of the detections.
+
+            Parameters:
+                xywhs (pytorch tensor object): Boxes of the detections arranged such as: [x_center, y_center, width, height]
+                frame (numpy array): Frame the detections belong to.
+
+            Returns:
+                features (numpy array): One feature vector per detection.
+        '''
+
+        return self.model.get_features(xywhs, frame)
+
+
+    def get_tracker_ids(self, results, frame, confidence_threshold):
+        '''
+        Fetches the tracker ids using deepsort model.
         
-        return self.model.update(xywhs.cpu(), confidences.cpu(), classes.cpu(), frame)
+            Parameters:
+                results (pytorch tensor object): The results of inference on the given frame.
+                frame (numpy array): Frame to run inference on.
+                confidence_threshold (float): Threshold for minimum confidence of detection.
+
+            Returns:
+                tracker_ids (list): List of tracked objects.
+        '''
+        xywhs, confidences, classes = self.get_detections(results, confidence_threshold)
+        
+        return self.model.update(xywhs, confidences, classes, frame)
     
 
     def get_tracked_objects_info(self, tracked_objects):
@@ -94,6 +132,88 @@ class Tracker():
         
         return tracked_objects_info
 
+
+    def coast(self):
+        '''
+        Advances the tracker by one frame without running detection or re-identification.
+
+            Returns:
+                tracked_objects_info (list): Always empty since no track is updated on a coasted frame.
+        '''
+        self.model.increment_ages()
+
+        return []
+
+
+    def predict(self, frames_since_keyframe=1):
+        '''
+        Advances the tracker by one frame and returns the kalman filter predicted boxes of the tracked objects.
+
+            Parameters:
+                frames_since_keyframe (int): Number of frames since detection last ran.
+
+            Returns:
+                tracked_objects_info (list): List of tuples containing info about tracked objects.
+        '''
+        tracked_objects = self.model.predict(max_time_since_update=frames_since_keyframe)
+
+        return self.get_tracked_objects_info(tracked_objects)
+
+
+    def add_track_deletion_listener(self, listener):
+        '''
+        Registers a callable that is notified when the tracker deletes a track.
+
+            Parameters:
+                listener (callable): Called with the ID of the deleted track.
+        '''
+        self.model.add_track_deletion_callback(listener)
+
+
+    def get_state(self):
+        '''
+        Returns the tracks, appearance gallery and ID counter of the tracker to store in a checkpoint.
+
+            Returns:
+                state (dict): Attributes of the deepsort model that change while tracking.
+        '''
+        model = self.model
+
+        return {
+            "tracks": model.tracker.tracks,
+            "next_id": model.tracker._next_id,
+            "samples": model.tracker.metric.samples,
+            "image_shape": (getattr(model, "height", None), getattr(model, "width", None)),
+            "unmatched_tracks": self.unmatched_tracks,
+        }
+
+
+    def set_state(self, state):
+        '''
+        Restores the tracker state of a checkpoint.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        model = self.model
+        model.tracker.tracks = state["tracks"]
+        model.tracker._next_id = state["next_id"]
+        model.tracker.metric.samples = state["samples"]
+        if state["image_shape"][0] is not None:
+            model.height, model.width = state["image_shape"]
+        self.unmatched_tracks = state["unmatched_tracks"]
+
+
+    def get_tracks(self):
+        '''
+        Fetches the live tracks of the tracker model.
+
+            Returns:
+                tracks (list): List of deepsort Track objects.
+        '''
+
+        return self.model.tracker.tracks
+
     
     def track(self, results, frame, confidence_threshold = 0.5):
         '''
@@ -108,6 +228,27 @@ class Tracker():
                 tracked_objects_info (list): List of tuples containing info about tracked objects.
         '''
         tracked_objects = self.get_tracker_ids(results, frame, confidence_threshold)
+        self.unmatched_tracks = [track for track in self.get_tracks() if track.is_confirmed() and track.time_since_update > 0]
+
+        return self.get_tracked_objects_info(tracked_objects)
+
+
+    def track_with_features(self, xywhs, confidences, classes, features, frame_shape):
+        '''
+        Returns the tracked objects for detections whose features were already extracted, such as detections read from a cache.
+
+            Parameters:
+                xywhs (numpy array): Boxes of the detections arranged such as: [x_center, y_center, width, height]
+                confidences (numpy array): Confidences of the detections.
+                classes (numpy array): Classes of the detections.
+                features (numpy array): One feature vector per detection.
+                frame_shape (tuple): Shape of the frame the detections belong to.
+
+            Returns:
+                tracked_objects_info (list): List of tuples containing info about tracked objects.
+        '''
+        tracked_objects = self.model.update_with_features(xywhs, confidences, classes, features, frame_shape)
+        self.unmatched_tracks = [track for track in self.get_tracks() if track.is_confirmed() and track.time_since_update > 0]
 
         return self.get_tracked_objects_info(tracked_objects)
 
@@ -117,29 +258,31 @@ class VehicleTracker(Tracker):
     Vehicle tracker class. Inherits from Tracker class.
     '''
 
-    def __init__(self, model_name="osnet_x0_25", config_path=os.path.join("deep_sort", "configs", "deep_sort.yaml")):
+    def __init__(self, model_name="osnet_x0_25", config_path=os.path.join("deep_sort", "configs", "deep_sort.yaml"), extractor=None):
         '''
         Vehicle tracker class. Inherits from Tracker class.
         
             Parameters:
                 model_name (string): Name of the model.
                 config_path (string): Path to the config file.
+                extractor (Extractor or BatchedExtractor object): Feature extractor shared with other trackers. None to load the model of model_name.
         '''
         super().__init__()
-        self.set_tracker_model(model_name, config_path)
+        self.set_tracker_model(model_name, config_path, extractor=extractor)
 
     
-    def get_tracker_ids(self, results, frame, confidence_threshold):
+    def get_detections(self, results, confidence_threshold):
         '''
-        Fetches the tracker ids for vehicles using deepsort model.
+        Filters the vehicle detections to track and converts them for the deepsort model.
 
             Parameters:
                 results (pytorch tensor object): The results of inference on the given frame.
-                frame (numpy array): frame to run inference on.
                 confidence_threshold (float): Threshold for minimum confidence of detection.
                 
             Returns:
-                model (model object): The model attribute of the tracker class.
+                xywhs (pytorch tensor object): Boxes of the detections arranged such as: [x_center, y_center, width, height]
+                confidences (pytorch tensor object): Confidences of the detections.
+                classes (pytorch tensor object): Classes of the detections.
         '''
         results = results.xyxy[0].clone()  # Copy of results tensor, to avoid changing the original tensor.
         filtered_results = results[torch.where((results[:, 5] > 0) & (results[:, 5] < 8) & (results[:, 4] > confidence_threshold))]  # Filtered to only include vehicles and above a certain threshold.
@@ -147,4 +290,4 @@ class VehicleTracker(Tracker):
         confidences = filtered_results[:, 4]
         classes =  filtered_results[:, 5]
         
-        return self.model.update(xywhs.cpu(), confidences.cpu(), classes.cpu(), frame)
\ No newline at end of file
+        return xywhs.cpu(), confidences.cpu(), classes.cpu()
\ No newline at end of file
@@ -0,0 +1,347 @@
+import random
+import threading
+import numpy as np
+
+
+class KLLSketch():
+    '''
+    Mergeable quantile sketch in the style of KLL.
+
+    Values are kept in a hierarchy of compactors. Once a compactor is full it is sorted and every other
+    value is promoted to the next level with twice the weight, so memory stays within a few times k
+    regardless of how many values were added.
+
+        Attributes:
+            k (int): Capacity of the top compactor. Larger values give more accurate quantiles.
+            compactors (list): Lists of values per level. A value on level h stands for 2 ** h values.
+            count (int): Number of values added.
+    '''
+
+    def __init__(self, k=128):
+        '''
+        Constructor for KLLSketch class.
+
+            Parameters:
+                k (int): Capacity of the top compactor. Larger values give more accurate quantiles.
+        '''
+        self.k = k
+        self.compactors = [[]]
+        self.count = 0
+
+
+    def get_capacity(self, level):
+        '''
+        Returns the capacity of a compactor. Lower levels shrink geometrically below the top one.
+
+            Parameters:
+                level (int): Level of the compactor.
+
+            Returns:
+                capacity (int): Number of values the compactor holds before it is compacted.
+        '''
+        depth = len(self.compactors) - level - 1
+
+        return max(int(self.k * (2 / 3) ** depth), 2)
+
+
+    def compress(self):
+        '''
+        Compacts every full compactor into the level above it.
+        '''
+        for level in range(len(self.compactors)):
+            if len(self.compactors[level]) < self.get_capacity(level):
+                continue
+            if level + 1 == len(self.compactors):
+                self.compactors.append([])
+
+            values = sorted(self.compactors[level])
+            # An odd value out stays on this level so no weight is lost.
+            self.compactors[level] = [values.pop()] if len(values) % 2 else []
+            self.compactors[level + 1].extend(values[random.randint(0, 1)::2])
+
+
+    def add(self, value):
+        '''
+        Adds a value to the sketch.
+
+            Parameters:
+                value (float): Value to add.
+        '''
+        self.compactors[0].append(value)
+        self.count += 1
+        if len(self.compactors[0]) >= self.get_capacity(0):
+            self.compress()
+
+
+    def merge(self, other):
+        '''
+        Merges another sketch into this one.
+
+            Parameters:
+                other (KLLSketch object): Sketch to merge.
+        '''
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, values in enumerate(other.compactors):
+            self.compactors[level].extend(values)
+        self.count += other.count
+        self.compress()
+
+
+    def quantile(self, q):
+        '''
+        Returns the approximate q-th quantile of the added values.
+
+            Parameters:
+                q (float): Quantile between 0 and 1.
+
+            Returns:
+                value (float): Approximate quantile, or NaN if the sketch is empty.
+        '''
+        values = [value for values in self.compactors for value in values]
+        if not values:
+            return float("nan")
+
+        weights = [2 ** level for level, values in enumerate(self.compactors) for _ in values]
+        order = np.argsort(values)
+        cumulative_weights = np.cumsum(np.array(weights)[order])
+        position = min(np.searchsorted(cumulative_weights, q * cumulative_weights[-1], side="left"), len(values) - 1)
+
+        return float(np.array(values)[order][position])
+
+
+class WindowStats():
+    '''
+    Statistics of the vehicles measured in one time window.
+
+        Attributes:
+            start (float): Start of the window as seconds since the epoch.
+            count (int): Number of vehicles, including inconclusive measurements.
+            measured_count (int): Number of vehicles with a numeric speed.
+            speed_sum (float): Sum of the numeric speeds.
+            sketch (KLLSketch object): Quantile sketch of the numeric speeds.
+    '''
+
+    def __init__(self, start, k=128):
+        '''
+        Constructor for WindowStats class.
+
+            Parameters:
+                start (float): Start of the window as seconds since the epoch.
+                k (int): Capacity of the quantile sketch.
+        '''
+        self.start = start
+        self.count = 0
+        self.measured_count = 0
+        self.speed_sum = 0.0
+        self.sketch = KLLSketch(k)
+
+
+    def add(self, speed):
+        '''
+        Adds a vehicle to the window.
+
+            Parameters:
+                speed (float or str): Speed of the vehicle in Km/h. Anything that is not a number only adds to the count.
+        '''
+        self.count += 1
+        if isinstance(speed, (int, float)):
+            self.measured_count += 1
+            self.speed_sum += speed
+            self.sketch.add(speed)
+
+
+    def merge(self, other):
+        '''
+        Merges the statistics of the same window from another worker or chunk.
+
+            Parameters:
+                other (WindowStats object): Statistics to merge.
+        '''
+        self.count += other.count
+        self.measured_count += other.measured_count
+        self.speed_sum += other.speed_sum
+        self.sketch.merge(other.sketch)
+
+
+    def get_summary(self, quantiles=(0.5, 0.85)):
+        '''
+        Returns the statistics of the window.
+
+            Parameters:
+                quantiles (tuple): Speed quantiles to report.
+
+            Returns:
+                summary (dict): Window start, counts, mean speed and the requested speed quantiles.
+        '''
+        summary = {
+            "start": self.start,
+            "count": self.count,
+            "measured_count": self.measured_count,
+            "mean_speed": self.speed_sum / self.measured_count if self.measured_count else float("nan"),
+        }
+        for q in quantiles:
+            summary[f"p{int(round(q * 100))}_speed"] = self.sketch.quantile(q)
+
+        return summary
+
+
+class TrafficAggregator():
+    '''
+    Streaming traffic statistics per camera over 1 minute, 15 minute and 1 hour windows.
+
+    Each window width keeps at most `retention` windows per camera, so memory per camera is fixed. The
+    aggregator is safe to query from another thread while events are being added, and aggregators of
+    several workers or chunks can be merged.
+
+        Attributes:
+            window_widths (tuple): Widths of the windows in seconds.
+            retention (int): Number of windows kept per camera and width.
+            k (int): Capacity of the quantile sketches.
+            windows (dict): Windows such as: {camera: {width: {window start: WindowStats}}}
+    '''
+
+    def __init__(self, window_widths=(60, 900, 3600), retention=96, k=128):
+        '''
+        Constructor for TrafficAggregator class.
+
+            Parameters:
+                window_widths (tuple): Widths of the windows in seconds.
+                retention (int): Number of windows kept per camera and width.
+                k (int): Capacity of the quantile sketches.
+        '''
+        self.window_widths = window_widths
+        self.retention = retention
+        self.k = k
+        self.windows = {}
+        self.lock = threading.Lock()
+
+
+    def __getstate__(self):
+        '''
+        Returns the picklable state so aggregators can be sent back from worker processes.
+        '''
+        state = self.__dict__.copy()
+        del state["lock"]
+
+        return state
+
+
+    def __setstate__(self, state):
+        '''
+        Restores a pickled aggregator with a fresh lock.
+        '''
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+    def get_state(self):
+        '''
+        Returns the windows to store in a checkpoint.
+
+            Returns:
+                state (dict): Windows of every camera.
+        '''
+        with self.lock:
+            return {"windows": self.windows}
+
+
+    def set_state(self, state):
+        '''
+        Restores the windows of a checkpoint.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        with self.lock:
+            self.windows = state["windows"]
+
+
+    def get_window(self, camera, width, start):
+        '''
+        Returns the statistics of a window, creating it and evicting the oldest one if needed.
+
+            Parameters:
+                camera (str): Name of the camera.
+                width (int): Width of the window in seconds.
+                start (float): Start of the window as seconds since the epoch.
+
+            Returns:
+                window (WindowStats object): Statistics of the window.
+        '''
+        windows = self.windows.setdefault(camera, {}).setdefault(width, {})
+        if start not in windows:
+            windows[start] = WindowStats(start, self.k)
+            if len(windows) > self.retention:
+                del windows[min(windows)]
+
+        return windows[start]
+
+
+    def add(self, camera, timestamp, speed):
+        '''
+        Adds a measured vehicle to every window containing the timestamp.
+
+            Parameters:
+                camera (str): Name of the camera.
+                timestamp (float): Wall clock time of the measurement as seconds since the epoch.
+                speed (float or str): Speed of the vehicle in Km/h.
+        '''
+        with self.lock:
+            for width in self.window_widths:
+                self.get_window(camera, width, timestamp - timestamp % width).add(speed)
+
+
+    def merge(self, other):
+        '''
+        Merges the windows of another aggregator into this one.
+
+            Parameters:
+                other (TrafficAggregator object): Aggregator to merge.
+        '''
+        with self.lock:
+            for camera, widths in other.windows.items():
+                for width, windows in widths.items():
+                    for start, window in windows.items():
+                        self.get_window(camera, width, start).merge(window)
+
+
+    def query(self, camera, width, timestamp=None, quantiles=(0.5, 0.85)):
+        '''
+        Returns the statistics of the window containing the timestamp.
+
+            Parameters:
+                camera (str): Name of the camera.
+                width (int): Width of the window in seconds.
+                timestamp (float): Time inside the window as seconds since the epoch. The latest window if None.
+                quantiles (tuple): Speed quantiles to report.
+
+            Returns:
+                summary (dict): Statistics of the window, or None if no vehicle was measured in it.
+        '''
+        with self.lock:
+            windows = self.windows.get(camera, {}).get(width, {})
+            if not windows:
+                return None
+            start = max(windows) if timestamp is None else timestamp - timestamp % width
+            window = windows.get(start)
+
+            return window.get_summary(quantiles) if window is not None else None
+
+
+    def get_history(self, camera, width, quantiles=(0.5, 0.85)):
+        '''
+        Returns the statistics of every retained window of a camera.
+
+            Parameters:
+                camera (str): Name of the camera.
+                width (int): Width of the windows in seconds.
+                quantiles (tuple): Speed quantiles to report.
+
+            Returns:
+                summaries (list): Statistics of the windows sorted by start.
+        '''
+        with self.lock:
+            windows = self.windows.get(camera, {}).get(width, {})
+
+            return [windows[start].get_summary(quantiles) for start in sorted(windows)]
@@ -1,7 +1,44 @@
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import csv
+import queue
+import threading
+import atexit
+import time
+from concurrent.futures import ThreadPoolExecutor
 import cv2
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def get_zones(frame_size, entry_area, exit_area, deleting_line, display_dimension=(962, 1080)):
+    '''
+    Returns the zones of main.py, so every script measuring over its cache or settings uses the same ones.
+
+    Speed measures in the zones as they are given, while keyframes are scheduled with and the zones are drawn
+    in them scaled from the display to the frame size, as Camera.process_coordinates does.
+
+        Parameters:
+            frame_size (tuple): Size of the frames such as: (width, height).
+            entry_area (list): Co-ordinates of the entry area.
+            exit_area (list): Co-ordinates of the exit area.
+            deleting_line (list): Co-ordinates of the deleting line.
+            display_dimension (tuple): Dimension of the display the zones are given on.
+
+        Returns:
+            speed_zones (tuple): Entry area, exit area and deleting line passed to Speed.
+            frame_zones (tuple): Entry area, exit area and deleting line in frame coordinates.
+    '''
+    x_factor = frame_size[0] / display_dimension[0]
+    y_factor = frame_size[1] / display_dimension[1]
+    speed_zones = (entry_area, exit_area, deleting_line)
+    frame_zones = tuple([(int(x * x_factor), int(y * y_factor)) for x, y in zone] for zone in speed_zones)
+
+    return speed_zones, frame_zones
 
 
 class FrameSkipper():
@@ -50,24 +87,319 @@ class FrameSkipper():
         return self.skipped_frame_count == 0
 
 
+    def get_state(self):
+        '''
+        Returns the frame counter to store in a checkpoint.
+
+            Returns:
+                state (dict): Attributes that change while processing.
+        '''
+
+        return {"skipped_frame_count": self.skipped_frame_count}
+
+
+    def set_state(self, state):
+        '''
+        Restores the frame counter of a checkpoint.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        self.__dict__.update(state)
+
+
+class MotionGate():
+    '''
+    Class for skipping detection on frames where nothing moves inside the roi.
+
+        Attributes:
+            scale (float): Factor by which frames are downsampled before differencing.
+            sensitivity (float): Minimum fraction of roi pixels that must change to count as motion.
+            pixel_threshold (int): Minimum grayscale difference for a pixel to count as changed.
+            learning_rate (float): Rate at which the background model adapts to the current frame.
+            hold_frames (int): Number of frames detection is kept running after motion stops.
+            frames_checked (int): Number of frames checked by the gate.
+            frames_skipped (int): Number of frames on which detection was skipped.
+    '''
+
+    def __init__(self, roi, frame_size, sensitivity=0.002, pixel_threshold=25, scale=0.25, learning_rate=0.05, hold_frames=5):
+        '''
+        Constructor for the MotionGate class.
+
+            Parameters:
+                roi (list): Co-ordinates for region of interest.
+                frame_size (tuple): Size of the video frames as (width, height).
+                sensitivity (float): Minimum fraction of roi pixels that must change to count as motion.
+                pixel_threshold (int): Minimum grayscale difference for a pixel to count as changed.
+                scale (float): Factor by which frames are downsampled before differencing.
+                learning_rate (float): Rate at which the background model adapts to the current frame.
+                hold_frames (int): Number of frames detection is kept running after motion stops.
+        '''
+        self.scale = scale
+        self.sensitivity = sensitivity
+        self.pixel_threshold = pixel_threshold
+        self.learning_rate = learning_rate
+        self.hold_frames = hold_frames
+        self.small_size = (max(int(frame_size[0] * scale), 1), max(int(frame_size[1] * scale), 1))
+
+        self.mask = np.zeros((self.small_size[1], self.small_size[0]), dtype=np.uint8)
+        roi_corners = np.array([[(int(x * scale), int(y * scale)) for (x, y) in roi]], dtype=np.int32)
+        cv2.fillPoly(self.mask, roi_corners, 255)
+        self.mask_area = max(cv2.countNonZero(self.mask), 1)
+
+        self.background = None
+        self.motion_mask = None
+        self.hold_count = 0
+        self.frames_checked = 0
+        self.frames_skipped = 0
+
+
+    def get_motion_mask(self, frame):
+        '''
+        Updates the background model and returns the downsampled mask of changed pixels inside the roi.
+
+            Parameters:
+                frame (numpy array): A frame from the video.
+
+            Returns:
+                motion_mask (numpy array): Downsampled binary mask of changed pixels.
+        '''
+        small_frame = cv2.resize(frame, self.small_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.background is None:
+            # Nothing to compare against yet, so the whole roi counts as changed.
+            self.background = gray.astype(np.float32)
+            self.motion_mask = self.mask.copy()
+            return self.motion_mask
+
+        difference = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, motion_mask = cv2.threshold(difference, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        self.motion_mask = cv2.bitwise_and(motion_mask, self.mask)
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        return self.motion_mask
+
+
+    def if_motion(self, frame):
+        '''
+        Check to see if anything moves inside the roi of the current frame.
+
+            Parameters:
+                frame (numpy array): A frame from the video.
+
+            Returns:
+                motion (boolean): True if detection needs to run on the current frame.
+        '''
+        motion_mask = self.get_motion_mask(frame)
+        self.frames_checked += 1
+
+        if cv2.countNonZero(motion_mask) / self.mask_area >= self.sensitivity:
+            self.hold_count = self.hold_frames
+            return True
+
+        if self.hold_count > 0:
+            self.hold_count -= 1
+            return True
+
+        self.frames_skipped += 1
+        return False
+
+
+    def get_summary(self):
+        '''
+        Returns a short summary of the frames skipped by the gate.
+
+            Returns:
+                summary (string): Frames checked, frames skipped and the skipped percentage.
+        '''
+        skipped_percentage = 100 * self.frames_skipped / max(self.frames_checked, 1)
+
+        return f"Motion gate checked {self.frames_checked} frames and skipped detection on {self.frames_skipped} ({skipped_percentage:.1f}%)."
+
+
+    def get_state(self):
+        '''
+        Returns the background model and counters to store in a checkpoint.
+
+            Returns:
+                state (dict): Attributes that change while processing.
+        '''
+
+        return {"background": self.background, "motion_mask": self.motion_mask, "hold_count": self.hold_count,
+                "frames_checked": self.frames_checked, "frames_skipped": self.frames_skipped}
+
+
+    def set_state(self, state):
+        '''
+        Restores the background model and counters of a checkpoint.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        self.__dict__.update(state)
+
+
+class KeyframeScheduler():
+    '''
+    Class for deciding which frames run detection and which use tracker predicted boxes.
+
+        Attributes:
+            min_interval (int): Smallest number of frames between keyframes.
+            max_interval (int): Largest number of frames between keyframes.
+            density_step (int): Number of tracks that shortens the interval by one frame.
+            uncertainty_threshold (float): Position standard deviation, relative to box height, that forces a keyframe.
+            zone_rects (numpy array): Bounding rectangles of the zones grown by the zone margin.
+            frames_since_keyframe (int): Number of frames since the last keyframe.
+            keyframe_count (int): Number of keyframes scheduled.
+            predicted_frame_count (int): Number of frames that used tracker predicted boxes.
+    '''
+
+    def __init__(self, zones, min_interval=1, max_interval=6, density_step=4, uncertainty_threshold=0.25, zone_margin=40):
+        '''
+        Constructor for the KeyframeScheduler class.
+
+            Parameters:
+                zones (list): List of areas, such as the entry and exit areas, near which every frame is a keyframe.
+                min_interval (int): Smallest number of frames between keyframes.
+                max_interval (int): Largest number of frames between keyframes.
+                density_step (int): Number of tracks that shortens the interval by one frame.
+                uncertainty_threshold (float): Position standard deviation, relative to box height, that forces a keyframe.
+                zone_margin (int): Distance in pixels around a zone that counts as near the zone.
+        '''
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.density_step = density_step
+        self.uncertainty_threshold = uncertainty_threshold
+
+        zone_rects = []
+        for zone in zones:
+            zone = np.array(zone, dtype=np.float32)
+            zone_rects.append([zone[:, 0].min() - zone_margin, zone[:, 1].min() - zone_margin,
+                               zone[:, 0].max() + zone_margin, zone[:, 1].max() + zone_margin])
+        self.zone_rects = np.array(zone_rects, dtype=np.float32).reshape(-1, 4)
+
+        self.frames_since_keyframe = max_interval
+        self.keyframe_count = 0
+        self.predicted_frame_count = 0
+
+
+    def get_interval(self, tracks):
+        '''
+        Returns the number of frames until the next keyframe based on the current tracks.
+
+            Parameters:
+                tracks (list): List of deepsort Track objects.
+
+            Returns:
+                interval (int): Number of frames between keyframes.
+        '''
+        if not tracks:
+            return self.max_interval
+
+        means = np.array([track.mean for track in tracks])
+        covariances = np.array([track.covariance for track in tracks])
+
+        # Track uncertainty grows with every prediction, so a keyframe is due once it is too large.
+        position_std = np.sqrt(covariances[:, 0, 0] + covariances[:, 1, 1]) / np.maximum(means[:, 3], 1)
+        if np.any(position_std > self.uncertainty_threshold):
+            return self.min_interval
+
+        # Tracks close to a zone need every frame to keep speed measurements precise.
+        boxes = np.array([track.to_tlbr() for track in tracks])
+        near_zone = ((boxes[:, None, 0] <= self.zone_rects[None, :, 2]) & (boxes[:, None, 2] >= self.zone_rects[None, :, 0]) &
+                     (boxes[:, None, 1] <= self.zone_rects[None, :, 3]) & (boxes[:, None, 3] >= self.zone_rects[None, :, 1]))
+        if np.any(near_zone):
+            return self.min_interval
+
+        return max(self.max_interval - len(tracks) // self.density_step, self.min_interval)
+
+
+    def if_keyframe(self, tracks):
+        '''
+        Check to see if the current frame is a keyframe.
+
+            Parameters:
+                tracks (list): List of deepsort Track objects.
+
+            Returns:
+                keyframe (boolean): True if detection and re-identification need to run on the current frame.
+        '''
+        self.frames_since_keyframe += 1
+
+        if self.frames_since_keyframe >= self.get_interval(tracks):
+            self.frames_since_keyframe = 0
+            self.keyframe_count += 1
+            return True
+
+        self.predicted_frame_count += 1
+        return False
+
+
+    def get_summary(self):
+        '''
+        Returns a short summary of the scheduled keyframes.
+
+            Returns:
+                summary (string): Keyframes and predicted frames scheduled.
+        '''
+        total = max(self.keyframe_count + self.predicted_frame_count, 1)
+
+        return f"Keyframe scheduler ran detection on {self.keyframe_count} frames and predicted {self.predicted_frame_count} ({100 * self.predicted_frame_count / total:.1f}%)."
+
+
+    def get_state(self):
+        '''
+        Returns the schedule counters to store in a checkpoint.
+
+            Returns:
+                state (dict): Attributes that change while processing.
+        '''
+
+        return {"frames_since_keyframe": self.frames_since_keyframe, "keyframe_count": self.keyframe_count,
+                "predicted_frame_count": self.predicted_frame_count}
+
+
+    def set_state(self, state):
+        '''
+        Restores the schedule counters of a checkpoint.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        self.__dict__.update(state)
+
+
 class Logger():
     '''
-    Class to handle logging.
+    Class to handle logging. Messages below the level threshold are dropped before they are formatted and the
+    rest are handed to a background writer thread that appends them to the log file in batches. A batch is
+    written once it holds batch_size messages or flush_interval seconds after its first message, whichever
+    comes first. Messages logged after close are written directly.
 
         Attributes:
             log_path (str): Path to generate the log file.
             video_name (str): Name of the video file to be processed.
             importance_levels (list): List of importance levels. They are: DEBUG, INFO, WARNING, ERROR, CRITICAL
             datetime_format (str): Datetime format string. By default they are: Day-Month-Year  Hour:Minute:Second.
+            level (str): Minimum importance level of the messages written to the log file.
+            flush_interval (float): Maximum number of seconds a message waits in the queue before being written.
+            batch_size (int): Maximum number of messages written to the log file at once.
+            closed (boolean): True once the background writer was stopped.
     '''
 
-    def __init__(self, log_path, video_name):
+    flush_marker = object()  # Queued by flush to write the current batch without waiting for the interval
+
+    def __init__(self, log_path, video_name, level="DEBUG", flush_interval=1.0, batch_size=256):
         '''
         Constructor method to intialize a logger class.
 
         Parameters:
             log_path (str): Path to generate the log file.
             video_name (str): Name of the video file to be processed.
+            level (str): Minimum importance level of the messages written to the log file.
+            flush_interval (float): Maximum number of seconds a message waits in the queue before being written.
+            batch_size (int): Maximum number of messages written to the log file at once.
 
         Returns:
             logger (logger object): The logger object.
@@ -80,15 +412,62 @@ class Logger():
         self.video_name = video_name
         self.importance_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
         self.datetime_format = "%d-%m-%Y  %H:%M:%S"
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.set_level(level)
 
+        self.start_writer()
+        atexit.register(self.close)
 
-    def configure_log_message(self, level, message):
+
+    def set_level(self, level):
+        '''
+        Sets the minimum importance level of the messages written to the log file.
+
+            Parameters:
+                level (string): Importance level. Levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
+        '''
+        if level not in self.importance_levels:
+            raise Exception(f"Invalid importance level of log message: {level}. It should be one of: DEBUG, INFO, WARNING, ERROR, CRITICAL")
+
+        self.level = level
+        self.level_index = self.importance_levels.index(level)
+
+
+    def is_enabled_for(self, level):
+        '''
+        Check to see if messages of the given level are written to the log file.
+
+            Parameters:
+                level (string): Importance level of the message. Levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
+
+            Returns:
+                enabled (boolean): True if messages of the given level are written.
+        '''
+
+        return self.importance_levels.index(level) >= self.level_index
+
+
+    def start_writer(self):
+        '''
+        Starts the background thread that writes queued messages to the log file.
+        '''
+        self.pid = os.getpid()
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.writer_thread = threading.Thread(target=self.drain_queue, name=f"{self.video_name}-log-writer", daemon=True)
+        self.writer_thread.start()
+
+
+    def configure_log_message(self, level, message, *args):
         '''
         Configure a message to add to log file.
 
             Parameters:
                 level (string): Importance level of the message. Levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
-                message (string): Message to add to the log file.
+                message (string or callable): Message to add to the log file, a %-style format string for args or a callable returning the message.
+                args (tuple): Values to format into the message.
 
             Returns:
                 configured_message (string): Message configured to specification.
@@ -96,73 +475,211 @@ class Logger():
         if level not in self.importance_levels:
             raise Exception(f"Invalid importance level of log message: {level}. It should be one of: DEBUG, INFO, WARNING, ERROR, CRITICAL")
 
+        if callable(message):
+            message = message()
+        elif args:
+            message = message % args
+
         return f"{level} | {datetime.now().strftime(self.datetime_format)} | {message}"
 
     
     def write_to_log(self, message):
         '''
-        Method to open and append a message to the log file.
+        Method to queue a message for the background writer.
 
             Parameters:
                 message (string): Message to be addded to the log file.
         '''
-        with open(os.path.join(self.log_path, f"{self.video_name}.log"), "a") as log_file:
-            log_file.write(f"{message}\n")
+        if os.getpid() != self.pid and not self.closed:
+            # The writer thread does not survive a fork, so a forked worker starts its own.
+            self.start_writer()
+
+        with self.lock:
+            if not self.closed:
+                self.queue.put(message)
+                return
+
+        file_descriptor = self.open_log_file()
+        try:
+            self.write_batch(file_descriptor, [message])
+        finally:
+            os.close(file_descriptor)
+
+
+    def open_log_file(self):
+        '''
+        Opens the log file for appending.
+
+            Returns:
+                file_descriptor (int): File descriptor of the log file.
+        '''
+
+        return os.open(os.path.join(self.log_path, f"{self.video_name}.log"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+
+    def get_batch(self):
+        '''
+        Waits for a queued message and gathers the following ones until the batch is full, flush_interval seconds
+        have passed since the first one, or a flush or close is requested.
+
+            Returns:
+                messages (list): Queued items, ending with None if the writer should stop.
+        '''
+        messages = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(messages) < self.batch_size and messages[-1] is not None and messages[-1] is not self.flush_marker:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                messages.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return messages
+
+
+    def drain_queue(self):
+        '''
+        Method run by the background writer. Waits for queued messages and appends them to the log file in batches.
+        '''
+        file_descriptor = self.open_log_file()
+        running = True
+        while running:
+            messages = self.get_batch()
+            running = messages[-1] is not None
+            lines = [message for message in messages if message is not None and message is not self.flush_marker]
+            if lines:
+                self.write_batch(file_descriptor, lines)
+
+            for _ in messages:
+                self.queue.task_done()
+
+        os.close(file_descriptor)
+
+
+    def write_batch(self, file_descriptor, messages):
+        '''
+        Method to append a batch of messages to the log file with a single write.
+
+            Parameters:
+                file_descriptor (int): File descriptor of the log file opened for appending.
+                messages (list): Messages to be addded to the log file.
+        '''
+        data = "".join(f"{message}\n" for message in messages).encode("UTF8")
+
+        # Several worker processes may share the log file, so each batch is written under an exclusive lock.
+        if fcntl is not None:
+            fcntl.flock(file_descriptor, fcntl.LOCK_EX)
+        try:
+            while data:
+                data = data[os.write(file_descriptor, data):]
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file_descriptor, fcntl.LOCK_UN)
+
+
+    def flush(self):
+        '''
+        Blocks until every queued message has been written to the log file.
+        '''
+        if os.getpid() != self.pid:
+            return
+        with self.lock:
+            if self.closed:
+                return
+            self.queue.put(self.flush_marker)
+        self.queue.join()
+
+
+    def close(self):
+        '''
+        Writes the remaining messages and stops the background writer. Messages logged afterwards are written directly.
+        '''
+        if os.getpid() != self.pid:
+            return
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(None)
+        self.writer_thread.join()
+
+
+    def log(self, level, message, *args):
+        '''
+        Method for adding a message of the given level to the log file. Formatting only happens if the level is enabled.
+
+            Parameters:
+                level (string): Importance level of the message. Levels: DEBUG, INFO, WARNING, ERROR, CRITICAL
+                message (string or callable): Message to be addded to the log file.
+                args (tuple): Values to format into the message.
+        '''
+        if self.is_enabled_for(level):
+            self.write_to_log(self.configure_log_message(level, message, *args))
 
     
-    def debug(self, message):
+    def debug(self, message, *args):
         '''
         Method for adding a debug message to the log file.
 
             Parameters:
-                message (string): Message to be addded to the log file.
+                message (string or callable): Message to be addded to the log file.
+                args (tuple): Values to format into the message.
         '''
-        self.write_to_log(self.configure_log_message("DEBUG", message))
+        self.log("DEBUG", message, *args)
 
     
-    def info(self, message):
+    def info(self, message, *args):
         '''
         Method for adding a info message to the log file.
 
             Parameters:
-                message (string): Message to be addded to the log file.
+                message (string or callable): Message to be addded to the log file.
+                args (tuple): Values to format into the message.
         '''
-        self.write_to_log(self.configure_log_message("INFO", message))
+        self.log("INFO", message, *args)
 
     
-    def warning(self, message):
+    def warning(self, message, *args):
         '''
         Method for adding a warning message to the log file.
 
             Parameters:
-                message (string): Message to be addded to the log file.
+                message (string or callable): Message to be addded to the log file.
+                args (tuple): Values to format into the message.
         '''
-        self.write_to_log(self.configure_log_message("WARNING", message))
+        self.log("WARNING", message, *args)
 
     
-    def error(self, message):
+    def error(self, message, *args):
         '''
         Method for adding a error message to the log file.
 
             Parameters:
-                message (string): Message to be addded to the log file.
+                message (string or callable): Message to be addded to the log file.
+                args (tuple): Values to format into the message.
         '''
-        self.write_to_log(self.configure_log_message("ERROR", message))
+        self.log("ERROR", message, *args)
 
 
-    def critical(self, message):
+    def critical(self, message, *args):
         '''
         Method for adding a critical message to the log file.
 
             Parameters:
-                message (string): Message to be addded to the log file.
+                message (string or callable): Message to be addded to the log file.
+                args (tuple): Values to format into the message.
         '''
-        self.write_to_log(self.configure_log_message("CRITICAL", message))
+        self.log("CRITICAL", message, *args)
         
         
 class Reporter():
     '''
-    Class for generating reports.
+    Class for generating reports. Crops are encoded by a pool of background workers and rows are appended to
+    the report file in batches by a background writer thread, so adding to the report never blocks on disk.
+    A batch is written once it holds batch_size rows or flush_interval seconds after its first row, whichever
+    comes first. Adding to the report after close raises an exception.
     
         Attributes:
             report_path (str): Path to generate the report file.
@@ -170,9 +687,28 @@ class Reporter():
             image_directory (str): Directory to save images.
             logger (Logger object): Logger object for logging.
             header (list): List of headings for the report file.
+            image_format (str): Format of the saved crops. One of: png, jpg, webp
+            image_quality (int): Quality of jpg and webp crops from 0 to 100.
+            flush_interval (float): Maximum number of seconds a row waits in the queue before being written.
+            batch_size (int): Maximum number of rows written to the report file at once.
+            event_store (SpeedEventStore object): Structured store that also receives every event, if any.
+            camera_name (str): Name of the camera the events are stored under.
+            recording_start (datetime): Wall clock time at which the video starts.
+            closed (boolean): True once the background workers were stopped.
     '''
     
-    def __init__(self, report_path, video_name, image_directory, logger, header, starting_time):
+    # Encoder flags per image format. The quality placeholder is filled with image_quality.
+    image_parameters = {
+        "png": (cv2.IMWRITE_PNG_COMPRESSION, 1),
+        "jpg": (cv2.IMWRITE_JPEG_QUALITY, None),
+        "webp": (cv2.IMWRITE_WEBP_QUALITY, None),
+    }
+
+    flush_marker = object()  # Queued by flush to write the current batch without waiting for the interval
+
+    def __init__(self, report_path, video_name, image_directory, logger, header, starting_time, image_format="png",
+                 image_quality=90, image_workers=2, flush_interval=1.0, batch_size=64, event_store=None, camera_name=None,
+                 recording_date=None, recording_start=None):
         '''
         Constructor method to intialize a reporter class.
 
@@ -182,6 +718,16 @@ class Reporter():
             image_directory (str): Directory to save images.
             logger (Logger object): Logger object for logging.
             header (list): List of headings for the report file.
+            image_format (str): Format of the saved crops. One of: png, jpg, webp
+            image_quality (int): Quality of jpg and webp crops from 0 to 100.
+            image_workers (int): Number of background workers encoding crops.
+            flush_interval (float): Maximum number of seconds a row waits in the queue before being written.
+            batch_size (int): Maximum number of rows written to the report file at once.
+            event_store (SpeedEventStore object): Structured store that also receives every event, if any.
+            camera_name (str): Name of the camera the events are stored under. Defaults to the video name.
+            recording_date (date): Day of the recording. Required with an event store unless recording_start is given, otherwise defaults to today.
+            recording_start (datetime): Wall clock time at which the video starts, such as LiveCamera.start_wall_time.
+                                        Defaults to starting_time o'clock on the recording date.
         '''
         if not os.path.exists(report_path):
             logger.info(f"Results directory does not exist. Creating results directory: {report_path}")
@@ -191,15 +737,39 @@ class Reporter():
             logger.info(f"Image directory does not exist. Creating image directory: {os.path.join(image_directory, video_name)}")
             os.makedirs(os.path.join(image_directory, video_name))
 
+        if image_format not in self.image_parameters:
+            raise Exception(f"Invalid image format: {image_format}. It should be one of: png, jpg, webp")
+
         self.report_path = report_path
         self.image_directory = image_directory
         self.video_name = video_name
         self.logger = logger
         self.header = header
         self.starting_time = starting_time
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.event_store = event_store
+        self.camera_name = camera_name if camera_name is not None else video_name
+        if recording_start is None:
+            if recording_date is None and event_store is not None:
+                # Stamping a recording with the day it is processed would file its events under the wrong day.
+                raise Exception("The recording date is needed to store the events of a recording.")
+            recording_date = recording_date if recording_date is not None else datetime.now().date()
+            recording_start = datetime(recording_date.year, recording_date.month, recording_date.day) + timedelta(hours=starting_time)
+        self.recording_start = recording_start
+
+        self.image_pool = ThreadPoolExecutor(max_workers=image_workers, thread_name_prefix=f"{video_name}-crop-encoder")
+        self.row_queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.writer_thread = threading.Thread(target=self.drain_rows, name=f"{video_name}-report-writer", daemon=True)
+        self.writer_thread.start()
+        self.closed = False
         
         self.create_report()  
-    
+        atexit.register(self.close)
+
     
     def create_report(self):
         '''
@@ -221,25 +791,150 @@ class Reporter():
                 bbox (tuple): Object bounding box.
                 time (float): The current time of the video.
         '''
+        if self.closed:
+            raise Exception(f"Report {self.video_name} is closed.")
+
         xmin, ymin, xmax, ymax = bbox
-        cropped_frame = frame[ymin: ymax, xmin: xmax]
-        cv2.imwrite(os.path.join(self.image_directory, self.video_name, f"{id}.png"), cropped_frame)
+        # The frame keeps being annotated after this call, so the worker gets its own copy of the crop.
+        cropped_frame = frame[ymin: ymax, xmin: xmax].copy()
+        self.image_pool.submit(self.save_crop, os.path.join(self.image_directory, self.video_name, f"{id}.{self.image_format}"), cropped_frame)
 
-        if (time/60) < 60: 
-            time2 = f"{self.starting_time}:{int(time / 60)}:{int(time % 60)} AM"
-        else:
-            time2 = f"{self.starting_time + 1}:{int(time / 60)-60}:{int(time % 60)} AM"
+        moment = self.recording_start + timedelta(seconds=time)
+        time2 = f"{moment.hour % 12 or 12}:{moment.minute}:{moment.second} {'AM' if moment.hour < 12 else 'PM'}"
         
         self.add_a_row_to_report([str(id), str(time2), str(speed)])
+
+        if self.event_store is not None:
+            self.event_store.add(self.camera_name, moment.timestamp(), id, speed, time)
+
+
+    def save_crop(self, path, cropped_frame):
+        '''
+        Method run by the crop encoders to write a crop to disk.
+
+            Parameters:
+                path (str): Path of the image file.
+                cropped_frame (numpy array): Crop of the tracked object.
+        '''
+        flag, value = self.image_parameters[self.image_format]
+        if not cv2.imwrite(path, cropped_frame, [flag, self.image_quality if value is None else value]):
+            self.logger.error("Crop could not be saved: %s", path)
         
         
     def add_a_row_to_report(self, row):
         '''
-        Method to add a row to the report file.
+        Method to queue a row for the report file.
         
             Parameters:
                 row (list): The data point to write tot he report file.
         '''
+        with self.lock:
+            if self.closed:
+                raise Exception(f"Report {self.video_name} is closed.")
+            self.row_queue.put(row)
+
+
+    def get_batch(self):
+        '''
+        Waits for a queued row and gathers the following ones until the batch is full, flush_interval seconds
+        have passed since the first one, or a flush or close is requested.
+
+            Returns:
+                rows (list): Queued items, ending with None if the writer should stop.
+        '''
+        rows = [self.row_queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.batch_size and rows[-1] is not None and rows[-1] is not self.flush_marker:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self.row_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return rows
+
+
+    def drain_rows(self):
+        '''
+        Method run by the background writer. Waits for queued rows and appends them to the report file in batches.
+        '''
+        running = True
+        while running:
+            rows = self.get_batch()
+            running = rows[-1] is not None
+            batch = [row for row in rows if row is not None and row is not self.flush_marker]
+            if batch:
+                self.write_rows(batch)
+
+            for _ in rows:
+                self.row_queue.task_done()
+
+
+    def write_rows(self, rows):
+        '''
+        Method to append a batch of rows to the report file.
+
+            Parameters:
+                rows (list): The data points to write to the report file.
+        '''
         with open(os.path.join(self.report_path, f"{self.video_name}_report.csv"), 'a', encoding='UTF8', newline='') as file:
             writer = csv.writer(file)
-            writer.writerow(row)
+            writer.writerows(rows)
+
+
+    def flush(self):
+        '''
+        Blocks until every queued row has been written to the report file.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.row_queue.put(self.flush_marker)
+        self.row_queue.join()
+
+
+    def get_state(self):
+        '''
+        Returns the size of the report file and the position of the event store to store in a checkpoint, after writing every queued row.
+
+            Returns:
+                state (dict): Size of the report file in bytes and the state of the event store.
+        '''
+        self.flush()
+
+        return {
+            "report_size": os.path.getsize(os.path.join(self.report_path, f"{self.video_name}_report.csv")),
+            "event_store": self.event_store.get_state(self.camera_name) if self.event_store is not None else None,
+        }
+
+
+    def set_state(self, state):
+        '''
+        Truncates the report file and the event store to their contents at the checkpoint, so events after it are not reported twice.
+
+            Parameters:
+                state (dict): State returned by get_state.
+        '''
+        self.flush()
+        os.truncate(os.path.join(self.report_path, f"{self.video_name}_report.csv"), state["report_size"])
+        if self.event_store is not None and state.get("event_store") is not None:
+            self.event_store.set_state(self.camera_name, state["event_store"])
+
+
+    def close(self):
+        '''
+        Waits for the queued crops and rows to be written and stops the background workers.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+        self.image_pool.shutdown(wait=True)
+        self.row_queue.put(None)
+        self.writer_thread.join()
+
+        if self.event_store is not None:
+            self.event_store.close()